@@ -0,0 +1,163 @@
+"""
+Deterministic answers for simple SQL results.
+
+Most SQL answers are a single number, one row, a few tied rows or a short list.
+Those are rendered here straight from the typed result, so the numbers are copied
+exactly and the explanation LLM call is skipped. ``render_answer`` returns None
+for anything more complex; the caller then asks the LLM to explain the result.
+
+The value always comes first in the sentence ("1160.33 AED (average ADR)."), the
+same order the metric cube uses, and monetary values carry "AED", never "$".
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import re
+from typing import Any, List, Optional
+
+from sql_results import SQLResult, format_value
+
+MAX_COLUMNS = 5
+
+_AGGREGATES = {"avg": "average", "sum": "total", "max": "highest", "min": "lowest", "count": "count"}
+_AGGREGATE_CALL = re.compile(r"^(avg|sum|max|min|count)\s*\((.*)\)$", re.IGNORECASE)
+_ISO_DATE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})(?:[ T]00:00(?::00)?)?$")
+# Numeric columns that identify a row rather than measure something.
+_DIMENSION = re.compile(r"^(year|month|day|quarter|week|yr|mon)(_|$)|(^|_)id$|_(year|month)$", re.IGNORECASE)
+_SIGNED = re.compile(r"diff|change|delta|growth|yoy", re.IGNORECASE)
+_RATIO = re.compile(r"pct|percent|growth|ratio", re.IGNORECASE)
+_MONEY = re.compile(r"adr|revenue|price|rate|amount|revpar", re.IGNORECASE)
+
+
+def _bare(column: str) -> str:
+    return column.replace("`", "").replace('"', "").strip()
+
+
+def column_label(column: str) -> str:
+    """
+    Human label for a result column: ``AVG(ADR)`` -> "average ADR",
+    ``Occupancy_%`` -> "occupancy", ``max_revenue`` -> "highest revenue".
+    """
+    name = _bare(column)
+    match = _AGGREGATE_CALL.match(name)
+    prefix = ""
+    if match:
+        prefix, name = _AGGREGATES[match.group(1).lower()], match.group(2).strip()
+        if name in ("*", "1"):
+            return prefix
+        name = re.sub(r"\b\w+\.", "", name)
+    words = [w for w in re.split(r"[_\s]+", name.replace("%", "")) if w]
+    if not prefix and words and words[0].lower() in _AGGREGATES:
+        prefix, words = _AGGREGATES[words.pop(0).lower()], words
+    label = " ".join("ADR" if w.lower() == "adr" else w.lower() for w in words)
+    return f"{prefix} {label}".strip()
+
+
+def _unit(column: str) -> str:
+    name = _bare(column)
+    if _RATIO.search(name):
+        return "%"
+    if "occupancy" in name.lower() or name.endswith("%"):
+        return " percentage points" if _SIGNED.search(name) else "%"
+    if _MONEY.search(name):
+        return " AED"
+    return ""
+
+
+def _as_date(value: Any) -> Optional[dt.date]:
+    if isinstance(value, dt.datetime):
+        return value.date() if value.time() == dt.time() else None
+    if isinstance(value, dt.date):
+        return value
+    if isinstance(value, str):
+        match = _ISO_DATE.match(value.strip())
+        if match:
+            try:
+                return dt.date(*(int(g) for g in match.groups()))
+            except ValueError:
+                return None
+    return None
+
+
+def _fmt_date(d: dt.date) -> str:
+    return f"{d.day} {d:%B} {d.year}"
+
+
+def format_measure(column: str, value: Any) -> str:
+    """``value`` with the column's unit: AED for money, % for occupancy and ratios."""
+    if value is None:
+        return "no data"
+    number = format_value(value)
+    if _SIGNED.search(_bare(column)) and isinstance(value, (int, float)) and value > 0:
+        number = f"+{number}"
+    return f"{number}{_unit(column)}"
+
+
+def _format_dimension(column: str, value: Any) -> str:
+    if value is None:
+        return "unknown"
+    d = _as_date(value)
+    if d is not None:
+        return _fmt_date(d)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"{column_label(column)} {format_value(value)}"
+    return format_value(value)
+
+
+def _split_columns(result: SQLResult):
+    measures, dimensions = [], []
+    for col, kind in zip(result.columns, result.types):
+        if kind == "number" and not _DIMENSION.search(_bare(col)):
+            measures.append(col)
+        elif kind != "null":
+            dimensions.append(col)
+    return measures, dimensions
+
+
+def _measures_text(result: SQLResult, measures: List[str], index: int) -> str:
+    return ", ".join(f"{format_measure(c, result.data[c][index])} {column_label(c)}".rstrip() for c in measures)
+
+
+def _dimensions_text(result: SQLResult, dimensions: List[str], index: int) -> str:
+    return ", ".join(_format_dimension(c, result.data[c][index]) for c in dimensions)
+
+
+def render_answer(result: SQLResult, max_rows: int = 10) -> Optional[str]:
+    """
+    Plain-text answer for a simple ``result``, or None when the LLM should explain it.
+
+    Handled shapes: no rows, a single scalar, one row, up to ``max_rows`` rows tied on
+    every numeric value, and small tables (up to ``max_rows`` rows, ``MAX_COLUMNS`` columns).
+    """
+    if result.truncated or not result.columns or len(result.columns) > MAX_COLUMNS:
+        return None
+    if result.row_count == 0:
+        return "No data matched the query."
+    if result.row_count > max_rows:
+        return None
+
+    measures, dimensions = _split_columns(result)
+
+    if result.row_count == 1:
+        if len(result.columns) == 1:
+            col = result.columns[0]
+            if measures:
+                return f"{format_measure(col, result.data[col][0])} ({column_label(col)})."
+            return f"{_format_dimension(col, result.data[col][0])}."
+        if not measures:
+            return f"{_dimensions_text(result, dimensions, 0)}."
+        where = f" ({_dimensions_text(result, dimensions, 0)})" if dimensions else ""
+        return f"{_measures_text(result, measures, 0)}{where}."
+
+    rows = range(result.row_count)
+    tied = measures and dimensions and all(len(set(result.data[c])) == 1 for c in measures)
+    if tied:
+        header = f"{_measures_text(result, measures, 0)}, tied across {result.row_count} results:"
+        return "\n".join([header] + [f"- {_dimensions_text(result, dimensions, i)}" for i in rows])
+
+    lines = []
+    for i in rows:
+        parts = [p for p in (_measures_text(result, measures, i), _dimensions_text(result, dimensions, i)) if p]
+        lines.append("- " + " — ".join(parts))
+    return "\n".join(lines)
@@ -1,15 +1,100 @@
-from fastapi import FastAPI
+import asyncio
+import json
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from batch_qa import BatchProgress, parse_question, run_batch
+from config import settings
+from db_engines import pool_stats
 from hybrid_qa import HybridQAPipeline
+from llm_factory import client_stats
+from resilience import stats as resilience_stats
+from shared_state import get_shared_store
 
 app = FastAPI()
 
+# One pipeline per process, built on first use (or by the startup warm-up), instead of one per request.
+_pipeline: Optional[HybridQAPipeline] = None
+_pipeline_lock = threading.Lock()
+
+def get_pipeline() -> HybridQAPipeline:
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = HybridQAPipeline()
+    return _pipeline
+
+@app.on_event("startup")
+async def warm_up():
+    # Runs in the background: the server accepts requests while subsystems load.
+    if settings.warm_up:
+        asyncio.get_running_loop().run_in_executor(None, lambda: get_pipeline().warm_up())
+
 class Question(BaseModel):
     question: str
 
 class Answer(BaseModel):
     answer: str
+    route: Optional[str] = None
+    sql_query: Optional[str] = None
+    sql_columns: Optional[List[str]] = None
+    sql_rows: Optional[List[Dict[str, Any]]] = None
 
-@app.post("/ask")
+@app.post("/ask", response_model=Answer)
 def ask(question: Question):
-    return {"answer": HybridQAPipeline().ask(question.question).answer}
\ No newline at end of file
+    result = get_pipeline().ask(question.question)
+    return Answer(
+        answer=result.answer,
+        route=result.route,
+        sql_query=result.sql_query,
+        sql_columns=result.sql_columns,
+        sql_rows=result.sql_rows,
+    )
+
+class BatchRequest(BaseModel):
+    # Plain strings or {"id": ..., "question": ..., "history": ...}; ids default to the position (1-based).
+    questions: List[Union[str, Dict[str, Any]]]
+    concurrency: Optional[int] = None
+
+@app.post("/ask_batch")
+def ask_batch(batch: BatchRequest):
+    """
+    Answer many questions with bounded concurrency. Streams NDJSON: one line per
+    answer (with its "id") as soon as it is ready, in completion order, then a
+    final {"summary": ...} line with counts and throughput. To resume an
+    interrupted batch, send again only the ids that have no answer yet.
+    """
+    if len(batch.questions) > settings.batch_max_questions:
+        raise HTTPException(413, f"At most {settings.batch_max_questions} questions per batch.")
+    try:
+        questions = [parse_question(item, str(i)) for i, item in enumerate(batch.questions, start=1)]
+    except ValueError as exc:
+        raise HTTPException(422, str(exc))
+    concurrency = min(batch.concurrency or settings.batch_concurrency, settings.batch_concurrency)
+    progress = BatchProgress(len(questions))
+
+    def stream():
+        for record in run_batch(get_pipeline(), questions, concurrency=concurrency, progress=progress):
+            yield json.dumps(record, default=str) + "\n"
+        yield json.dumps({"summary": progress.snapshot()}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/pool_stats")
+def get_pool_stats():
+    """Connection pool usage per database: in-use/idle connections and checkout wait times."""
+    return pool_stats()
+
+@app.get("/resilience_stats")
+def get_resilience_stats():
+    """
+    Timeouts, hedged calls, latency percentiles per stage, circuit breaker states
+    and the shared OpenAI rate limiter (requests throttled, seconds waited, 429s),
+    plus the cross-worker cache in multi-worker mode (hits, misses, entries per cache).
+    """
+    store = get_shared_store()
+    return {**resilience_stats(), "openai": client_stats(), "shared_cache": store.stats() if store else None}
@@ -0,0 +1,188 @@
+"""
+Answer many questions at once with one shared HybridQAPipeline.
+
+Used by ``POST /ask_batch`` and ``hybrid_cli.py --input``. Questions run on at most
+BATCH_CONCURRENCY threads against the same pipeline, so the SQL engine and schema,
+the vector store, the LLM clients, the rate limiter and the answer cache are built
+once and shared by the whole batch. Questions that repeat within a batch
+(normalized like the answer cache) are answered once. Results are yielded as soon
+as each one finishes, not in input order; every result carries the question's ``id``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchQuestion:
+    id: str
+    question: str
+    history: Optional[str] = None
+
+
+def parse_question(item: Any, default_id: str) -> BatchQuestion:
+    """A batch entry: a plain string or ``{"id": ..., "question": ..., "history": ...}``."""
+    if isinstance(item, str):
+        return BatchQuestion(default_id, item)
+    if isinstance(item, dict) and isinstance(item.get("question"), str):
+        item_id = item.get("id")
+        return BatchQuestion(str(item_id) if item_id is not None else default_id, item["question"], item.get("history"))
+    raise ValueError(f"Batch entry {default_id} needs a 'question' string: {item!r}")
+
+
+def read_questions(path: str) -> List[BatchQuestion]:
+    """Questions from a JSONL file; entries without an ``id`` are numbered by line."""
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if line.strip():
+                questions.append(parse_question(json.loads(line), str(number)))
+    return questions
+
+
+def answered_ids(path: str) -> Set[str]:
+    """
+    Ids already answered without error in a previous run's output. Failed results are
+    dropped from the file so that a resumed run can retry them.
+    """
+    if not os.path.exists(path):
+        return set()
+    kept, done = [], set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut off when the previous run was killed
+            if isinstance(record, dict) and "id" in record and not record.get("error"):
+                kept.append(line if line.endswith("\n") else line + "\n")
+                done.add(str(record["id"]))
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.writelines(kept)
+    os.replace(tmp, path)
+    return done
+
+
+def answer_record(question: BatchQuestion, result: Any, seconds: float) -> Dict[str, Any]:
+    """JSON-serializable result of one question (``result`` is a HybridAnswer)."""
+    return {
+        "id": question.id,
+        "question": question.question,
+        "answer": result.answer,
+        "route": result.route,
+        "sql_query": result.sql_query,
+        "sql_columns": result.sql_columns,
+        "sql_rows": result.sql_rows,
+        "fast_path": result.fast_path,
+        "error": result.error,
+        "seconds": round(seconds, 3),
+    }
+
+
+class BatchProgress:
+    """Completed/failed counts, throughput and ETA of a running batch. Thread-safe."""
+
+    def __init__(self, total: int) -> None:
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.done += 1
+            self.failed += bool(record.get("error"))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            rate = self.done / elapsed if elapsed > 0 else 0.0
+            remaining = self.total - self.done
+            return {
+                "done": self.done,
+                "total": self.total,
+                "failed": self.failed,
+                "seconds": round(elapsed, 1),
+                "questions_per_second": round(rate, 2),
+                "eta_seconds": round(remaining / rate, 1) if rate > 0 else None,
+            }
+
+    def __str__(self) -> str:
+        s = self.snapshot()
+        eta = f", ETA {s['eta_seconds']:.0f}s" if s["eta_seconds"] is not None and s["done"] < s["total"] else ""
+        return (
+            f"[{s['done']}/{s['total']}] {s['failed']} failed, "
+            f"{s['questions_per_second']:.2f} q/s, {s['seconds']:.0f}s elapsed{eta}"
+        )
+
+
+def _key(qa: Any, question: BatchQuestion) -> Optional[str]:
+    # Follow-ups depend on their history, so only standalone questions are shared.
+    return None if question.history else qa._cache_key(question.question)
+
+
+def run_batch(
+    qa: Any,
+    questions: Iterable[BatchQuestion],
+    concurrency: Optional[int] = None,
+    progress: Optional[BatchProgress] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Answer ``questions`` with ``qa`` (a HybridQAPipeline) on ``concurrency`` threads
+    (BATCH_CONCURRENCY by default), yielding one ``answer_record`` per question as
+    soon as it is ready. A question that raises yields a record with ``error`` set.
+    """
+    questions = list(questions)
+    concurrency = max(concurrency or settings.batch_concurrency, 1)
+
+    # Repeated questions wait for the first one instead of being answered again.
+    groups: Dict[Any, List[BatchQuestion]] = {}
+    for i, question in enumerate(questions):
+        groups.setdefault(_key(qa, question) or ("#", i), []).append(question)
+
+    def answer(question: BatchQuestion) -> Any:
+        try:
+            return qa.ask(question.question, history=question.history)
+        except Exception as exc:
+            logger.warning("Batch question %s failed: %s", question.id, exc)
+            from hybrid_qa import HybridAnswer
+
+            return HybridAnswer(route="error", answer="Sorry, this question could not be answered.", error=str(exc))
+
+    pending: Dict[Future, tuple] = {}
+    queue = iter(groups.values())
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+
+        def submit_next() -> None:
+            group = next(queue, None)
+            if group is not None:
+                pending[pool.submit(answer, group[0])] = (group, time.monotonic())
+
+        # Submit lazily so that a consumer that stops early leaves no backlog behind.
+        for _ in range(concurrency):
+            submit_next()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                group, started = pending.pop(future)
+                result, seconds = future.result(), time.monotonic() - started
+                for question in group:
+                    record = answer_record(question, result, seconds)
+                    if progress is not None:
+                        progress.record(record)
+                    yield record
+                submit_next()
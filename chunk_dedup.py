@@ -0,0 +1,173 @@
+"""
+Exact and near-duplicate chunk removal before embedding.
+
+Boilerplate (repeated PDF headers/footers, identical justification sentences,
+templated rows) would otherwise be embedded many times and crowd the top-k with
+copies of the same text. ``dedup_documents`` keeps the first chunk of every
+duplicate group as the canonical one and records every source it stood for in its
+metadata:
+
+- exact duplicates: xxh3 hash of the whitespace/case-normalized text;
+- near duplicates: MinHash signatures of word shingles, bucketed with LSH and
+  confirmed by estimated Jaccard similarity >= ``threshold``. Only chunks with the
+  same record identity (``IDENTITY_KEYS`` in their metadata) are compared: templated
+  records such as the per-hotel monthly CSV summaries differ in a few numbers only,
+  yet each one is a different fact.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+import xxhash
+
+NUM_PERM = 128
+SHINGLE_WORDS = 5
+_MERSENNE = np.uint64((1 << 61) - 1)
+_WORD = re.compile(r"\w+")
+# Metadata that identifies a structured record (csv_summaries.py, CSV loader rows).
+IDENTITY_KEYS = ("doc_type", "hotel_name", "month", "row")
+
+
+@dataclass
+class DedupReport:
+    total: int
+    exact_removed: int = 0
+    near_removed: int = 0
+
+    @property
+    def kept(self) -> int:
+        return self.total - self.exact_removed - self.near_removed
+
+    def __str__(self) -> str:
+        removed = self.exact_removed + self.near_removed
+        share = 100 * removed / self.total if self.total else 0.0
+        return (
+            f"Dedup: kept {self.kept} of {self.total} chunks, removed {removed} ({share:.1f}%): "
+            f"{self.exact_removed} exact, {self.near_removed} near-duplicate."
+        )
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _bands_for(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    (bands, rows) with bands * rows <= num_perm whose LSH S-curve
+    threshold (1 / bands) ** (1 / rows) is closest to ``threshold``.
+    """
+    best = (1, num_perm)
+    best_gap = float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        gap = abs((1 / bands) ** (1 / rows) - threshold)
+        if gap < best_gap:
+            best, best_gap = (bands, rows), gap
+    return best
+
+
+class MinHasher:
+    """MinHash signatures from word shingles, with universal hashing over xxh32 values."""
+
+    def __init__(self, num_perm: int = NUM_PERM, shingle_words: int = SHINGLE_WORDS, seed: int = 1) -> None:
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        # a, b and the 32-bit shingle hashes are < 2**32, so a * h + b cannot overflow uint64.
+        self.a = rng.integers(1, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+
+    def shingles(self, text: str) -> List[str]:
+        words = _WORD.findall(text.lower())
+        k = min(self.shingle_words, len(words)) or 1
+        return [" ".join(words[i : i + k]) for i in range(max(len(words) - k + 1, 1))]
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (xxhash.xxh32_intdigest(s) for s in self.shingles(text)), dtype=np.uint64
+        ).reshape(1, -1)
+        permuted = (self.a * hashes + self.b) % _MERSENNE
+        return permuted.min(axis=1)
+
+
+def _identity(metadata: Dict[str, Any]) -> Tuple[Any, ...]:
+    return tuple(metadata.get(key) for key in IDENTITY_KEYS)
+
+
+def _source_label(metadata: Dict[str, Any]) -> str:
+    source = str(metadata.get("source", "unknown"))
+    if metadata.get("hotel_name") is not None:
+        source += f" {metadata['hotel_name']}"
+    if metadata.get("month") is not None:
+        source += f" {metadata['month']}"
+    if metadata.get("page") is not None:
+        source += f" p.{metadata['page']}"
+    if metadata.get("row") is not None:
+        source += f" row {metadata['row']}"
+    return source
+
+
+def _merge_source(canonical: Any, duplicate: Any) -> None:
+    meta = canonical.metadata
+    sources = meta.get("sources") or _source_label(meta)
+    label = _source_label(duplicate.metadata)
+    if label not in sources.split("; "):
+        sources = f"{sources}; {label}"
+    # Chroma metadata values must be scalars, so the sources are one joined string.
+    meta["sources"] = sources
+    meta["duplicates"] = int(meta.get("duplicates", 0)) + 1
+
+
+def dedup_documents(docs: Sequence[Any], threshold: float = 0.85) -> Tuple[List[Any], DedupReport]:
+    """
+    Drop exact and near-duplicate chunks (``page_content`` + ``metadata`` objects,
+    e.g. LangChain Documents), keeping the first of each group in order. Returns the
+    kept chunks and a report. ``threshold`` >= 1 disables near-duplicate detection.
+    """
+    report = DedupReport(total=len(docs))
+    hasher = MinHasher()
+    bands, rows = _bands_for(threshold, hasher.num_perm)
+    exact: Dict[int, Any] = {}
+    buckets: Dict[Tuple[Tuple[Any, ...], int, bytes], List[int]] = {}
+    kept: List[Any] = []
+    signatures: List[np.ndarray] = []
+
+    for doc in docs:
+        text = _normalize(doc.page_content)
+        digest = xxhash.xxh3_64_intdigest(text)
+        if digest in exact:
+            _merge_source(exact[digest], doc)
+            report.exact_removed += 1
+            continue
+
+        match = None
+        if threshold < 1:
+            signature = hasher.signature(text)
+            identity = _identity(doc.metadata)
+            keys = [
+                (identity, band, signature[band * rows : (band + 1) * rows].tobytes()) for band in range(bands)
+            ]
+            candidates = {i for key in keys for i in buckets.get(key, ())}
+            for i in sorted(candidates):
+                if float(np.mean(signatures[i] == signature)) >= threshold:
+                    match = kept[i]
+                    break
+        if match is not None:
+            _merge_source(match, doc)
+            report.near_removed += 1
+            continue
+
+        exact[digest] = doc
+        if threshold < 1:
+            for key in keys:
+                buckets.setdefault(key, []).append(len(kept))
+            signatures.append(signature)
+        else:
+            signatures.append(np.empty(0))
+        kept.append(doc)
+
+    return kept, report
@@ -12,16 +12,99 @@ class Settings:
     # OpenAI configuration
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    # Per-stage models (default: OPENAI_MODEL). SQL generation starts with SQL_MODEL and,
+    # when SQL_STRONG_MODEL is set, escalates to it if the SQL fails or unexpectedly
+    # returns nothing (SQL_CASCADE). Empty (the default) keeps a single model.
+    router_model: str = os.getenv("ROUTER_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+    sql_model: str = os.getenv("SQL_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+    sql_strong_model: str = os.getenv("SQL_STRONG_MODEL", "")
+    sql_cascade: bool = os.getenv("SQL_CASCADE", "true").lower() in {"1", "true", "yes"}
+    explain_model: str = os.getenv("EXPLAIN_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+    rag_model: str = os.getenv("RAG_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+    combine_model: str = os.getenv("COMBINE_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    # One keep-alive HTTP client and one client-side rate limiter shared by every OpenAI
+    # client in the process (llm_factory.py). Requests / tokens per minute; 0 disables.
+    openai_rpm: int = int(os.getenv("OPENAI_RPM", "500"))
+    openai_tpm: int = int(os.getenv("OPENAI_TPM", "200000"))
+    openai_max_connections: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+
+    # Resilience (resilience.py): whole-request deadline, cap per LLM call, delay before
+    # a hedged duplicate of a slow router/SQL/explain call (0 disables; the observed p95
+    # is used once known), circuit breakers for the LLM provider and the database, and the
+    # minimum time left for the RAG fallback after the SQL route fails.
+    request_timeout_seconds: float = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "60"))
+    llm_timeout_seconds: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+    llm_hedge_after_seconds: float = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "3"))
+    llm_max_workers: int = int(os.getenv("LLM_MAX_WORKERS", "32"))
+    breaker_failure_threshold: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    breaker_reset_seconds: float = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+    rag_fallback_min_seconds: float = float(os.getenv("RAG_FALLBACK_MIN_SECONDS", "10"))
 
     # Paths
     data_dir: str = os.getenv("DATA_DIR", "data")
     chroma_dir: str = os.getenv("CHROMA_DIR", "chroma_db")
+    # HNSW index of the Chroma collection (Chroma's defaults). M and construction_ef are
+    # fixed when `ingest.py` builds the collection; search_ef is applied on every load.
+    # Higher values: better recall, slower build/search. Compare with hnsw_benchmark.py.
+    hnsw_m: int = int(os.getenv("HNSW_M", "16"))
+    hnsw_construction_ef: int = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+    hnsw_search_ef: int = int(os.getenv("HNSW_SEARCH_EF", "100"))
 
     # RAG parameters
+    # Splitter for ingest: "tokens" (text_splitter.py) sizes chunks in tokens, keeps PDF
+    # pages and sections together and overlaps only where a section is cut; "recursive"
+    # is the character-based splitter using CHUNK_SIZE / CHUNK_OVERLAP.
+    splitter: str = os.getenv("SPLITTER", "tokens").lower()
+    chunk_tokens: int = int(os.getenv("CHUNK_TOKENS", "300"))
+    chunk_overlap_tokens: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+    # Processes used to split documents (0 = one per CPU).
+    ingest_workers: int = int(os.getenv("INGEST_WORKERS", "0"))
     chunk_size: int = int(os.getenv("CHUNK_SIZE", "1000"))
     chunk_overlap: int = int(os.getenv("CHUNK_OVERLAP", "200"))
     k: int = int(os.getenv("K", "4"))  # top-k documents to retrieve
+    # "adaptive": fetch RETRIEVAL_MAX_K scored candidates and keep those with relevance
+    # >= RETRIEVAL_MIN_RELEVANCE, cut at the first big score drop (>= RETRIEVAL_ELBOW_GAP),
+    # never fewer than RETRIEVAL_MIN_K. "fixed": always K chunks.
+    retrieval_mode: str = os.getenv("RETRIEVAL_MODE", "adaptive").lower()
+    retrieval_min_k: int = int(os.getenv("RETRIEVAL_MIN_K", "2"))
+    retrieval_max_k: int = int(os.getenv("RETRIEVAL_MAX_K", "8"))
+    retrieval_min_relevance: float = float(os.getenv("RETRIEVAL_MIN_RELEVANCE", "0.3"))
+    retrieval_elbow_gap: float = float(os.getenv("RETRIEVAL_ELBOW_GAP", "0.08"))
+    # How CSVs are indexed: "summary" turns the daily hotels CSV into one document per
+    # hotel and month (csv_summaries.py); "rows" embeds every row as its own document.
+    csv_ingest_mode: str = os.getenv("CSV_INGEST_MODE", "summary").lower()
+    # Drop exact and near-duplicate chunks before embedding (chunk_dedup.py). Chunks whose
+    # estimated Jaccard similarity reaches the threshold count as near duplicates (>= 1: exact only).
+    dedup_chunks: bool = os.getenv("DEDUP_CHUNKS", "true").lower() in {"1", "true", "yes"}
+    dedup_threshold: float = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+    # Token budget for the retrieved chunks placed in the combined sql+rag prompt.
+    hybrid_context_max_tokens: int = int(os.getenv("HYBRID_CONTEXT_MAX_TOKENS", "1500"))
+
+    # SQL backend: "mysql" (networked server) or "sqlite" (embedded file built from the CSV).
+    sql_backend: str = os.getenv("SQL_BACKEND", "mysql").lower()
+    sqlite_path: str = os.getenv("SQLITE_PATH", "dubai_analytics.sqlite")
+
+    # Answer simple KPI questions from the in-process metric cube (metric_cube.py).
+    metric_cube: bool = os.getenv("METRIC_CUBE", "true").lower() in {"1", "true", "yes"}
+    # How often the cube re-checks the table version and reloads after a data refresh.
+    metric_cube_refresh_seconds: int = int(os.getenv("METRIC_CUBE_REFRESH_SECONDS", "60"))
+    # Build the SQL engine, vector store and LLM clients in a background task at server
+    # startup instead of on the first request.
+    warm_up: bool = os.getenv("WARM_UP", "true").lower() in {"1", "true", "yes"}
+    # Answers cached per (standalone question, data version); 0 disables the cache.
+    answer_cache_size: int = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+    # Append-only log of every answered question (query_log.py, read by query_report.py):
+    # route, SQL and its execution time, stage latencies, tokens, cache hits. "" disables.
+    query_log_path: str = os.getenv("QUERY_LOG_PATH", "query_log.sqlite")
+    # Batch answering (batch_qa.py: POST /ask_batch, hybrid_cli.py --input): questions
+    # answered at once, and the most questions one /ask_batch request may carry.
+    batch_concurrency: int = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    batch_max_questions: int = int(os.getenv("BATCH_MAX_QUESTIONS", "1000"))
+    # Render simple SQL results (scalars, one row, ties, small tables) without the
+    # explanation LLM call; larger results are still explained by the LLM.
+    answer_templates: bool = os.getenv("ANSWER_TEMPLATES", "true").lower() in {"1", "true", "yes"}
+    answer_template_max_rows: int = int(os.getenv("ANSWER_TEMPLATE_MAX_ROWS", "10"))
 
     # MySQL / SQL settings
     mysql_host: str = os.getenv("MYSQL_HOST", "localhost")
@@ -30,8 +113,74 @@ class Settings:
     mysql_user: str = os.getenv("MYSQL_USER", "root")
     mysql_password: str = os.getenv("MYSQL_PASSWORD", "basit456")
     mysql_table: str = os.getenv("MYSQL_TABLE", "dubai_hotels_daily")
+    # Extra tables the SQL pipeline may query (comma-separated), besides MYSQL_TABLE.
+    sql_tables: str = os.getenv("SQL_TABLES", "")
+    # Schema subset selection (schema_catalog.py): once the schema exceeds
+    # SQL_SCHEMA_MAX_TABLES tables or SQL_SCHEMA_MAX_COLUMNS columns in a table, only the
+    # tables/columns most similar to the question go into the prompt. Descriptions come
+    # from SQL_SCHEMA_DESCRIPTIONS (JSON) and are embedded once into SQL_CATALOG_PATH.
+    sql_schema_max_tables: int = int(os.getenv("SQL_SCHEMA_MAX_TABLES", "4"))
+    sql_schema_max_columns: int = int(os.getenv("SQL_SCHEMA_MAX_COLUMNS", "15"))
+    sql_schema_descriptions: str = os.getenv("SQL_SCHEMA_DESCRIPTIONS", "")
+    sql_catalog_path: str = os.getenv("SQL_CATALOG_PATH", "sql_catalog.npz")
     # Optional full SQLAlchemy URL; if empty, it will be built from the above pieces.
     mysql_url: str = os.getenv("MYSQL_URL", "")
+    # Source CSV for the hotels table and the table holding per-table load versions.
+    hotels_csv: str = os.getenv(
+        "HOTELS_CSV", f"{os.getenv('DATA_DIR', 'data')}/dubai_hotels_synthetic_daily_2y_enriched.csv"
+    )
+    mysql_version_table: str = os.getenv("MYSQL_VERSION_TABLE", "table_versions")
+    # Rewrite eligible aggregate queries onto the monthly / yearly rollup tables.
+    sql_rollups: bool = os.getenv("SQL_ROLLUPS", "true").lower() in {"1", "true", "yes"}
+    # Number of times each rewritten query shape is checked against the original query.
+    rollup_verify_runs: int = int(os.getenv("ROLLUP_VERIFY_RUNS", "3"))
+
+    # Guard for generated SQL (sql_guard.py): EXPLAIN cost limit (0 disables),
+    # per-query timeout in milliseconds and maximum rows returned.
+    sql_max_cost: float = float(os.getenv("SQL_MAX_COST", "1000000"))
+    sql_timeout_ms: int = int(os.getenv("SQL_TIMEOUT_MS", "5000"))
+    sql_max_rows: int = int(os.getenv("SQL_MAX_ROWS", "1000"))
+    # Rows / tokens of an SQL result rendered into answer prompts (tied extreme rows always included).
+    sql_prompt_max_rows: int = int(os.getenv("SQL_PROMPT_MAX_ROWS", "50"))
+    sql_prompt_max_tokens: int = int(os.getenv("SQL_PROMPT_MAX_TOKENS", "1500"))
+
+    # Shared connection pool per database URL (db_engines.py).
+    sql_pool_size: int = int(os.getenv("SQL_POOL_SIZE", "5"))
+    sql_max_overflow: int = int(os.getenv("SQL_MAX_OVERFLOW", "10"))
+    sql_pool_timeout: float = float(os.getenv("SQL_POOL_TIMEOUT", "30"))
+    sql_pool_pre_ping: bool = os.getenv("SQL_POOL_PRE_PING", "true").lower() in {"1", "true", "yes"}
+    # Seconds after which pooled connections are replaced (below MySQL's wait_timeout).
+    sql_pool_recycle: int = int(os.getenv("SQL_POOL_RECYCLE", "1800"))
+
+    # Multi-worker serving (shared_state.py, vector_index.py). "multi": several worker
+    # processes on one host share answer/SQL/embedding caches and Telegram update ids
+    # in SHARED_STATE_DIR/cache.sqlite (SQLite WAL), chat history in
+    # SHARED_STATE_DIR/chat_memory.sqlite (unless CHAT_MEMORY_DB is set), serialize each
+    # chat's turns with a cross-process lock, and search a memory-mapped read-only copy
+    # of the vectors (VECTOR_BACKEND=mmap) instead of loading Chroma in every worker.
+    worker_mode: str = os.getenv("WORKER_MODE", "single").lower()
+    shared_state_dir: str = os.getenv("SHARED_STATE_DIR", "shared_state")
+    shared_cache_max_entries: int = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "50000"))  # per cache
+    shared_cache_ttl_seconds: float = float(os.getenv("SHARED_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    vector_backend: str = os.getenv(
+        "VECTOR_BACKEND", "mmap" if os.getenv("WORKER_MODE", "single").lower() == "multi" else "chroma"
+    ).lower()
+    vector_mmap_dir: str = os.getenv("VECTOR_MMAP_DIR", f"{os.getenv('CHROMA_DIR', 'chroma_db')}_mmap")
+
+    # Chat memory (memory_store.py): LRU bound on chats kept in process, idle expiry,
+    # recent messages kept verbatim, token budget of the running summary of older
+    # messages, and an optional SQLite file for persistence ("" = in-memory only).
+    chat_memory_max_chats: int = int(os.getenv("CHAT_MEMORY_MAX_CHATS", "10000"))
+    chat_memory_ttl_seconds: float = float(os.getenv("CHAT_MEMORY_TTL_SECONDS", str(7 * 24 * 3600)))
+    chat_memory_max_messages: int = int(os.getenv("CHAT_MEMORY_MAX_MESSAGES", "6"))
+    chat_memory_summary_tokens: int = int(os.getenv("CHAT_MEMORY_SUMMARY_TOKENS", "200"))
+    chat_memory_db: str = os.getenv("CHAT_MEMORY_DB", "")
+
+    # Telegram webhook dispatcher (update_dispatcher.py): updates processed at once,
+    # pending updates per chat before the "busy" reply, and total pending updates.
+    telegram_max_concurrency: int = int(os.getenv("TELEGRAM_MAX_CONCURRENCY", "4"))
+    telegram_chat_queue_size: int = int(os.getenv("TELEGRAM_CHAT_QUEUE_SIZE", "5"))
+    telegram_max_pending: int = int(os.getenv("TELEGRAM_MAX_PENDING", "1000"))
 
 
 settings = Settings()
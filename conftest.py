@@ -0,0 +1,11 @@
+import pytest
+
+import query_log
+from config import settings
+
+
+@pytest.fixture(autouse=True)
+def _isolated_query_log(tmp_path, monkeypatch):
+    # Pipelines under test must never append to the real QUERY_LOG_PATH.
+    monkeypatch.setattr(settings, "query_log_path", str(tmp_path / "query_log.sqlite"))
+    monkeypatch.setattr(query_log, "_log", None)
@@ -0,0 +1,112 @@
+"""
+Per-hotel, per-month summary documents for the daily hotels CSV.
+
+Embedding the CSV row by row (``CSVLoader``) produces one nearly identical document
+per hotel-day, each repeating the same long ``Justification`` text. For RAG it is
+enough to know what a month looked like and why; exact daily numbers are answered
+from SQL. ``summarize_hotels_csv`` turns the ~2,200 daily rows into one short
+document per hotel and month: key stats plus the distinct justifications.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List
+
+import pandas as pd
+
+from config import settings
+
+# Columns that identify the daily hotels CSV (other CSVs are loaded row by row).
+REQUIRED_COLUMNS = {"hotel_name", "date", "ADR", "Occupancy_%", "Rooms_Sold", "Rooms_Available"}
+_SENTENCE_END = re.compile(r"(?<=\.)\s+")
+
+
+def is_daily_hotels_csv(columns: Iterable[str]) -> bool:
+    return REQUIRED_COLUMNS.issubset(set(columns))
+
+
+def _fmt_date(d: Any) -> str:
+    return f"{d.day} {d:%B} {d.year}"
+
+
+def _money(value: float) -> str:
+    return f"{round(float(value), 2)} AED"
+
+
+def _pct(value: float) -> str:
+    return f"{round(float(value), 1)}%"
+
+
+def _month_text(hotel: str, month: pd.DataFrame) -> str:
+    first, last = month["parsed_date_temp"].min(), month["parsed_date_temp"].max()
+    adr, occ = month["ADR"], month["Occupancy_%"]
+    sold, available = int(month["Rooms_Sold"].sum()), int(month["Rooms_Available"].sum())
+    revenue = float((month["ADR"] * month["Rooms_Sold"]).sum())
+
+    lines = [
+        f"{hotel} — {first:%B} {first.year} daily performance summary "
+        f"({len(month)} days, {_fmt_date(first)} to {_fmt_date(last)}).",
+        f"ADR: average {_money(adr.mean())} (lowest {_money(adr.min())}, highest {_money(adr.max())})"
+        + (f"; competition average {_money(month['ADR_Competition'].mean())}." if "ADR_Competition" in month else "."),
+        f"Occupancy: average {_pct(occ.mean())} (lowest {_pct(occ.min())}, highest {_pct(occ.max())})"
+        + (
+            f"; competition average {_pct(month['Occupancy_Competition_%'].mean())}."
+            if "Occupancy_Competition_%" in month
+            else "."
+        ),
+        f"Rooms sold: {sold:,} of {available:,} available. Room revenue: {round(revenue, 2):,} AED.",
+    ]
+    if "Justification" in month:
+        # Justifications are combinations of a few stock sentences: count each sentence once.
+        reasons = Counter(
+            sentence.strip().rstrip(".")
+            for text in month["Justification"].dropna()
+            for sentence in set(_SENTENCE_END.split(str(text)))
+            if sentence.strip()
+        )
+        if reasons:
+            lines.append("Why (distinct explanations, days each applied):")
+            lines.extend(f"- {text} ({days} day{'s' if days != 1 else ''})." for text, days in reasons.most_common())
+    lines.append("Exact daily figures are in the SQL table; use SQL for specific dates.")
+    return "\n".join(lines)
+
+
+def summarize_frame(df: pd.DataFrame, source: str) -> List[Dict[str, Any]]:
+    """
+    One ``{"text": ..., "metadata": ...}`` per hotel and calendar month of ``df``
+    (the daily hotels CSV as read by pandas).
+    """
+    from load_mysql import prepare_frame
+
+    df = prepare_frame(df)
+    dates = pd.to_datetime(df["parsed_date_temp"])
+    docs = []
+    for (hotel, period), month in df.groupby([df["hotel_name"], dates.dt.to_period("M")], sort=True):
+        docs.append(
+            {
+                "text": _month_text(hotel, month),
+                "metadata": {
+                    "hotel_name": hotel,
+                    "month": str(period),
+                    "days": len(month),
+                    "source": source,
+                    "doc_type": "csv_month_summary",
+                },
+            }
+        )
+    return docs
+
+
+def summarize_hotels_csv(path: str) -> List[Dict[str, Any]]:
+    return summarize_frame(pd.read_csv(path), os.path.basename(path))
+
+
+def csv_files(data_dir: str = "") -> List[str]:
+    data_dir = data_dir or settings.data_dir
+    found = []
+    for root, _, files in os.walk(data_dir):
+        found.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(".csv"))
+    return found
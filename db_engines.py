@@ -0,0 +1,115 @@
+"""
+Process-wide registry of pooled SQLAlchemy engines.
+
+Every SQLPipeline (one per API request) gets its engine from here, so concurrent
+SQL questions reuse warm pooled connections instead of opening a new TCP/auth
+session per pipeline. Pool size, overflow, pre-ping and recycle come from settings.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+from config import settings
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited and how many failed."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.connections_opened = 0
+
+    def connect(self):  # type: ignore[override]
+        start = time.perf_counter()
+        try:
+            conn = super().connect()
+        except Exception:
+            with self._stats_lock:
+                self.checkout_timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.checkout_wait_total += waited
+            self.checkout_wait_max = max(self.checkout_wait_max, waited)
+        return conn
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "pool_size": self.size(),
+                "in_use": self.checkedout(),
+                "idle": self.checkedin(),
+                "overflow": max(self.overflow(), 0),
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.checkout_timeouts,
+                "checkout_wait_avg_ms": round(1000 * self.checkout_wait_total / self.checkouts, 3) if self.checkouts else 0.0,
+                "checkout_wait_max_ms": round(1000 * self.checkout_wait_max, 3),
+                "connections_opened": self.connections_opened,
+            }
+
+
+def _count_new_connections(engine: Engine) -> None:
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        engine.pool.connections_opened += 1  # type: ignore[attr-defined]
+
+
+_engines: Dict[str, Engine] = {}
+_lock = threading.Lock()
+
+
+def get_engine(url: str) -> Engine:
+    """Return the shared engine for ``url``, creating it on first use."""
+    engine = _engines.get(url)
+    if engine is not None:
+        return engine
+
+    with _lock:
+        engine = _engines.get(url)
+        if engine is None:
+            connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+            engine = create_engine(
+                url,
+                poolclass=InstrumentedQueuePool,
+                pool_size=settings.sql_pool_size,
+                max_overflow=settings.sql_max_overflow,
+                pool_timeout=settings.sql_pool_timeout,
+                pool_pre_ping=settings.sql_pool_pre_ping,
+                pool_recycle=settings.sql_pool_recycle,
+                connect_args=connect_args,
+            )
+            _count_new_connections(engine)
+
+            _engines[url] = engine
+        return engine
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Checkout-wait and in-use counters per registered engine (passwords masked)."""
+    with _lock:
+        engines = dict(_engines)
+    return {
+        make_url(url).render_as_string(hide_password=True): engine.pool.stats()  # type: ignore[attr-defined]
+        for url, engine in engines.items()
+    }
+
+
+def dispose_engines() -> None:
+    """Close all pooled connections (e.g. on shutdown or after forking)."""
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
@@ -0,0 +1,186 @@
+"""
+Sweep the HNSW parameters of the Chroma collection and compare recall@k, query
+latency and index build time.
+
+The vectors come from the existing CHROMA_DIR collection (run `ingest.py` first), so
+no embedding calls are made. For every (M, construction_ef, search_ef) combination the
+vectors are indexed into a throwaway in-memory collection created with those values
+(chromadb does not pick up a search_ef change on an index it has already loaded, so
+the value cannot be swept on one collection). Recall@k is measured against exact
+brute-force search over the same vectors.
+
+Usage:
+    uv run hnsw_benchmark.py                                  # default grid, k = RETRIEVAL_MAX_K
+    uv run hnsw_benchmark.py --m 8,16,32 --construction-ef 64,128,256 --search-ef 16,64,128
+    uv run hnsw_benchmark.py --questions                      # also embed sample questions as queries
+                                                              # (needs OPENAI_API_KEY)
+
+Queries are stored vectors (the vector itself is left out of its own results) plus,
+with --questions, the embedded sample questions of splitter_report.py. Apply the
+chosen values with HNSW_M / HNSW_CONSTRUCTION_EF (re-run ingest.py) and HNSW_SEARCH_EF.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import settings
+from rag_core import hnsw_metadata
+
+DEFAULT_COLLECTION = "langchain"  # LangChain's default collection name
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+def load_vectors(chroma_dir: str, collection: str = DEFAULT_COLLECTION) -> Tuple[np.ndarray, str]:
+    """All embeddings of a persisted Chroma collection, and its distance space."""
+    import chromadb
+
+    col = chromadb.PersistentClient(path=chroma_dir).get_collection(collection)
+    vectors = np.asarray(col.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+    space = (col.metadata or {}).get("hnsw:space")
+    if space is None:
+        space = ((getattr(col, "configuration", None) or {}).get("hnsw") or {}).get("space", "l2")
+    return vectors, space
+
+
+def exact_neighbors(vectors: np.ndarray, queries: np.ndarray, k: int, space: str = "l2") -> np.ndarray:
+    """Row indices of the ``k`` nearest ``vectors`` for every query (brute force)."""
+    if space == "l2":
+        distances = (
+            (queries**2).sum(axis=1, keepdims=True) - 2 * queries @ vectors.T + (vectors**2).sum(axis=1)
+        )
+    else:
+        if space == "cosine":
+            vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        distances = -(queries @ vectors.T)
+    return np.argsort(distances, axis=1, kind="stable")[:, :k]
+
+
+def recall_at_k(found: Sequence[Sequence[int]], truth: Sequence[Sequence[int]]) -> float:
+    """Mean share of the exact neighbours that the approximate search returned."""
+    shares = [len(set(f) & set(t)) / len(t) for f, t in zip(found, truth) if len(t)]
+    return statistics.mean(shares) if shares else 1.0
+
+
+def _without(rows: Sequence[Sequence[int]], exclude: Optional[Sequence[Optional[int]]], k: int) -> List[List[int]]:
+    exclude = exclude or [None] * len(rows)
+    return [[i for i in row if i != skip][:k] for row, skip in zip(rows, exclude)]
+
+
+def benchmark(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    m: int,
+    construction_ef: int,
+    search_efs: Sequence[int],
+    space: str = "l2",
+    exclude: Optional[Sequence[Optional[int]]] = None,
+) -> List[Dict[str, float]]:
+    """
+    Index ``vectors`` with (``m``, ``construction_ef``) once per ``search_efs`` value and
+    time top-``k`` searches on each index. ``exclude[i]`` is a vector index to leave out of query
+    ``i``'s results (the query's own vector).
+    """
+    import chromadb
+
+    fetch = min(k + (1 if exclude else 0), len(vectors))
+    truth = _without(exact_neighbors(vectors, queries, fetch, space).tolist(), exclude, k)
+
+    client = chromadb.EphemeralClient()
+    rows = []
+    for search_ef in search_efs:
+        # chromadb ignores a search_ef change once the index is loaded in the client, so
+        # every value gets its own collection with hnsw:search_ef set at creation.
+        metadata = {**hnsw_metadata(m, construction_ef, search_ef), "hnsw:space": space}
+        col = client.create_collection(f"hnsw-benchmark-{uuid.uuid4().hex[:8]}", metadata=metadata)
+        try:
+            start = time.perf_counter()
+            batch = 1000
+            for i in range(0, len(vectors), batch):
+                col.add(ids=[str(j) for j in range(i, min(i + batch, len(vectors)))], embeddings=vectors[i : i + batch])
+            build_ms = (time.perf_counter() - start) * 1000
+
+            found, timings = [], []
+            for query in queries:
+                start = time.perf_counter()
+                ids = col.query(query_embeddings=[query], n_results=fetch, include=[])["ids"][0]
+                timings.append((time.perf_counter() - start) * 1000)
+                found.append([int(i) for i in ids])
+        finally:
+            client.delete_collection(col.name)
+        rows.append(
+            {
+                "m": m,
+                "construction_ef": construction_ef,
+                "search_ef": search_ef,
+                "build_ms": build_ms,
+                "recall": recall_at_k(_without(found, exclude, k), truth),
+                "mean_ms": statistics.mean(timings),
+                "p95_ms": _percentile(timings, 0.95),
+            }
+        )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--m", type=_ints, default=[8, 16, 32], help="Comma-separated M values.")
+    parser.add_argument("--construction-ef", type=_ints, default=[50, 100, 200], help="Comma-separated values.")
+    parser.add_argument("--search-ef", type=_ints, default=[10, 25, 50, 100, 200], help="Comma-separated values.")
+    parser.add_argument("--k", type=int, default=settings.retrieval_max_k, help="Neighbours per query.")
+    parser.add_argument("--queries", type=int, default=200, help="Stored vectors sampled as queries.")
+    parser.add_argument("--questions", action="store_true", help="Also embed the sample questions as queries.")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION, help="Chroma collection name.")
+    args = parser.parse_args()
+
+    vectors, space = load_vectors(settings.chroma_dir, args.collection)
+    if not len(vectors):
+        print(f"Collection '{args.collection}' in '{settings.chroma_dir}' is empty; run ingest.py first.")
+        return
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[sample]
+    exclude: List[Optional[int]] = [int(i) for i in sample]
+    if args.questions:
+        from llm_factory import get_embeddings
+        from splitter_report import SAMPLE_QUESTIONS
+
+        embedded = np.asarray(get_embeddings(settings.embedding_model).embed_documents(SAMPLE_QUESTIONS), dtype=np.float32)
+        queries = np.vstack([queries, embedded])
+        exclude += [None] * len(embedded)
+
+    print(
+        f"{len(vectors)} vectors ({vectors.shape[1]} dims, {space}) from '{settings.chroma_dir}', "
+        f"{len(queries)} queries, recall@{args.k} vs exact search\n"
+    )
+    print(f"{'M':>4} {'constr_ef':>9} {'search_ef':>9} {'build ms':>9} {'recall':>7} {'mean ms':>8} {'p95 ms':>7}")
+    current = (settings.hnsw_m, settings.hnsw_construction_ef, settings.hnsw_search_ef)
+    for m in args.m:
+        for construction_ef in args.construction_ef:
+            for r in benchmark(vectors, queries, args.k, m, construction_ef, args.search_ef, space, exclude):
+                marker = "  <- current settings" if (r["m"], r["construction_ef"], r["search_ef"]) == current else ""
+                print(
+                    f"{r['m']:>4} {r['construction_ef']:>9} {r['search_ef']:>9} {r['build_ms']:>9.0f} "
+                    f"{r['recall']:>7.3f} {r['mean_ms']:>8.2f} {r['p95_ms']:>7.2f}{marker}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import argparse
+import json
 import sys
 
 from hybrid_qa import HybridQAPipeline
@@ -30,11 +32,47 @@ def run_interactive() -> None:
         print(f"\nAnswer:\n{result.answer}")
 
 
+def run_batch_file(qa: HybridQAPipeline, input_path: str, output_path: str, concurrency: int) -> None:
+    """
+    Answer every question in ``input_path`` (JSONL) and append one JSON line per answer
+    to ``output_path`` (stdout if empty) as each finishes. Questions already answered in
+    ``output_path`` by an interrupted run are skipped; failed ones are retried.
+    """
+    from batch_qa import BatchProgress, answered_ids, read_questions, run_batch
+
+    questions = read_questions(input_path)
+    done = answered_ids(output_path) if output_path else set()
+    todo = [q for q in questions if q.id not in done]
+    if done:
+        print(f"Resuming: {len(questions) - len(todo)} of {len(questions)} questions already answered.", file=sys.stderr)
+
+    progress = BatchProgress(len(todo))
+    out = open(output_path, "a", encoding="utf-8") if output_path else sys.stdout
+    try:
+        for record in run_batch(qa, todo, concurrency=concurrency, progress=progress):
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            print(f"\r{progress}", end="", file=sys.stderr, flush=True)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"\r{progress}", file=sys.stderr)
+
+
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Hybrid SQL + RAG question answering.")
+    parser.add_argument("question", nargs="*", help="Question to answer (interactive mode if omitted).")
+    parser.add_argument("--input", help="JSONL file of questions to answer as a batch.")
+    parser.add_argument("--output", default="", help="JSONL file answers are appended to (default: stdout).")
+    parser.add_argument("--concurrency", type=int, default=0, help="Questions answered at once (BATCH_CONCURRENCY).")
+    args = parser.parse_args()
+
     qa = HybridQAPipeline()
 
-    if len(sys.argv) > 1:
-        question = " ".join(sys.argv[1:]).strip()
+    if args.input:
+        run_batch_file(qa, args.input, args.output, args.concurrency)
+    elif args.question:
+        question = " ".join(args.question).strip()
         result = qa.ask(question)
         print(f"[Route: {result.route}]")
         if result.sql_query:
@@ -1,20 +1,38 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Literal, Optional
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+from typing import TYPE_CHECKING, Any, Dict, List, Literal, Optional, Tuple
+
+from answer_templates import render_answer
+from config import settings
+from lazy import LazyChatPrompt, lazy_property
+from llm_factory import get_chat_model, stage_model
+from query_log import current_trace, end_trace, log_answer, record_cache_hit, start_trace
+from resilience import CircuitOpenError, DeadlineExceeded, deadline_scope, invoke_llm, time_left
+from shared_state import get_shared_store
+from sql_results import SQLResult, render_table
 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+if TYPE_CHECKING:
+    from metric_cube import MetricCube
+    from rag_core import RAGPipeline
+    from sql_core import SQLAnswer, SQLPipeline
 
-from config import settings
-from rag_core import RAGPipeline
-from sql_core import SQLPipeline, SQLAnswer
 
+logger = logging.getLogger(__name__)
 
-Route = Literal["sql", "rag", "sql+rag"]
 
+# "error": no answer could be produced in time or a dependency is down (see resilience.py).
+Route = Literal["sql", "rag", "sql+rag", "error"]
 
-router_prompt = ChatPromptTemplate.from_template(
+
+router_prompt = LazyChatPrompt(
     """
 You are a routing classifier that must decide whether a question should be answered using:
 - "sql"       → only SQL database
@@ -64,12 +82,77 @@ Return ONLY one route:
 Question: {question}
 """.strip()
 )
+contextualize_prompt = LazyChatPrompt(
+    """
+Rewrite the latest user message as a standalone question about the Dubai hotels data,
+using the conversation history only to resolve references (pronouns, "that day",
+"the same hotel", "what about 2024?", ...).
+
+- Keep the user's wording, numbers, dates and hotel names.
+- Do NOT answer the question and do NOT add new requirements.
+- If the message is already standalone, return it unchanged.
+- Output ONLY the rewritten question.
+
+Conversation history:
+{history}
+
+Latest user message:
+{question}
+
+Standalone question:
+""".strip()
+)
+
+# Words that usually point back at earlier turns ("what about that day?", "and for them?").
+_REFERENCE_HINTS = re.compile(
+    r"\b(it|its|that|this|those|these|they|them|their|there|same|previous|above|former|latter|"
+    r"what about|how about|and for|and in|compared to that)\b",
+    re.IGNORECASE,
+)
+
+
+# Messages with no subject of their own ("why?", "how so?", "more details").
+_BARE_FOLLOW_UP = re.compile(
+    r"^\W*(?:and |so |but )?(?:why|how|how so|when|where|who|which one|what else|really|"
+    r"more|more details|details|explain|go on)\W*$",
+    re.IGNORECASE,
+)
+
+
+def needs_history(question: str) -> bool:
+    """
+    True when the message likely depends on earlier turns to be understood. Short
+    messages are not follow-ups by themselves: "ADR 2024?" stands alone.
+    """
+    q = question.strip()
+    if _BARE_FOLLOW_UP.match(q):
+        return True
+    return bool(_REFERENCE_HINTS.search(q)) or q.lower().startswith(("and ", "also ", "but "))
+
+
 @dataclass
 class HybridAnswer:
     route: Route
     answer: str
     sql_query: Optional[str] = None
     sql_raw_result: Optional[str] = None
+    # Structured SQL result for API clients.
+    sql_columns: Optional[List[str]] = None
+    sql_rows: Optional[List[Dict[str, Any]]] = None
+    # Set when a deterministic fast path answered without any LLM call
+    # ("metric_cube", or "answer_cache" for a repeated question).
+    fast_path: Optional[str] = None
+    # The question actually answered when a follow-up was rewritten using the history.
+    standalone_question: Optional[str] = None
+    # Set when a stage failed and the answer came from a fallback (never cached).
+    error: Optional[str] = None
+    # Model used per stage ("router", "sql", "explain", "rag", "combine"); the SQL entry
+    # also names the cascade tier, e.g. "gpt-4o (strong)". "keywords" = heuristic routing.
+    models: Dict[str, str] = field(default_factory=dict)
+
+
+def _sql_model_label(sql_result: SQLAnswer) -> str:
+    return f"{sql_result.model} ({sql_result.tier})" if sql_result.model else ""
 
 
 class HybridQAPipeline:
@@ -83,9 +166,110 @@ class HybridQAPipeline:
         if not settings.openai_api_key:
             raise ValueError("OPENAI_API_KEY is not set. Please configure it in your environment or .env file.")
 
-        self.router_llm = ChatOpenAI(model=settings.openai_model, api_key=settings.openai_api_key)
-        self.sql_pipeline = SQLPipeline()
-        self.rag_pipeline = RAGPipeline()
+        # The LLM client, SQL pipeline (engine + reflection) and RAG pipeline are built on
+        # first use, or ahead of time by warm_up(), so constructing this object is cheap.
+        self.metric_cube: Optional[MetricCube] = None
+        self._cube_version: Optional[int] = None
+        self._cube_checked_at = 0.0
+        self._cube_lock = threading.Lock()
+
+        # LRU answer cache keyed on (standalone question, data/corpus/config version).
+        self._answer_cache: "OrderedDict[Tuple[str, str], HybridAnswer]" = OrderedDict()
+        self._answer_cache_lock = threading.Lock()
+
+    @lazy_property
+    def router_llm(self) -> Any:
+        return get_chat_model(stage_model("router"))
+
+    @lazy_property
+    def explain_llm(self) -> Any:
+        return get_chat_model(stage_model("explain"))
+
+    @lazy_property
+    def combine_llm(self) -> Any:
+        return get_chat_model(stage_model("combine"))
+
+    @lazy_property
+    def sql_pipeline(self) -> SQLPipeline:
+        from sql_core import SQLPipeline
+
+        return SQLPipeline()
+
+    @lazy_property
+    def rag_pipeline(self) -> RAGPipeline:
+        from rag_core import RAGPipeline
+
+        return RAGPipeline()
+
+    def warm_up(self) -> Dict[str, float]:
+        """
+        Build every subsystem ahead of the first question (meant for a background
+        task at startup). Returns seconds spent per step; failures are logged and
+        left for the first request to retry.
+        """
+        steps = [
+            ("router_llm", lambda: self.router_llm),
+            ("sql_pipeline", lambda: self.sql_pipeline),
+            ("rag_pipeline", lambda: self.rag_pipeline.warm_up()),
+        ]
+        if settings.metric_cube:
+            steps.append(("metric_cube", self._get_metric_cube))
+
+        timings: Dict[str, float] = {}
+        for name, build in steps:
+            start = time.perf_counter()
+            try:
+                build()
+            except Exception as exc:
+                logger.warning("Warm-up step %s failed: %s", name, exc)
+            timings[name] = round(time.perf_counter() - start, 3)
+        logger.info("Warm-up finished: %s", timings)
+        return timings
+
+    def _get_metric_cube(self) -> Optional[MetricCube]:
+        """
+        Return the metric cube, (re)loading it from the SQL table when the table
+        version changed. The version is re-checked at most every
+        METRIC_CUBE_REFRESH_SECONDS so the fast path stays free of DB round-trips.
+        """
+        if self.metric_cube is not None and time.monotonic() - self._cube_checked_at < settings.metric_cube_refresh_seconds:
+            return self.metric_cube
+
+        with self._cube_lock:
+            if self.metric_cube is not None and time.monotonic() - self._cube_checked_at < settings.metric_cube_refresh_seconds:
+                return self.metric_cube
+            try:
+                version = self.sql_pipeline.data_version()
+                if self.metric_cube is None or version != self._cube_version:
+                    from metric_cube import MetricCube
+
+                    self.metric_cube = MetricCube.from_engine(self.sql_pipeline.db._engine, self.sql_pipeline.table)
+                    self._cube_version = version
+            except Exception as exc:
+                logger.warning("Metric cube unavailable, using the SQL route: %s", exc)
+            self._cube_checked_at = time.monotonic()
+            return self.metric_cube
+
+    def _answer_with_cube(self, question: str) -> Optional[HybridAnswer]:
+        cube = self._get_metric_cube()
+        if cube is None:
+            return None
+        result = cube.answer(question)
+        if result is None:
+            return None
+        table = SQLResult.from_records(result.rows)
+        return HybridAnswer(
+            route="sql",
+            answer=result.answer,
+            sql_query=result.sql,
+            sql_raw_result=render_table(
+                table, max_rows=settings.sql_prompt_max_rows, max_tokens=settings.sql_prompt_max_tokens
+            ),
+            sql_columns=table.columns,
+            # Normalized like the SQL route's rows, so cached and fresh answers match.
+            sql_rows=table.records(),
+            fast_path="metric_cube",
+        )
 
     def _route(self, question: str) -> Route:
         """
@@ -95,6 +279,10 @@ class HybridQAPipeline:
         - Simple, deterministic keyword heuristics for numeric/SQL-heavy questions
         - The LLM-based router as a fallback for more nuanced cases
         """
+        return self._keyword_route(question) or self._llm_route(question)
+
+    @staticmethod
+    def _keyword_route(question: str) -> Optional[Route]:
         q = question.lower()
 
         # Strong SQL hints: numeric KPIs and time-based comparisons
@@ -142,10 +330,11 @@ class HybridQAPipeline:
                 return "sql"
             # Numeric + explanation → hybrid
             return "sql+rag"
+        return None
 
-        # Fallback: use LLM-based router
+    def _llm_route(self, question: str) -> Route:
         msg = router_prompt.format(question=question)
-        route = self.router_llm.invoke(msg).content.strip().lower()
+        route = invoke_llm(self.router_llm, msg, stage="router", hedge=True).content.strip().lower()
         if route not in {"sql", "rag", "sql+rag"}:
             # Fallback to rag for safety
             return "rag"
@@ -154,16 +343,44 @@ class HybridQAPipeline:
     def _answer_with_sql(self, question: str) -> HybridAnswer:
         try:
             sql_result: SQLAnswer = self.sql_pipeline.ask_sql(question)
+        except DeadlineExceeded:
+            raise
         except Exception as exc:
-            # If SQL generation/execution fails, fall back to RAG so the user still gets an answer.
+            # If SQL generation/execution fails, fall back to RAG so the user still gets an answer,
+            # unless the LLM provider is down or too little time is left for a second full chain.
+            if isinstance(exc, CircuitOpenError) and exc.breaker == "llm":
+                raise
+            left = time_left()
+            if left is not None and left < settings.rag_fallback_min_seconds:
+                logger.warning("SQL route failed with %.1fs left; skipping the RAG fallback: %s", left, exc)
+                return HybridAnswer(
+                    route="sql",
+                    answer=f"Sorry, I could not answer that from the hotel data ({exc}).",
+                    error=str(exc),
+                )
             rag_fallback = self.rag_pipeline.ask(question)
             return HybridAnswer(
                 route="rag",
                 answer=f"(SQL route failed: {exc})\n\n{rag_fallback}",
+                error=str(exc),
+                models={"rag": stage_model("rag")},
             )
 
+        if settings.answer_templates and sql_result.result is not None:
+            templated = render_answer(sql_result.result, settings.answer_template_max_rows)
+            if templated is not None:
+                return HybridAnswer(
+                    route="sql",
+                    answer=templated,
+                    sql_query=sql_result.sql,
+                    sql_raw_result=str(sql_result.raw_result),
+                    sql_columns=sql_result.result.columns,
+                    sql_rows=sql_result.rows,
+                    models={"sql": _sql_model_label(sql_result), "explain": "template"},
+                )
+
         # Ask the LLM to explain the SQL result in natural language
-        explanation_prompt = ChatPromptTemplate.from_template(
+        explanation_prompt = LazyChatPrompt(
             """
             You are given a user's question and the raw result of an SQL query that answers it.
             Explain the answer clearly and concisely in natural language.
@@ -203,31 +420,37 @@ class HybridQAPipeline:
             sql_query=sql_result.sql,
             sql_result=str(sql_result.raw_result),
         )
-        answer_text = self.router_llm.invoke(msg).content.strip()
+        answer_text = invoke_llm(self.explain_llm, msg, stage="explain", hedge=True).content.strip()
 
         return HybridAnswer(
             route="sql",
             answer=answer_text,
             sql_query=sql_result.sql,
             sql_raw_result=str(sql_result.raw_result),
+            sql_columns=sql_result.result.columns if sql_result.result else None,
+            sql_rows=sql_result.rows,
+            models={"sql": _sql_model_label(sql_result), "explain": stage_model("explain")},
         )
 
     def _answer_with_rag(self, question: str) -> HybridAnswer:
         answer_text = self.rag_pipeline.ask(question)
-        return HybridAnswer(route="rag", answer=answer_text)
+        return HybridAnswer(route="rag", answer=answer_text, models={"rag": stage_model("rag")})
 
     def _answer_with_sql_and_rag(self, question: str) -> HybridAnswer:
-        # Get numeric / tabular data from SQL
-        sql_result: SQLAnswer = self.sql_pipeline.ask_sql(question)
-        sql_str = str(sql_result.raw_result)
+        # Retrieve context chunks while SQL runs; the only generation is the combined answer.
+        from rag_core import format_context
 
-        # Get contextual information from RAG
-        rag_answer = self.rag_pipeline.ask(question)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            retrieval = pool.submit(contextvars.copy_context().run, self.rag_pipeline.retrieve, question)
+            sql_result: SQLAnswer = self.sql_pipeline.ask_sql(question)
+            chunks = retrieval.result()
+        sql_str = str(sql_result.raw_result)
+        context = format_context(chunks, settings.hybrid_context_max_tokens)
 
         # Compose a final answer using both
-        combo_prompt = ChatPromptTemplate.from_template(
+        combo_prompt = LazyChatPrompt(
             """
-            You must combine an SQL result (numeric truth) and a RAG context answer (qualitative info).
+            You must combine an SQL result (numeric truth) and retrieved document context (qualitative info).
 
             RULES:
             ================================================
@@ -238,6 +461,7 @@ class HybridQAPipeline:
             2. RAG IS OPTIONAL AND SECONDARY
             - Use RAG only for description, features, context, or explanation.
             - Keep RAG contribution short (1–2 sentences max).
+            - If the context says nothing relevant, answer from SQL alone.
             - If RAG contradicts SQL → ignore the RAG part entirely.
 
             3. MULTIPLE ROW RULE
@@ -269,8 +493,8 @@ class HybridQAPipeline:
             SQL Result:
             {sql_result}
 
-            RAG Context:
-            {rag_answer}
+            RAG Context (retrieved document excerpts):
+            {context}
 
             ================================================
             Final Answer:
@@ -280,26 +504,150 @@ class HybridQAPipeline:
             question=question,
             sql_query=sql_result.sql,
             sql_result=sql_str,
-            rag_answer=rag_answer,
+            context=context,
         )
-        final_answer = self.router_llm.invoke(msg).content.strip()
+        final_answer = invoke_llm(self.combine_llm, msg, stage="combine").content.strip()
 
         return HybridAnswer(
             route="sql+rag",
             answer=final_answer,
             sql_query=sql_result.sql,
             sql_raw_result=sql_str,
+            sql_columns=sql_result.result.columns if sql_result.result else None,
+            sql_rows=sql_result.rows,
+            models={
+                "sql": _sql_model_label(sql_result),
+                "combine": stage_model("combine"),
+            },
         )
 
-    def ask(self, question: str) -> HybridAnswer:
-        route = self._route(question)
+    def _standalone_question(self, question: str, history: Optional[str]) -> str:
+        """
+        Resolve a follow-up against the conversation history. History is used only
+        here: routing, caching, SQL generation and RAG all see the standalone question.
+        """
+        if not history or not history.strip() or not needs_history(question):
+            return question
+        msg = contextualize_prompt.format(history=history, question=question)
+        rewritten = invoke_llm(self.router_llm, msg, stage="contextualize", hedge=True).content.strip()
+        return rewritten or question
+
+    @staticmethod
+    def _cache_key(question: str) -> str:
+        return " ".join(question.lower().split()).rstrip("?. ")
+
+    @lazy_property
+    def config_fingerprint(self) -> str:
+        """
+        Hash of the settings and of the answering code (prompts live in the modules),
+        so a model, prompt or retrieval change never serves answers cached before it.
+        """
+        import hashlib
+        import json
+        import sys
+
+        digest = hashlib.sha256(json.dumps(asdict(settings), sort_keys=True, default=str).encode())
+        for name in ("hybrid_qa", "sql_core", "rag_core", "answer_templates", "metric_cube"):
+            path = getattr(sys.modules.get(name), "__file__", None)
+            if path:
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+        return digest.hexdigest()[:16]
+
+    def _cache_version(self) -> str:
+        from rag_core import corpus_version
+
+        return f"{self.sql_pipeline.cache_version()}:{corpus_version()}:{self.config_fingerprint}"
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[HybridAnswer]:
+        store = get_shared_store()
+        if store is not None:
+            cached = store.get("answers", f"{key[1]}:{key[0]}")
+            return HybridAnswer(**cached) if cached is not None else None
+        with self._answer_cache_lock:
+            cached = self._answer_cache.get(key)
+            if cached is not None:
+                self._answer_cache.move_to_end(key)
+            return cached
+
+    def _cache_put(self, key: Tuple[str, str], answer: HybridAnswer) -> None:
+        store = get_shared_store()
+        if store is not None:
+            # Shared by every worker process (multi-worker mode); keyed like the in-process cache.
+            store.set("answers", f"{key[1]}:{key[0]}", asdict(answer))
+            return
+        with self._answer_cache_lock:
+            self._answer_cache[key] = answer
+            self._answer_cache.move_to_end(key)
+            while len(self._answer_cache) > settings.answer_cache_size:
+                self._answer_cache.popitem(last=False)
+
+    def _answer(self, question: str) -> HybridAnswer:
+        if settings.metric_cube:
+            cube_answer = self._answer_with_cube(question)
+            if cube_answer is not None:
+                return cube_answer
+
+        route = self._keyword_route(question)
+        router = "keywords"
+        if route is None:
+            route, router = self._llm_route(question), stage_model("router")
 
         if route == "sql":
-            return self._answer_with_sql(question)
-        if route == "sql+rag":
-            return self._answer_with_sql_and_rag(question)
-        # default: rag
-        return self._answer_with_rag(question)
-
-
-
+            result = self._answer_with_sql(question)
+        elif route == "sql+rag":
+            result = self._answer_with_sql_and_rag(question)
+        else:
+            # default: rag
+            result = self._answer_with_rag(question)
+        result.models = {"router": router, **result.models}
+        return result
+
+    def ask(self, question: str, history: Optional[str] = None) -> HybridAnswer:
+        """
+        Answer ``question`` (the current message only). ``history`` is the prior
+        conversation as text; it is used solely to rewrite follow-ups into a
+        standalone question before routing. The whole call runs under a
+        REQUEST_TIMEOUT_SECONDS deadline (or an enclosing, earlier one).
+        """
+        token = start_trace(question)
+        trace = current_trace()
+        result: Optional[HybridAnswer] = None
+        try:
+            with deadline_scope(settings.request_timeout_seconds):
+                try:
+                    result = self._ask(question, history)
+                except (DeadlineExceeded, CircuitOpenError) as exc:
+                    logger.warning("Question not answered: %s", exc)
+                    if isinstance(exc, DeadlineExceeded):
+                        text = "Sorry, that took too long to answer. Please try again in a moment."
+                    else:
+                        text = "Sorry, the answering service is temporarily unavailable. Please try again shortly."
+                    result = HybridAnswer(route="error", answer=text, error=str(exc))
+                return result
+        finally:
+            end_trace(token)
+            if result is not None:
+                log_answer(trace, self._cache_key(result.standalone_question or question), result)
+
+    def _ask(self, question: str, history: Optional[str]) -> HybridAnswer:
+        standalone = self._standalone_question(question, history)
+
+        key: Optional[Tuple[str, str]] = None
+        if settings.answer_cache_size > 0:
+            try:
+                key = (self._cache_key(standalone), self._cache_version())
+            except Exception as exc:
+                logger.warning("Data version unavailable, answer cache skipped: %s", exc)
+            cached = self._cache_get(key) if key else None
+            if cached is not None:
+                record_cache_hit("answer_cache")
+                return replace(cached, fast_path="answer_cache")
+
+        result = self._answer(standalone)
+        if standalone != question:
+            result.standalone_question = standalone
+            result.models["contextualize"] = stage_model("router")
+        if key is not None and result.error is None:
+            self._cache_put(key, result)
+        return result
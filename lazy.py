@@ -0,0 +1,71 @@
+"""
+Helpers for building expensive subsystems (DB engines, vector stores, LLM clients) on first use.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class lazy_property(Generic[T]):
+    """
+    Like ``functools.cached_property`` but thread-safe: the factory runs once even
+    when several request threads touch the attribute at the same time. The value
+    is stored in the instance ``__dict__``, so it can also be assigned directly.
+    """
+
+    def __init__(self, factory: Callable[[Any], T]) -> None:
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+        self._lock = threading.RLock()
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(self, instance: Optional[Any], owner: Optional[type] = None) -> T:
+        if instance is None:
+            return self  # type: ignore[return-value]
+        try:
+            return instance.__dict__[self.name]
+        except KeyError:
+            pass
+        with self._lock:
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.factory(instance)
+            return instance.__dict__[self.name]
+
+    @staticmethod
+    def is_built(instance: Any, name: str) -> bool:
+        return name in instance.__dict__
+
+
+class LazyChatPrompt:
+    """
+    ``ChatPromptTemplate.from_template`` built on first use: importing
+    ``langchain_core.prompts`` pulls in langsmith and the text splitters (~0.5 s),
+    which module-level prompts would otherwise pay at import time.
+    """
+
+    def __init__(self, template: str) -> None:
+        self.template = template
+        self._prompt: Any = None
+
+    @property
+    def prompt(self) -> Any:
+        if self._prompt is None:
+            from langchain_core.prompts import ChatPromptTemplate
+
+            self._prompt = ChatPromptTemplate.from_template(self.template)
+        return self._prompt
+
+    def format(self, **kwargs: Any) -> str:
+        return self.prompt.format(**kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.prompt, name)
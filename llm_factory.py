@@ -0,0 +1,168 @@
+"""
+Chat model clients per pipeline stage.
+
+Each stage (router, SQL generation, explanation, RAG answering, combining) has its
+own model setting, so cheap fast models can handle the easy stages while SQL
+generation escalates to a stronger model only when needed (see
+``SQLPipeline.ask_sql``). Clients are cached per model name and shared by all
+pipelines in the process.
+
+Every OpenAI client built here (chat models and embeddings) sends its requests
+through one keep-alive httpx client, so connections are set up once, and through
+one ``RateLimiter`` (rate_limit.py) that keeps the whole process under
+OPENAI_RPM / OPENAI_TPM.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from query_log import record_cache_hit
+
+
+_clients: Dict[str, Any] = {}
+_lock = threading.Lock()
+_http_client: Any = None
+_limiter: Any = None
+
+
+def get_rate_limiter() -> Any:
+    """Process-wide ``RateLimiter`` for OpenAI requests."""
+    global _limiter
+    with _lock:
+        if _limiter is None:
+            from rate_limit import RateLimiter
+
+            _limiter = RateLimiter(settings.openai_rpm, settings.openai_tpm)
+        return _limiter
+
+
+def get_http_client() -> Any:
+    """Shared keep-alive ``httpx.Client`` with the rate-limiting transport."""
+    global _http_client
+    if _http_client is not None:
+        return _http_client
+    limiter = get_rate_limiter()
+    with _lock:
+        if _http_client is None:
+            import httpx
+
+            from rate_limit import RateLimitedTransport
+
+            limits = httpx.Limits(
+                max_connections=settings.openai_max_connections,
+                max_keepalive_connections=settings.openai_max_connections,
+            )
+            transport = RateLimitedTransport(limiter, httpx.HTTPTransport(limits=limits))
+            _http_client = httpx.Client(transport=transport, timeout=settings.llm_timeout_seconds or None)
+        return _http_client
+
+
+def get_chat_model(model: str) -> Any:
+    """Shared ChatOpenAI client for ``model``."""
+    client = _clients.get(model)
+    if client is not None:
+        return client
+    http_client = get_http_client()
+    with _lock:
+        client = _clients.get(model)
+        if client is None:
+            from langchain_openai import ChatOpenAI
+
+            client = _clients[model] = ChatOpenAI(
+                model=model, api_key=settings.openai_api_key, http_client=http_client
+            )
+        return client
+
+
+class CachedEmbeddings:
+    """
+    Embeddings client whose vectors are cached in the shared store (multi-worker mode),
+    so a text embedded by one worker is not embedded again by another. Everything
+    other than ``embed_documents`` / ``embed_query`` is delegated to the wrapped client.
+    """
+
+    def __init__(self, client: Any, store: Any, model: str) -> None:
+        self.client = client
+        self.store = store
+        self.model = model
+
+    def _key(self, text: str) -> str:
+        return f"{self.model}:{text}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[Optional[List[float]]] = [self.store.get("embeddings", self._key(t)) for t in texts]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            for i, vector in zip(missing, self.client.embed_documents([texts[i] for i in missing])):
+                vectors[i] = vector
+                self.store.set("embeddings", self._key(texts[i]), vector)
+        return vectors  # type: ignore[return-value]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self.store.get("embeddings", key)
+        if vector is None:
+            vector = self.client.embed_query(text)
+            self.store.set("embeddings", key, vector)
+        else:
+            record_cache_hit("embeddings")
+        return vector
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+
+def get_embeddings(model: Optional[str] = None) -> Any:
+    """
+    Shared OpenAIEmbeddings client (``settings.embedding_model`` by default), wrapped in
+    ``CachedEmbeddings`` in multi-worker mode.
+    """
+    model = model or settings.embedding_model
+    key = f"embeddings:{model}"
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    http_client = get_http_client()
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            from langchain_openai import OpenAIEmbeddings
+
+            from shared_state import get_shared_store
+
+            client = OpenAIEmbeddings(model=model, api_key=settings.openai_api_key, http_client=http_client)
+            store = get_shared_store()
+            _clients[key] = client = CachedEmbeddings(client, store, model) if store is not None else client
+        return client
+
+
+def client_stats() -> Dict[str, Any]:
+    """Rate limiter counters and the models with a live client."""
+    return {
+        "clients": sorted(_clients),
+        "rate_limiter": _limiter.stats() if _limiter is not None else None,
+    }
+
+
+def stage_model(stage: str) -> str:
+    """Configured model name for a stage: router, explain, rag or combine."""
+    return {
+        "router": settings.router_model,
+        "explain": settings.explain_model,
+        "rag": settings.rag_model,
+        "combine": settings.combine_model,
+    }[stage]
+
+
+def sql_cascade() -> List[Tuple[str, str]]:
+    """
+    (tier, model) pairs tried in order for SQL generation: the fast model first,
+    then the strong one (skipped when the cascade is off or both are the same model).
+    """
+    tiers = [("fast", settings.sql_model)]
+    if settings.sql_cascade and settings.sql_strong_model and settings.sql_strong_model != settings.sql_model:
+        tiers.append(("strong", settings.sql_strong_model))
+    return tiers
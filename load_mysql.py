@@ -3,15 +3,104 @@ Helper script to load the Dubai hotels CSV into a local MySQL database.
 
 Usage (after configuring MySQL and .env):
 
-    uv run load_mysql.py
+    uv run load_mysql.py                        # incremental upsert of new / corrected rows
+    uv run load_mysql.py --since 2025-11-01     # only compare rows from this date onwards
+    uv run load_mysql.py --mode rebuild         # full rebuild into a shadow table + atomic swap
+    uv run load_mysql.py --sqlite               # load into the embedded SQLite file instead
+
+Every load that changes data also rebuilds the per-hotel monthly / yearly rollup
+tables (``<table>_monthly`` / ``<table>_yearly``) that SQLPipeline rewrites
+aggregate queries onto.
+
+Both modes keep the live table queryable the whole time and bump a version stamp
+in the version table (see ``get_table_version``) whenever data actually changes,
+so downstream caches can invalidate on it.
 """
 
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Date,
+    DateTime,
+    Double,
+    Index,
+    Integer,
+    MetaData,
+    PrimaryKeyConstraint,
+    String,
+    Table,
+    Text,
+    create_engine,
+    extract,
+    func,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
 
 from config import settings
 
 
+KEY_COLUMNS = ["hotel_name", "parsed_date_temp"]
+VALUE_COLUMNS = [
+    "date",
+    "ADR",
+    "ADR_Competition",
+    "Occupancy_%",
+    "Occupancy_Competition_%",
+    "Rooms_Available",
+    "Rooms_Sold",
+    "Justification",
+]
+
+# Rollup grains → their time-dimension columns. Tables are named "<table>_<grain>".
+ROLLUP_GRAINS = {"monthly": ["year", "month"], "yearly": ["year"]}
+
+# Rollup measures. Sums and non-null day counts are stored next to the averages so
+# queries at a coarser grain than the rollup can re-aggregate them exactly.
+ROLLUP_MEASURES = [
+    "avg_adr",
+    "max_adr",
+    "min_adr",
+    "sum_adr",
+    "adr_days",
+    "avg_occupancy",
+    "max_occupancy",
+    "min_occupancy",
+    "sum_occupancy",
+    "occupancy_days",
+    "sum_rooms_sold",
+    "revenue",
+    "day_count",
+]
+
+# Rows per INSERT batch; keeps packets well under MySQL's max_allowed_packet.
+BATCH_SIZE = 1000
+
+
+@dataclass
+class LoadStats:
+    mode: str
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    version: int = 0
+    seconds: float = 0.0
+
+
 def get_mysql_url() -> str:
     """
     Build the SQLAlchemy MySQL URL from settings if MYSQL_URL is not explicitly set.
@@ -25,25 +114,408 @@ def get_mysql_url() -> str:
     )
 
 
-def main() -> None:
-    csv_path = f"{settings.data_dir}/dubai_hotels_synthetic_daily_2y_enriched.csv"
-    print(f"Loading CSV from: {csv_path}")
+# ---------- Schema ----------
+
+
+def build_daily_table(name: str, metadata: MetaData, index_suffix: str = "") -> Table:
+    """
+    Typed schema for the daily hotels table, keyed on (hotel_name, parsed_date_temp).
+
+    ``index_suffix`` keeps secondary index names unique while a shadow table and
+    the live table exist side by side (SQLite index names are database-wide).
+    """
+    return Table(
+        name,
+        metadata,
+        Column("hotel_name", String(128), nullable=False),
+        Column("parsed_date_temp", Date, nullable=False),
+        Column("date", String(10), nullable=False),
+        Column("ADR", Double),
+        Column("ADR_Competition", Double),
+        Column("Occupancy_%", Double),
+        Column("Occupancy_Competition_%", Double),
+        Column("Rooms_Available", Integer),
+        Column("Rooms_Sold", Integer),
+        Column("Justification", Text),
+        PrimaryKeyConstraint(*KEY_COLUMNS),
+        Index(f"ix_{name}_date{index_suffix}", "parsed_date_temp"),
+    )
+
+
+def rollup_table_name(table_name: str, grain: str) -> str:
+    return f"{table_name}_{grain}"
+
+
+def build_rollup_table(name: str, grain: str, metadata: MetaData) -> Table:
+    dims = ROLLUP_GRAINS[grain]
+    counts = {"adr_days", "occupancy_days", "sum_rooms_sold", "day_count"}
+    return Table(
+        name,
+        metadata,
+        Column("hotel_name", String(128), nullable=False),
+        *[Column(dim, Integer, nullable=False) for dim in dims],
+        *[Column(m, BigInteger if m in counts else Double) for m in ROLLUP_MEASURES],
+        PrimaryKeyConstraint("hotel_name", *dims),
+    )
+
+
+def build_version_table(metadata: MetaData) -> Table:
+    return Table(
+        settings.mysql_version_table,
+        metadata,
+        Column("table_name", String(128), primary_key=True),
+        Column("version", BigInteger, nullable=False),
+        Column("row_count", BigInteger, nullable=False),
+        Column("load_mode", String(16), nullable=False),
+        Column("loaded_at", DateTime, nullable=False),
+    )
+
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the typed ``parsed_date_temp`` column (from the DD/MM/YYYY ``date`` text)
+    and drop duplicate keys, keeping the last occurrence as the correction.
+    """
+    df = df.copy()
+    df["parsed_date_temp"] = pd.to_datetime(df["date"], format="%d/%m/%Y").dt.date
+    df = df.drop_duplicates(subset=KEY_COLUMNS, keep="last")
+    return df[KEY_COLUMNS + VALUE_COLUMNS]
+
+
+def _records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _is_keyed(engine: Engine, table_name: str) -> bool:
+    """True if the live table exists with the keyed schema incremental loads rely on."""
+    inspector = inspect(engine)
+    if not inspector.has_table(table_name):
+        return False
+    pk = inspector.get_pk_constraint(table_name).get("constrained_columns") or []
+    return sorted(pk) == sorted(KEY_COLUMNS)
+
+
+# ---------- Versioning ----------
+
+
+def get_table_version(engine: Engine, table_name: Optional[str] = None) -> int:
+    """
+    Return the current load version of ``table_name`` (0 if it was never stamped).
+    Cheap primary-key lookup, safe to call before every cache read.
+    """
+    table_name = table_name or settings.mysql_table
+    if not inspect(engine).has_table(settings.mysql_version_table):
+        return 0
+    versions = build_version_table(MetaData())
+    with engine.connect() as conn:
+        version = conn.execute(
+            select(versions.c.version).where(versions.c.table_name == table_name)
+        ).scalar()
+    return int(version or 0)
+
+
+def _ensure_version_table(engine: Engine) -> None:
+    # Created up front: DDL inside the load transaction would implicitly commit on MySQL.
+    build_version_table(MetaData()).create(engine, checkfirst=True)
+
+
+def _bump_version(conn: Connection, table_name: str, mode: str) -> int:
+    versions = build_version_table(MetaData())
+    current = conn.execute(
+        select(versions.c.version).where(versions.c.table_name == table_name)
+    ).scalar()
+    row_count = conn.execute(text(f"SELECT COUNT(*) FROM {_quote(conn, table_name)}")).scalar()
+    row = {
+        "table_name": table_name,
+        "version": int(current or 0) + 1,
+        "row_count": int(row_count or 0),
+        "load_mode": mode,
+        "loaded_at": datetime.now(),
+    }
+    conn.execute(_upsert(conn, versions), [row])
+    return row["version"]
+
+
+# ---------- Dialect helpers ----------
+
+
+def _quote(conn: Connection, name: str) -> str:
+    return conn.dialect.identifier_preparer.quote(name)
+
+
+def _upsert(conn: Connection, table: Table):
+    """INSERT ... ON DUPLICATE KEY UPDATE (MySQL) / ON CONFLICT DO UPDATE (SQLite)."""
+    key_names = {c.name for c in table.primary_key.columns}
+    if conn.dialect.name == "mysql":
+        stmt = mysql_insert(table)
+        return stmt.on_duplicate_key_update(
+            {c.name: stmt.inserted[c.name] for c in table.columns if c.name not in key_names}
+        )
+    if conn.dialect.name == "sqlite":
+        stmt = sqlite_insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=list(key_names),
+            set_={c.name: stmt.excluded[c.name] for c in table.columns if c.name not in key_names},
+        )
+    raise ValueError(f"Upserts are not supported for dialect '{conn.dialect.name}'.")
+
+
+def _swap_tables(conn: Connection, live: str, shadow: str, live_exists: bool) -> None:
+    """
+    Atomically replace ``live`` with ``shadow``.
+    MySQL: a single multi-table RENAME. SQLite: renames inside one transaction.
+    """
+    q_live, q_shadow, q_old = _quote(conn, live), _quote(conn, shadow), _quote(conn, f"{live}__old")
+    conn.execute(text(f"DROP TABLE IF EXISTS {q_old}"))
+    if conn.dialect.name == "mysql":
+        if live_exists:
+            conn.execute(text(f"RENAME TABLE {q_live} TO {q_old}, {q_shadow} TO {q_live}"))
+        else:
+            conn.execute(text(f"RENAME TABLE {q_shadow} TO {q_live}"))
+    else:
+        if live_exists:
+            conn.execute(text(f"ALTER TABLE {q_live} RENAME TO {q_old}"))
+        conn.execute(text(f"ALTER TABLE {q_shadow} RENAME TO {q_live}"))
+    conn.execute(text(f"DROP TABLE IF EXISTS {q_old}"))
+
+
+def _insert_batches(conn: Connection, stmt, rows: List[Dict[str, Any]]) -> None:
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(stmt, rows[start : start + BATCH_SIZE])
+
+
+# ---------- Load modes ----------
+
+
+def rebuild_table(engine: Engine, df: pd.DataFrame, table_name: str) -> LoadStats:
+    """
+    Full rebuild: write every row into ``<table>__shadow``, then swap it in.
+    Readers keep seeing the previous complete table until the swap.
+    """
+    started = time.perf_counter()
+    shadow_name = f"{table_name}__shadow"
+    live_exists = inspect(engine).has_table(table_name)
+    _ensure_version_table(engine)
+    version = get_table_version(engine, table_name) + 1
 
-    df = pd.read_csv(csv_path)
-    print(f"Loaded {len(df)} rows from CSV.")
+    shadow = build_daily_table(shadow_name, MetaData(), index_suffix=f"_v{version}")
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {_quote(conn, shadow_name)}"))
+        shadow.create(conn)
+        _insert_batches(conn, shadow.insert(), _records(df))
 
-    mysql_url = get_mysql_url()
-    print(f"Connecting to MySQL at: {mysql_url}")
+    with engine.begin() as conn:
+        _swap_tables(conn, table_name, shadow_name, live_exists)
+        version = _bump_version(conn, table_name, "rebuild")
+
+    return LoadStats(
+        mode="rebuild",
+        inserted=len(df),
+        version=version,
+        seconds=time.perf_counter() - started,
+    )
 
-    engine = create_engine(mysql_url)
+
+def _diff_against_live(
+    conn: Connection, table: Table, df: pd.DataFrame, since: Optional[date] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Split ``df`` into rows missing from the live table and rows whose values changed.
+    With ``since``, only rows on or after that date are compared.
+    """
+    if since is not None:
+        df = df[df["parsed_date_temp"] >= since]
+    if df.empty:
+        return df, df
+    since = df["parsed_date_temp"].min()
+    existing = pd.read_sql(select(table).where(table.c.parsed_date_temp >= since), conn)
+
+    merged = df.merge(existing, on=KEY_COLUMNS, how="left", suffixes=("", "__live"), indicator=True)
+    is_new = merged["_merge"] == "left_only"
+
+    changed = pd.Series(False, index=merged.index)
+    for col in VALUE_COLUMNS:
+        new_val, old_val = merged[col], merged[f"{col}__live"]
+        same = (new_val == old_val) | (new_val.isna() & old_val.isna())
+        changed |= ~same
+    is_changed = ~is_new & changed
+
+    return merged.loc[is_new, df.columns], merged.loc[is_changed, df.columns]
+
+
+def incremental_load(engine: Engine, df: pd.DataFrame, table_name: str, since: Optional[date] = None) -> LoadStats:
+    """
+    Append rows with new (hotel_name, date) keys and upsert rows whose values changed.
+    Unchanged rows are not written, so a daily refresh only touches a handful of rows.
+    ``since`` limits the comparison to recent rows; older rows are left as they are.
+    """
+    if not _is_keyed(engine, table_name):
+        # First load, or a legacy table written by DataFrame.to_sql without keys:
+        # rebuild from the whole CSV, ``since`` would drop the older history.
+        return rebuild_table(engine, df, table_name)
+
+    started = time.perf_counter()
+    table = build_daily_table(table_name, MetaData())
+    _ensure_version_table(engine)
+    version = get_table_version(engine, table_name)
+    compared = len(df) if since is None else int((df["parsed_date_temp"] >= since).sum())
+    with engine.begin() as conn:
+        new_rows, changed_rows = _diff_against_live(conn, table, df, since)
+        to_write = _records(pd.concat([new_rows, changed_rows]))
+        if to_write:
+            _insert_batches(conn, _upsert(conn, table), to_write)
+            version = _bump_version(conn, table_name, "incremental")
+
+    return LoadStats(
+        mode="incremental",
+        inserted=len(new_rows),
+        updated=len(changed_rows),
+        unchanged=compared - len(new_rows) - len(changed_rows),
+        version=version,
+        seconds=time.perf_counter() - started,
+    )
+
+
+def rebuild_rollups(engine: Engine, table_name: str) -> Dict[str, int]:
+    """
+    Rebuild the per-hotel monthly and yearly rollups of ``table_name`` from the live
+    table (GROUP BY in the database), each through a shadow table + atomic swap.
+    Returns the row count per rollup table.
+    """
+    daily = build_daily_table(table_name, MetaData())
+    adr, occ, sold = daily.c["ADR"], daily.c["Occupancy_%"], daily.c["Rooms_Sold"]
+    dims = {
+        "year": extract("year", daily.c.parsed_date_temp),
+        "month": extract("month", daily.c.parsed_date_temp),
+    }
+    measures = [
+        func.avg(adr),
+        func.max(adr),
+        func.min(adr),
+        func.sum(adr),
+        func.count(adr),
+        func.avg(occ),
+        func.max(occ),
+        func.min(occ),
+        func.sum(occ),
+        func.count(occ),
+        func.sum(sold),
+        func.sum(adr * sold),
+        func.count(),
+    ]
+
+    counts: Dict[str, int] = {}
+    for grain, dim_names in ROLLUP_GRAINS.items():
+        name = rollup_table_name(table_name, grain)
+        shadow_name = f"{name}__shadow"
+        shadow = build_rollup_table(shadow_name, grain, MetaData())
+        group_by = [daily.c.hotel_name, *[dims[d] for d in dim_names]]
+        query = select(
+            *[expr.label(col) for expr, col in zip(group_by, ["hotel_name", *dim_names])],
+            *[expr.label(col) for expr, col in zip(measures, ROLLUP_MEASURES)],
+        ).group_by(*group_by)
+
+        live_exists = inspect(engine).has_table(name)
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {_quote(conn, shadow_name)}"))
+            shadow.create(conn)
+            conn.execute(shadow.insert().from_select(["hotel_name", *dim_names, *ROLLUP_MEASURES], query))
+        with engine.begin() as conn:
+            _swap_tables(conn, name, shadow_name, live_exists)
+            _bump_version(conn, name, "rollup")
+            counts[name] = conn.execute(text(f"SELECT COUNT(*) FROM {_quote(conn, name)}")).scalar()
+    return counts
+
+
+def _rollups_missing(engine: Engine, table_name: str) -> bool:
+    inspector = inspect(engine)
+    return not all(inspector.has_table(rollup_table_name(table_name, g)) for g in ROLLUP_GRAINS)
+
+
+def load_csv(
+    engine: Engine,
+    csv_path: str,
+    table_name: str,
+    mode: str = "incremental",
+    since: Optional[date] = None,
+) -> LoadStats:
+    if mode == "rebuild" and since is not None:
+        raise ValueError("--since only applies to incremental loads; a rebuild always loads the whole CSV.")
+    df = prepare_frame(pd.read_csv(csv_path))
+    if mode == "rebuild":
+        stats = rebuild_table(engine, df, table_name)
+    else:
+        stats = incremental_load(engine, df, table_name, since)
+
+    if stats.inserted or stats.updated or _rollups_missing(engine, table_name):
+        rebuild_rollups(engine, table_name)
+    return stats
+
+
+def get_sqlite_url(path: Optional[str] = None) -> str:
+    return f"sqlite:///{path or settings.sqlite_path}"
+
+
+def ensure_sqlite_database(path: Optional[str] = None, csv_path: Optional[str] = None) -> str:
+    """
+    Build (or refresh) the embedded SQLite copy of the hotels table when the file is
+    missing or older than the CSV. Uses the same typed schema, indexes and rollups as
+    MySQL. Returns the SQLAlchemy URL of the database.
+    """
+    path = path or settings.sqlite_path
+    csv_path = csv_path or settings.hotels_csv
+    url = get_sqlite_url(path)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(csv_path):
+        return url
+
+    engine = create_engine(url)
+    try:
+        stats = load_csv(engine, csv_path, settings.mysql_table)
+    finally:
+        engine.dispose()
+    print(f"SQLite database '{path}' refreshed from {csv_path} (version {stats.version}).")
+    return url
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load the Dubai hotels CSV into MySQL.")
+    parser.add_argument(
+        "--mode",
+        choices=["incremental", "rebuild"],
+        default="incremental",
+        help="incremental: upsert new/changed rows; rebuild: shadow table + atomic swap.",
+    )
+    parser.add_argument(
+        "--since",
+        type=date.fromisoformat,
+        default=None,
+        help="Incremental mode: only compare rows on or after this date (YYYY-MM-DD).",
+    )
+    parser.add_argument("--csv", default=settings.hotels_csv, help="Path to the hotels CSV.")
+    parser.add_argument(
+        "--sqlite",
+        action="store_true",
+        help=f"Load into the embedded SQLite database ({settings.sqlite_path}) instead of MySQL.",
+    )
+    args = parser.parse_args()
+    if args.mode == "rebuild" and args.since is not None:
+        parser.error("--since cannot be combined with --mode rebuild")
+
+    print(f"Loading CSV from: {args.csv}")
+    url = get_sqlite_url() if args.sqlite else get_mysql_url()
+    print(f"Connecting to {'SQLite' if args.sqlite else 'MySQL'} at: {url}")
+
+    engine = create_engine(url)
     table_name = settings.mysql_table
 
-    # if_exists="replace" so you can rerun this script to refresh data
-    df.to_sql(table_name, engine, if_exists="replace", index=False)
-    print(f"Wrote {len(df)} rows into table '{table_name}' in database '{settings.mysql_db}'.")
+    stats = load_csv(engine, args.csv, table_name, mode=args.mode, since=args.since)
+    print(
+        f"[{stats.mode}] table '{table_name}': "
+        f"{stats.inserted} inserted, {stats.updated} updated, {stats.unchanged} unchanged "
+        f"in {stats.seconds:.2f}s (version {stats.version})."
+    )
+    print(f"Rollup tables: {', '.join(rollup_table_name(table_name, g) for g in ROLLUP_GRAINS)}.")
 
 
 if __name__ == "__main__":
     main()
-
-
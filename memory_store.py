@@ -1,15 +1,227 @@
-from collections import deque
+"""
+Bounded chat memory shared by the Telegram bot and other chat front-ends.
+
+- At most CHAT_MEMORY_MAX_CHATS chats are kept in process (least recently used
+  chats are evicted first) and chats idle for longer than CHAT_MEMORY_TTL_SECONDS
+  expire, so memory stays flat however many chats the bot has seen.
+- With CHAT_MEMORY_DB set, every chat is also written to SQLite: evicted chats are
+  reloaded on their next message and history survives restarts.
+- In multi-worker mode (WORKER_MODE=multi) the SQLite file is shared by all worker
+  processes (SHARED_STATE_DIR/chat_memory.sqlite unless CHAT_MEMORY_DB is set): every
+  read goes to the database, and appending a message is one write transaction, so
+  every worker sees the same history.
+- Only the last CHAT_MEMORY_MAX_MESSAGES messages are kept verbatim; older ones
+  are compacted into a short running summary capped at CHAT_MEMORY_SUMMARY_TOKENS.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from config import settings
+from token_utils import count_tokens
+
+
+@dataclass
+class ChatMemory:
+    summary: str = ""
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    updated_at: float = field(default_factory=time.time)
+
+    def text(self) -> str:
+        lines = []
+        if self.summary:
+            lines.append(f"Summary of earlier conversation:\n{self.summary}")
+        lines.extend(f"{m['role']}: {m['msg']}" for m in self.messages)
+        return "\n".join(lines)
+
+
+# (previous summary, messages being compacted, token budget) -> new summary
+Summarizer = Callable[[str, List[Dict[str, str]], int], str]
+
+
+def _shorten(text: str, max_words: int) -> str:
+    words = text.split()
+    return " ".join(words[:max_words]) + (" ..." if len(words) > max_words else "")
+
+
+def _first_sentence(text: str) -> str:
+    return re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+
+
+def extractive_summary(summary: str, messages: List[Dict[str, str]], max_tokens: int) -> str:
+    """
+    Default compaction without an LLM call: one line per compacted message (user
+    messages shortened, assistant replies cut to their first sentence); the oldest
+    lines are dropped once the summary exceeds ``max_tokens``.
+    """
+    lines = summary.splitlines() if summary else []
+    for m in messages:
+        body = _first_sentence(m["msg"]) if m["role"].lower() == "assistant" else m["msg"]
+        lines.append(f"- {m['role']}: {_shorten(body, 30)}")
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ChatMemoryStore:
+    """
+    LRU/TTL-bounded per-chat history with optional SQLite persistence. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        max_chats: int = 10_000,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_messages: int = 6,
+        summary_max_tokens: int = 200,
+        db_path: Optional[str] = None,
+        summarizer: Summarizer = extractive_summary,
+        shared: bool = False,
+    ) -> None:
+        self.max_chats = max_chats
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.summary_max_tokens = summary_max_tokens
+        self.summarizer = summarizer
+        # Other processes write the same database: never answer from the in-process copy.
+        self.shared = shared and bool(db_path)
+        self._chats: "OrderedDict[str, ChatMemory]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS chat_memory ("
+                "chat_id TEXT PRIMARY KEY, summary TEXT NOT NULL, messages TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_chat_memory_updated ON chat_memory (updated_at)")
+            self._db.commit()
+
+    @classmethod
+    def from_settings(cls) -> "ChatMemoryStore":
+        from shared_state import multi_worker, shared_path
+
+        db_path = settings.chat_memory_db or (shared_path("chat_memory.sqlite") if multi_worker() else None)
+        return cls(
+            max_chats=settings.chat_memory_max_chats,
+            ttl_seconds=settings.chat_memory_ttl_seconds,
+            max_messages=settings.chat_memory_max_messages,
+            summary_max_tokens=settings.chat_memory_summary_tokens,
+            db_path=db_path,
+            shared=multi_worker(),
+        )
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    # ---------- Public API ----------
+
+    def add(self, chat_id: object, role: str, message: str) -> None:
+        """Append a message, compacting the oldest ones into the summary when needed."""
+        key = str(chat_id)
+        with self._lock:
+            if self.shared:
+                # Read-modify-write in one transaction so concurrent workers cannot lose messages.
+                self._db.execute("BEGIN IMMEDIATE")
+            try:
+                memory = self._get_locked(key) or ChatMemory()
+                memory.messages.append({"role": role, "msg": message})
+                if len(memory.messages) > self.max_messages:
+                    overflow = len(memory.messages) - self.max_messages
+                    old, memory.messages = memory.messages[:overflow], memory.messages[overflow:]
+                    memory.summary = self.summarizer(memory.summary, old, self.summary_max_tokens)
+                memory.updated_at = time.time()
+                self._put_locked(key, memory)
+            except BaseException:
+                if self.shared:
+                    self._db.rollback()
+                raise
+
+    def get(self, chat_id: object) -> ChatMemory:
+        with self._lock:
+            memory = self._get_locked(str(chat_id))
+            return ChatMemory(memory.summary, list(memory.messages), memory.updated_at) if memory else ChatMemory()
+
+    def history_text(self, chat_id: object) -> str:
+        """Summary plus recent messages as prompt text ("" for an unknown chat)."""
+        return self.get(chat_id).text()
+
+    def clear(self, chat_id: object) -> None:
+        key = str(chat_id)
+        with self._lock:
+            self._chats.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM chat_memory WHERE chat_id = ?", (key,))
+                self._db.commit()
+
+    # ---------- Internals (caller holds the lock) ----------
+
+    def _expired(self, memory: ChatMemory, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - memory.updated_at > self.ttl_seconds
+
+    def _get_locked(self, key: str) -> Optional[ChatMemory]:
+        now = time.time()
+        memory = None if self.shared else self._chats.get(key)
+        if memory is None and self._db is not None:
+            row = self._db.execute(
+                "SELECT summary, messages, updated_at FROM chat_memory WHERE chat_id = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                memory = ChatMemory(row[0], json.loads(row[1]), row[2])
+                self._chats[key] = memory
+        if memory is None:
+            return None
+        if self._expired(memory, now):
+            self._chats.pop(key, None)
+            return None
+        self._chats.move_to_end(key)
+        self._evict_locked(now)
+        return memory
+
+    def _put_locked(self, key: str, memory: ChatMemory) -> None:
+        self._chats[key] = memory
+        self._chats.move_to_end(key)
+        self._evict_locked(memory.updated_at)
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT INTO chat_memory (chat_id, summary, messages, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET summary = excluded.summary, "
+            "messages = excluded.messages, updated_at = excluded.updated_at",
+            (key, memory.summary, json.dumps(memory.messages), memory.updated_at),
+        )
+        self._writes += 1
+        if self.ttl_seconds > 0 and self._writes % 1000 == 0:
+            self._db.execute("DELETE FROM chat_memory WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+        self._db.commit()
+
+    def _evict_locked(self, now: float) -> None:
+        # Least recently used chats sit at the front: drop them while over capacity or expired.
+        while self._chats:
+            key, oldest = next(iter(self._chats.items()))
+            if len(self._chats) > self.max_chats or self._expired(oldest, now):
+                self._chats.popitem(last=False)
+            else:
+                break
+
+
+# Process-wide store used by the chat front-ends.
+memory_store = ChatMemoryStore.from_settings()
 
-# user_id → deque of messages
-memory_store = {}
-MAX_MEMORY = 7  # last 7 messages
 
 def add_memory(user_id, role, message):
-    if user_id not in memory_store:
-        memory_store[user_id] = deque(maxlen=MAX_MEMORY)
-    memory_store[user_id].append({"role": role, "msg": message})
+    memory_store.add(user_id, role, message)
+
 
 def get_memory_text(user_id):
-    if user_id not in memory_store:
-        return ""
-    return "\n".join([f"{m['role']}: {m['msg']}" for m in memory_store[user_id]])
\ No newline at end of file
+    return memory_store.history_text(user_id)
@@ -0,0 +1,454 @@
+"""
+In-process hotel × date metric cube with a deterministic question parser.
+
+Common KPI questions ("ADR for St Regis Dubai on 1 January 2025", "when did
+Premier Inn Al Furjan have the highest occupancy in 2025", "average ADR in
+March 2025", "... and on the same day last year") are answered straight from
+NumPy arrays, without routing, SQL generation, a database round-trip or an
+explanation LLM call.
+
+The parser is intentionally strict: any question it does not fully understand
+returns None and goes through the normal HybridQAPipeline route instead.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+
+# metric → (source column, label, SQL expression used in the equivalent query)
+METRICS: Dict[str, Tuple[str, str, str]] = {
+    "adr": ("ADR", "ADR", "ADR"),
+    "occupancy": ("Occupancy_%", "occupancy", "`Occupancy_%`"),
+    "rooms_sold": ("Rooms_Sold", "rooms sold", "Rooms_Sold"),
+    "revenue": ("revenue", "room revenue", "ADR * Rooms_Sold"),
+}
+
+_METRIC_PATTERNS = {
+    "adr": r"\badr\b|average daily rate|room rate",
+    "occupancy": r"\boccupancy\b",
+    "rooms_sold": r"\brooms?[ _]sold\b",
+    "revenue": r"\brevenue\b",
+}
+
+_MONTHS = {
+    "january": 1, "jan": 1, "february": 2, "feb": 2, "march": 3, "mar": 3, "april": 4, "apr": 4,
+    "may": 5, "june": 6, "jun": 6, "july": 7, "jul": 7, "august": 8, "aug": 8, "september": 9,
+    "sept": 9, "sep": 9, "october": 10, "oct": 10, "november": 11, "nov": 11, "december": 12, "dec": 12,
+}
+_MONTH = r"(" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")"
+_ORD = r"(?:st|nd|rd|th)?"
+
+_DATE_PATTERNS = [
+    (re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b"), lambda m: (int(m[1]), int(m[2]), int(m[3]))),
+    (re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4})\b"), lambda m: (int(m[3]), int(m[2]), int(m[1]))),
+    (
+        re.compile(rf"\b(\d{{1,2}}){_ORD}\s+(?:of\s+)?{_MONTH},?\s+(\d{{4}})\b"),
+        lambda m: (int(m[3]), _MONTHS[m[2]], int(m[1])),
+    ),
+    (
+        re.compile(rf"\b{_MONTH}\s+(\d{{1,2}}){_ORD},?\s+(\d{{4}})\b"),
+        lambda m: (int(m[3]), _MONTHS[m[1]], int(m[2])),
+    ),
+]
+_MONTH_YEAR = re.compile(rf"\b{_MONTH},?\s+(\d{{4}})\b")
+_YEAR = re.compile(r"\b(20\d{2})\b")
+
+_MAX_WORDS = re.compile(r"\b(highest|maximum|max|peak|best|record|busiest|strongest|top)\b")
+_MIN_WORDS = re.compile(r"\b(lowest|minimum|min|worst|weakest|quietest)\b")
+_MEAN_WORDS = re.compile(r"\b(average|avg|mean)\b")
+_SUM_WORDS = re.compile(r"\b(total|sum|overall)\b")
+_YOY = re.compile(
+    r"same (?:day|date)|year[- ]on[- ]year|year[- ]over[- ]year|\byoy\b|last year|previous year|"
+    r"a year (?:earlier|before|ago)|that day in \d{4}"
+)
+# Anything that needs reasoning, filtering or a shape the cube does not produce.
+_BAIL = re.compile(
+    r"\b(why|explain|reason|describe|tell me|what makes|amenit\w*|compare|comparison|improv\w*|growth|grew|"
+    r"change|difference|trend|each|per|every|by month|weekday|weekend|rank\w*|competition|competitor\w*|"
+    r"forecast|predict\w*|between|than|above|below|over|under|more|less|list|count|how many|revpar|"
+    r"available|percent change|median|days? when)\b"
+)
+
+
+@dataclass
+class CubeAnswer:
+    answer: str
+    sql: str
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass
+class _Period:
+    start: date
+    end: date  # inclusive
+    label: str
+    sql_filter: str
+
+
+class MetricCube:
+    """
+    Dense float64 arrays of shape (hotels, days) per metric, NaN where a hotel has
+    no row for a day. Day ``i`` is ``start + i days``.
+    """
+
+    def __init__(self, frame: pd.DataFrame, table: str) -> None:
+        frame = frame.copy()
+        frame["parsed_date_temp"] = pd.to_datetime(frame["parsed_date_temp"])
+        frame["revenue"] = frame["ADR"] * frame["Rooms_Sold"]
+
+        self.table = table
+        self.hotels: List[str] = sorted(frame["hotel_name"].unique())
+        self.start: date = frame["parsed_date_temp"].min().date()
+        self.end: date = frame["parsed_date_temp"].max().date()
+        n_days = (self.end - self.start).days + 1
+
+        hotel_idx = frame["hotel_name"].map({h: i for i, h in enumerate(self.hotels)}).to_numpy()
+        day_idx = (frame["parsed_date_temp"] - pd.Timestamp(self.start)).dt.days.to_numpy()
+        self.values: Dict[str, np.ndarray] = {}
+        for metric, (column, _, _) in METRICS.items():
+            grid = np.full((len(self.hotels), n_days), np.nan)
+            grid[hotel_idx, day_idx] = frame[column].to_numpy(dtype=float)
+            self.values[metric] = grid
+
+        self._aliases = _hotel_aliases(self.hotels)
+
+    @classmethod
+    def from_engine(cls, engine: Engine, table: str) -> "MetricCube":
+        query = text(f"SELECT hotel_name, parsed_date_temp, ADR, `Occupancy_%`, Rooms_Sold FROM {table}")
+        with engine.connect() as conn:
+            frame = pd.read_sql(query, conn)
+        return cls(frame, table)
+
+    # ---------- Lookups ----------
+
+    def _day(self, d: date) -> Optional[int]:
+        if d < self.start or d > self.end:
+            return None
+        return (d - self.start).days
+
+    def _window(self, period: _Period) -> slice:
+        lo = max(period.start, self.start)
+        hi = min(period.end, self.end)
+        return slice((lo - self.start).days, (hi - self.start).days + 1)
+
+    def value(self, metric: str, hotel: int, d: date) -> Optional[float]:
+        idx = self._day(d)
+        if idx is None:
+            return None
+        v = self.values[metric][hotel, idx]
+        return None if np.isnan(v) else float(v)
+
+    def aggregate(self, metric: str, hotel: int, period: _Period, how: str) -> Tuple[Optional[float], int]:
+        window = self.values[metric][hotel, self._window(period)]
+        n = int(np.count_nonzero(~np.isnan(window)))
+        if n == 0:
+            return None, 0
+        return float(np.nanmean(window) if how == "mean" else np.nansum(window)), n
+
+    def extreme(
+        self, metric: str, hotels: Sequence[int], period: _Period, how: str
+    ) -> Tuple[Optional[float], List[Tuple[int, date]]]:
+        """Extreme value in the period and every (hotel, date) that reaches it (ties kept)."""
+        window = self.values[metric][list(hotels), self._window(period)]
+        if np.all(np.isnan(window)):
+            return None, []
+        best = np.nanmax(window) if how == "max" else np.nanmin(window)
+        first_day = self._window(period).start
+        hits = np.argwhere(window == best)
+        ties = [(hotels[h], self.start + timedelta(days=int(first_day + d))) for h, d in hits]
+        return float(best), sorted(ties, key=lambda t: (t[1], t[0]))
+
+    # ---------- Question answering ----------
+
+    def answer(self, question: str) -> Optional[CubeAnswer]:
+        """Answer ``question`` from the cube, or return None if it is not a supported shape."""
+        q = " ".join(question.lower().replace("’", "'").split())
+        # YoY phrasings ("year over year") are supported; "over" elsewhere still bails.
+        if _BAIL.search(_YOY.sub(" ", q)):
+            return None
+
+        metrics = [m for m, pattern in _METRIC_PATTERNS.items() if re.search(pattern, q)]
+        if "revenue" in metrics:
+            # "revenue based on ADR times rooms sold" still asks for revenue.
+            metrics = ["revenue"]
+        if len(metrics) != 1:
+            return None
+        metric = metrics[0]
+
+        hotels = self._match_hotels(q)
+        which_hotel = bool(re.search(r"\bwhich hotels?\b", q))
+        if which_hotel and hotels:
+            return None
+        if not which_hotel and len(hotels) != 1:
+            return None
+
+        dates, q_rest = _extract_dates(q)
+        months, q_rest = _extract_month_years(q_rest)
+        years = sorted({int(y) for y in _YEAR.findall(q_rest)})
+        yoy = bool(_YOY.search(q))
+
+        extreme = "max" if _MAX_WORDS.search(q) else "min" if _MIN_WORDS.search(q) else None
+        agg = "mean" if _MEAN_WORDS.search(q) else "sum" if _SUM_WORDS.search(q) else None
+        if extreme and agg:
+            return None
+
+        if dates:
+            if extreme or agg or months or which_hotel or len(dates) != 1:
+                return None
+            compare_year = _compare_year(dates[0].year, years, yoy)
+            if compare_year is False:
+                return None
+            return self._answer_point(metric, hotels[0], dates[0], compare_year)
+
+        periods = [_month_period(y, m) for y, m in months] + [_year_period(y) for y in years]
+        if extreme:
+            if yoy:
+                if months or not years or which_hotel:
+                    return None
+                target = max(years)
+                compare_year = _compare_year(target, [y for y in years if y != target], True)
+                if compare_year is False:
+                    return None
+                period = _year_period(target)
+            else:
+                if len(periods) > 1:
+                    return None
+                period, compare_year = (periods[0] if periods else self._all_time()), None
+            hotel_ids = list(range(len(self.hotels))) if which_hotel else hotels
+            return self._answer_extreme(metric, hotel_ids, period, extreme, which_hotel, compare_year)
+
+        if agg:
+            if which_hotel or yoy or len(periods) > 2:
+                return None
+            if agg == "sum" and metric in ("adr", "occupancy"):
+                # ADR / occupancy are never summed (see the SQL prompt rules).
+                return None
+            return self._answer_aggregate(metric, hotels[0], periods or [self._all_time()], agg)
+
+        return None
+
+    def _match_hotels(self, q: str) -> List[int]:
+        found = set()
+        for alias, idx in self._aliases.items():
+            if re.search(rf"\b{re.escape(alias)}\b", q):
+                found.add(idx)
+        return sorted(found)
+
+    def _all_time(self) -> _Period:
+        return _Period(self.start, self.end, f"from {_fmt_date(self.start)} to {_fmt_date(self.end)}", "")
+
+    def _answer_point(self, metric: str, hotel: int, d: date, compare_year: Optional[int]) -> CubeAnswer:
+        name = self.hotels[hotel]
+        label = METRICS[metric][1]
+        value = self.value(metric, hotel, d)
+        sql = (
+            f"SELECT parsed_date_temp, {METRICS[metric][2]} AS {metric} FROM {self.table} "
+            f"WHERE hotel_name = '{name}' AND parsed_date_temp = '{d.isoformat()}'"
+        )
+        if value is None:
+            return CubeAnswer(f"No matching data found for {name} on {_fmt_date(d)}.", sql)
+
+        rows = [{"hotel_name": name, "date": d.isoformat(), metric: value}]
+        text_ = f"{label[0].upper()}{label[1:]} for {name} was {_fmt(metric, value)} on {_fmt_date(d)}."
+        if compare_year is not None:
+            prior = _shift_year(d, compare_year)
+            text_ += self._same_day_sentence(metric, hotel, value, prior, rows)
+            sql = _same_day_sql(self.table, metric, name, f"t1.parsed_date_temp = '{d.isoformat()}'", d.year, compare_year)
+        return CubeAnswer(text_, sql, rows)
+
+    def _answer_extreme(
+        self,
+        metric: str,
+        hotels: List[int],
+        period: _Period,
+        how: str,
+        which_hotel: bool,
+        compare_year: Optional[int],
+    ) -> CubeAnswer:
+        label = METRICS[metric][1]
+        word = "highest" if how == "max" else "lowest"
+        scope = "across all hotels" if which_hotel else f"for {self.hotels[hotels[0]]}"
+        best, ties = self.extreme(metric, hotels, period, how)
+
+        hotel_filter = "" if which_hotel else f"hotel_name = '{self.hotels[hotels[0]]}'"
+        where = " AND ".join(f for f in (hotel_filter, period.sql_filter) if f) or "1 = 1"
+        col = METRICS[metric][2]
+        subquery = f"SELECT {how.upper()}({col}) FROM {self.table} WHERE {where}"
+        sql = (
+            f"SELECT hotel_name, parsed_date_temp, {col} AS {metric} FROM {self.table} "
+            f"WHERE {where} AND {col} = ({subquery})"
+        )
+        if best is None:
+            return CubeAnswer(f"No matching data found {scope} {period.label}.", sql)
+
+        rows = [{"hotel_name": self.hotels[h], "date": d.isoformat(), metric: best} for h, d in ties]
+        if which_hotel:
+            where_when = "; ".join(f"{self.hotels[h]} on {_fmt_date(d)}" for h, d in ties)
+        else:
+            where_when = ", ".join(_fmt_date(d) for _, d in ties)
+        count = f"{len(ties)} days (tied)" if len(ties) > 1 else "1 day"
+        text_ = f"The {word} {label} {scope} was {_fmt(metric, best)} {period.label}, reached on {count}: {where_when}."
+
+        if compare_year is not None:
+            for (h, d), row in zip(ties, rows):
+                prior = _shift_year(d, compare_year)
+                prior_value = self.value(metric, h, prior) if prior else None
+                row[f"{metric}_{compare_year}"] = prior_value
+                on = f" ({_fmt_date(prior)})" if prior else ""
+                text_ += f" Same day in {compare_year}{on}: {_fmt(metric, prior_value)}."
+            t1_filter = f"{_qualified(metric, 't1')} = ({subquery})"
+            sql = _same_day_sql(self.table, metric, self.hotels[hotels[0]], t1_filter, period.start.year, compare_year)
+        return CubeAnswer(text_, sql, rows)
+
+    def _answer_aggregate(self, metric: str, hotel: int, periods: List[_Period], how: str) -> CubeAnswer:
+        name = self.hotels[hotel]
+        label = METRICS[metric][1]
+        word = "Average" if how == "mean" else "Total"
+        col = METRICS[metric][2]
+        func = "AVG" if how == "mean" else "SUM"
+
+        rows, parts = [], []
+        for period in periods:
+            value, n = self.aggregate(metric, hotel, period, how)
+            rows.append({"hotel_name": name, "period": period.label, metric: value, "days": n})
+            shown = _fmt(metric, value)
+            parts.append(f"{shown} {period.label} ({n} days)")
+
+        text_ = f"{word} {label} for {name} was " + ", versus ".join(parts) + "."
+        if len(rows) == 2 and rows[0][metric] is not None and rows[1][metric] is not None:
+            delta = rows[0][metric] - rows[1][metric]
+            text_ += f" Difference: {_fmt(metric, delta, signed=True)}."
+
+        filters = " OR ".join(f"({p.sql_filter})" for p in periods if p.sql_filter)
+        sql = f"SELECT {func}({col}) AS {how}_{metric} FROM {self.table} WHERE hotel_name = '{name}'"
+        if filters:
+            sql += f" AND ({filters})"
+        return CubeAnswer(text_, sql, rows)
+
+    def _same_day_sentence(self, metric: str, hotel: int, value: float, prior: Optional[date], rows: List[Dict[str, Any]]) -> str:
+        if prior is None:
+            return " There is no same day in the comparison year."
+        prior_value = self.value(metric, hotel, prior)
+        rows.append({"hotel_name": self.hotels[hotel], "date": prior.isoformat(), metric: prior_value})
+        if prior_value is None:
+            return f" No data for the same day in {prior.year} ({_fmt_date(prior)})."
+        delta = value - prior_value
+        return (
+            f" On the same day in {prior.year} ({_fmt_date(prior)}) it was {_fmt(metric, prior_value)}"
+            f" ({_fmt(metric, delta, signed=True)})."
+        )
+
+
+# ---------- Parsing helpers ----------
+
+
+def _hotel_aliases(hotels: List[str]) -> Dict[str, int]:
+    """Full names plus unambiguous two-word prefixes ("st regis", "premier inn")."""
+    aliases: Dict[str, int] = {}
+    prefix_owner: Dict[str, List[int]] = {}
+    for idx, name in enumerate(hotels):
+        lowered = name.lower()
+        aliases[lowered] = idx
+        words = lowered.split()
+        if len(words) > 2:
+            prefix_owner.setdefault(" ".join(words[:2]), []).append(idx)
+    for prefix, owners in prefix_owner.items():
+        if len(owners) == 1:
+            aliases.setdefault(prefix, owners[0])
+    return aliases
+
+
+def _extract_dates(q: str) -> Tuple[List[date], str]:
+    found: List[date] = []
+    for pattern, parts in _DATE_PATTERNS:
+        for m in pattern.finditer(q):
+            try:
+                found.append(date(*parts(m)))
+            except ValueError:
+                continue
+        q = pattern.sub(" ", q)
+    return found, q
+
+
+def _extract_month_years(q: str) -> Tuple[List[Tuple[int, int]], str]:
+    months = [(int(m[2]), _MONTHS[m[1]]) for m in _MONTH_YEAR.finditer(q)]
+    return months, _MONTH_YEAR.sub(" ", q)
+
+
+def _compare_year(year: int, other_years: List[int], yoy: bool):
+    """Comparison year for a YoY question: the other mentioned year, else year - 1. False = unparseable."""
+    others = [y for y in other_years if y != year]
+    if not yoy:
+        return None if not others else False
+    if len(others) > 1:
+        return False
+    return others[0] if others else year - 1
+
+
+def _shift_year(d: date, year: int) -> Optional[date]:
+    try:
+        return d.replace(year=year)
+    except ValueError:  # 29 February
+        return None
+
+
+def _year_period(year: int) -> _Period:
+    return _Period(date(year, 1, 1), date(year, 12, 31), f"in {year}", f"YEAR(parsed_date_temp) = {year}")
+
+
+def _month_period(year: int, month: int) -> _Period:
+    end = (date(year + (month == 12), month % 12 + 1, 1)) - timedelta(days=1)
+    label = f"in {date(year, month, 1):%B} {year}"
+    return _Period(date(year, month, 1), end, label, f"YEAR(parsed_date_temp) = {year} AND MONTH(parsed_date_temp) = {month}")
+
+
+def _qualified(metric: str, alias: str) -> str:
+    if metric == "revenue":
+        return f"{alias}.ADR * {alias}.Rooms_Sold"
+    return f"{alias}.{METRICS[metric][2]}"
+
+
+def _same_day_sql(table: str, metric: str, hotel: str, t1_filter: str, year: int, compare_year: int) -> str:
+    t1_col, t2_col = _qualified(metric, "t1"), _qualified(metric, "t2")
+    return (
+        f"SELECT t1.parsed_date_temp, {t1_col} AS {metric}, AVG({t2_col}) AS {metric}_{compare_year} "
+        f"FROM {table} t1 JOIN {table} t2 ON t1.hotel_name = t2.hotel_name "
+        f"AND DAY(t1.parsed_date_temp) = DAY(t2.parsed_date_temp) "
+        f"AND MONTH(t1.parsed_date_temp) = MONTH(t2.parsed_date_temp) "
+        f"AND YEAR(t1.parsed_date_temp) = {year} AND YEAR(t2.parsed_date_temp) = {compare_year} "
+        f"WHERE t1.hotel_name = '{hotel}' AND {t1_filter} "
+        f"GROUP BY t1.parsed_date_temp, {t1_col}"
+    )
+
+
+# ---------- Formatting ----------
+
+
+def _fmt_date(d: date) -> str:
+    return f"{d.day} {d:%B} {d.year}"
+
+
+def _fmt(metric: str, value: Optional[float], signed: bool = False) -> str:
+    """``value`` as shown to users: whole rooms, everything else to 2 decimals."""
+    if value is None:
+        return "no data"
+    if metric == "rooms_sold":
+        number = f"{value:+,.0f}" if signed else f"{value:,.0f}"
+    else:
+        # Stored floats carry binary artifacts (228585.00999999998); the source data has 2 decimals.
+        value = round(float(value), 2)
+        number = f"{value:+}" if signed else repr(value)
+    if metric in ("adr", "revenue"):
+        return f"{number} AED"
+    if metric == "occupancy":
+        return f"{number} percentage points" if signed else f"{number}%"
+    return number
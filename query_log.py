@@ -0,0 +1,202 @@
+"""
+Append-only log of every question answered by ``HybridQAPipeline.ask``.
+
+One row per question goes into a local SQLite file (QUERY_LOG_PATH, WAL mode, so
+several worker processes can append to the same file). Each row has:
+
+- the question and its normalized form (the answer cache key), route and fast path;
+- cache hits (answer cache, shared SQL cache, metric cube);
+- the SQL that was generated, how long it took to execute and how many rows it returned;
+- the latency of every stage (router, sql, sql_exec, retrieve, explain, combine, ...);
+- prompt/completion tokens per LLM stage and in total.
+
+A ``QueryTrace`` for the current question is kept in a context variable. The
+resilience wrappers (stage latencies, token usage) and the SQL pipeline (execution
+time) add to it from any thread running in that context. ``query_report.py`` reads
+the log.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryTrace:
+    question: str
+    started: float = field(default_factory=time.monotonic)
+    # Seconds per stage, summed over repeated calls (e.g. both SQL cascade tiers).
+    stages: Dict[str, float] = field(default_factory=dict)
+    # {"sql": {"prompt": ..., "completion": ...}, ...}
+    tokens: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    cache_hits: List[str] = field(default_factory=list)
+    sql_seconds: float = 0.0
+    sql_rows: Optional[int] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_tokens(self, stage: str, prompt: int, completion: int) -> None:
+        with self._lock:
+            counts = self.tokens.setdefault(stage, {"prompt": 0, "completion": 0})
+            counts["prompt"] += prompt
+            counts["completion"] += completion
+
+    def add_sql(self, seconds: float, rows: int) -> None:
+        with self._lock:
+            self.sql_seconds += seconds
+            self.sql_rows = rows
+            self.stages["sql_exec"] = self.stages.get("sql_exec", 0.0) + seconds
+
+    def add_cache_hit(self, name: str) -> None:
+        with self._lock:
+            if name not in self.cache_hits:
+                self.cache_hits.append(name)
+
+
+_trace: contextvars.ContextVar[Optional[QueryTrace]] = contextvars.ContextVar("query_trace", default=None)
+
+
+def current_trace() -> Optional[QueryTrace]:
+    return _trace.get()
+
+
+def start_trace(question: str) -> contextvars.Token:
+    return _trace.set(QueryTrace(question))
+
+
+def end_trace(token: contextvars.Token) -> None:
+    _trace.reset(token)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_stage(stage, seconds)
+
+
+def record_tokens(stage: str, response: Any) -> None:
+    """Token usage of a LangChain chat model reply, if the provider reported it."""
+    trace = _trace.get()
+    if trace is None:
+        return
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage:
+        trace.add_tokens(stage, int(usage.get("input_tokens") or 0), int(usage.get("output_tokens") or 0))
+        return
+    usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    if usage:
+        trace.add_tokens(stage, int(usage.get("prompt_tokens") or 0), int(usage.get("completion_tokens") or 0))
+
+
+def record_sql(seconds: float, rows: int) -> None:
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_sql(seconds, rows)
+
+
+def record_cache_hit(name: str) -> None:
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_cache_hit(name)
+
+
+_COLUMNS = [
+    ("ts", "REAL NOT NULL"),
+    ("question", "TEXT NOT NULL"),
+    ("normalized_question", "TEXT NOT NULL"),
+    ("route", "TEXT"),
+    ("fast_path", "TEXT"),
+    ("cache_hits", "TEXT"),
+    ("sql_query", "TEXT"),
+    ("sql_seconds", "REAL"),
+    ("sql_rows", "INTEGER"),
+    ("total_seconds", "REAL NOT NULL"),
+    ("stages", "TEXT NOT NULL"),
+    ("tokens", "TEXT NOT NULL"),
+    ("prompt_tokens", "INTEGER NOT NULL"),
+    ("completion_tokens", "INTEGER NOT NULL"),
+    ("error", "TEXT"),
+]
+
+
+class QueryLog:
+    """Append-only SQLite table of answered questions. Thread-safe."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(f"{name} {kind}" for name, kind in _COLUMNS)
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS query_log (id INTEGER PRIMARY KEY, {columns})")
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_query_log_ts ON query_log (ts)")
+        self._db.commit()
+
+    def append(self, trace: QueryTrace, normalized_question: str, result: Any) -> None:
+        """Write one row for ``trace`` and its HybridAnswer ``result``."""
+        with trace._lock:
+            stages = {name: round(seconds, 4) for name, seconds in trace.stages.items()}
+            tokens = {stage: dict(counts) for stage, counts in trace.tokens.items()}
+            cache_hits = list(trace.cache_hits)
+        row = {
+            "ts": time.time(),
+            "question": trace.question,
+            "normalized_question": normalized_question,
+            "route": result.route,
+            "fast_path": result.fast_path,
+            "cache_hits": ",".join(cache_hits) or None,
+            "sql_query": result.sql_query,
+            "sql_seconds": round(trace.sql_seconds, 4) if trace.sql_rows is not None else None,
+            "sql_rows": trace.sql_rows,
+            "total_seconds": round(time.monotonic() - trace.started, 4),
+            "stages": json.dumps(stages),
+            "tokens": json.dumps(tokens),
+            "prompt_tokens": sum(c["prompt"] for c in tokens.values()),
+            "completion_tokens": sum(c["completion"] for c in tokens.values()),
+            "error": result.error,
+        }
+        names = ", ".join(row)
+        with self._lock:
+            self._db.execute(f"INSERT INTO query_log ({names}) VALUES ({', '.join('?' * len(row))})", list(row.values()))
+            self._db.commit()
+
+
+_log: Optional[QueryLog] = None
+_log_lock = threading.Lock()
+
+
+def get_query_log() -> Optional[QueryLog]:
+    """The process-wide QueryLog, or None when QUERY_LOG_PATH is empty."""
+    global _log
+    if not settings.query_log_path:
+        return None
+    if _log is None or _log.path != settings.query_log_path:
+        with _log_lock:
+            if _log is None or _log.path != settings.query_log_path:
+                _log = QueryLog(settings.query_log_path)
+    return _log
+
+
+def log_answer(trace: QueryTrace, normalized_question: str, result: Any) -> None:
+    """Append to the query log; a logging failure never fails the question."""
+    try:
+        log = get_query_log()
+        if log is not None:
+            log.append(trace, normalized_question, result)
+    except Exception as exc:
+        logger.warning("Query log write failed: %s", exc)
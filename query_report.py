@@ -0,0 +1,160 @@
+"""
+Report on the query log (query_log.py): what users ask most, where the time goes.
+
+Usage:
+    uv run query_report.py                     # everything logged so far, top 10 per section
+    uv run query_report.py --top 20 --since 7  # last 7 days, top 20
+    uv run query_report.py --path other.sqlite
+
+Sections:
+- hot questions: the most frequent normalized questions, with their latency and how
+  often they were served from a cache (candidates for caching or metric cubes);
+- slowest stages: p50/p95/max/total seconds per pipeline stage;
+- worst SQL: generated queries by execution time;
+- routes: share of questions per route, with latency and tokens.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Sequence
+
+from config import settings
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+def load_rows(path: str, since_days: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Logged questions, oldest first; none when the log does not exist yet."""
+    if not path or not os.path.exists(path):
+        return []
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    db.row_factory = sqlite3.Row
+    try:
+        if since_days:
+            rows = db.execute("SELECT * FROM query_log WHERE ts >= ? ORDER BY id", (time.time() - since_days * 86400,))
+        else:
+            rows = db.execute("SELECT * FROM query_log ORDER BY id")
+        return [dict(row) for row in rows]
+    finally:
+        db.close()
+
+
+def hot_questions(rows: List[Dict[str, Any]], top: int = 10) -> List[Dict[str, Any]]:
+    groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        groups[row["normalized_question"]].append(row)
+    ranked = sorted(groups.items(), key=lambda item: (-len(item[1]), item[0]))[:top]
+    return [
+        {
+            "question": question,
+            "count": len(group),
+            "avg_seconds": statistics.mean(r["total_seconds"] for r in group),
+            "cached": sum(1 for r in group if r["cache_hits"]) / len(group),
+            "routes": dict(Counter(r["route"] for r in group)),
+        }
+        for question, group in ranked
+    ]
+
+
+def slowest_stages(rows: List[Dict[str, Any]], top: int = 10) -> List[Dict[str, Any]]:
+    timings: Dict[str, List[float]] = defaultdict(list)
+    for row in rows:
+        for stage, seconds in json.loads(row["stages"]).items():
+            timings[stage].append(seconds)
+    stats = [
+        {
+            "stage": stage,
+            "calls": len(values),
+            "p50": _percentile(values, 0.5),
+            "p95": _percentile(values, 0.95),
+            "max": max(values),
+            "total": sum(values),
+        }
+        for stage, values in timings.items()
+    ]
+    return sorted(stats, key=lambda s: -s["p95"])[:top]
+
+
+def worst_sql(rows: List[Dict[str, Any]], top: int = 10) -> List[Dict[str, Any]]:
+    timings: Dict[str, List[float]] = defaultdict(list)
+    for row in rows:
+        if row["sql_query"] and row["sql_seconds"] is not None:
+            timings[row["sql_query"]].append(row["sql_seconds"])
+    stats = [
+        {"sql": sql, "count": len(values), "avg_seconds": statistics.mean(values), "max_seconds": max(values)}
+        for sql, values in timings.items()
+    ]
+    return sorted(stats, key=lambda s: -s["max_seconds"])[:top]
+
+
+def route_distribution(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        groups[row["route"]].append(row)
+    return [
+        {
+            "route": route,
+            "count": len(group),
+            "share": len(group) / len(rows),
+            "avg_seconds": statistics.mean(r["total_seconds"] for r in group),
+            "avg_tokens": statistics.mean(r["prompt_tokens"] + r["completion_tokens"] for r in group),
+        }
+        for route, group in sorted(groups.items(), key=lambda item: -len(item[1]))
+    ]
+
+
+def _short(text: str, width: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= width else text[: width - 3] + "..."
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=settings.query_log_path, help="Query log file (QUERY_LOG_PATH).")
+    parser.add_argument("--top", type=int, default=10, help="Rows per section.")
+    parser.add_argument("--since", type=float, default=None, help="Only the last N days.")
+    args = parser.parse_args()
+
+    rows = load_rows(args.path, args.since)
+    if not rows:
+        print(f"No questions logged in '{args.path}'.")
+        return
+    window = f" in the last {args.since:g} days" if args.since else ""
+    print(f"{len(rows)} questions logged{window} ('{args.path}')\n")
+
+    print(f"Hot questions (top {args.top}):")
+    print(f"  {'count':>6} {'avg s':>7} {'cached':>7}  {'question':<60} routes")
+    for q in hot_questions(rows, args.top):
+        routes = ", ".join(f"{route} {n}" for route, n in q["routes"].items())
+        print(f"  {q['count']:>6} {q['avg_seconds']:>7.2f} {q['cached']:>7.0%}  {_short(q['question'], 60):<60} {routes}")
+
+    print("\nSlowest stages (by p95):")
+    print(f"  {'stage':<16} {'calls':>6} {'p50 s':>7} {'p95 s':>7} {'max s':>7} {'total s':>9}")
+    for s in slowest_stages(rows, args.top):
+        print(
+            f"  {s['stage']:<16} {s['calls']:>6} {s['p50']:>7.2f} {s['p95']:>7.2f} {s['max']:>7.2f} {s['total']:>9.1f}"
+        )
+
+    print(f"\nWorst SQL by execution time (top {args.top}):")
+    print(f"  {'count':>6} {'avg s':>7} {'max s':>7}  sql")
+    for s in worst_sql(rows, args.top):
+        print(f"  {s['count']:>6} {s['avg_seconds']:>7.3f} {s['max_seconds']:>7.3f}  {_short(s['sql'], 100)}")
+
+    print("\nRoutes:")
+    print(f"  {'route':<10} {'count':>6} {'share':>6} {'avg s':>7} {'avg tokens':>11}")
+    for r in route_distribution(rows):
+        print(f"  {r['route']:<10} {r['count']:>6} {r['share']:>6.0%} {r['avg_seconds']:>7.2f} {r['avg_tokens']:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
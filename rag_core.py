@@ -1,23 +1,111 @@
 from __future__ import annotations
 
-from typing import List
-
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_community.document_loaders import (
-    DirectoryLoader,
-    TextLoader,
-    PyPDFLoader,
-    CSVLoader,
-)
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableParallel, RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+import logging
+import os
+import time
+from typing import Any, List, Optional
 
 from config import settings
+from lazy import lazy_property
+from resilience import call_with_deadline
+from token_utils import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# LangChain, Chroma and the OpenAI client are imported inside the methods that use
+# them, so importing this module (and building a RAGPipeline) stays cheap at startup.
+
+
+def _chunk_header(doc: Any) -> str:
+    meta = getattr(doc, "metadata", None) or {}
+    parts = [str(meta[k]) for k in ("hotel_name", "source") if meta.get(k)]
+    if meta.get("page") is not None:
+        parts.append(f"p.{meta['page']}")
+    return f"[{' | '.join(parts)}]\n" if parts else ""
+
+
+def hnsw_metadata(m: Optional[int] = None, construction_ef: Optional[int] = None, search_ef: Optional[int] = None) -> dict:
+    """Chroma collection metadata for the HNSW index (``settings.hnsw_*`` by default)."""
+    return {
+        "hnsw:M": m or settings.hnsw_m,
+        "hnsw:construction_ef": construction_ef or settings.hnsw_construction_ef,
+        "hnsw:search_ef": search_ef or settings.hnsw_search_ef,
+    }
+
+
+def set_search_ef(collection: Any, search_ef: int) -> None:
+    """
+    Change ``search_ef`` of an existing Chroma collection (the only HNSW parameter that
+    can change after the index is built). Needs chromadb >= 1.0; older versions keep
+    the value the collection was created with.
+    """
+    try:
+        current = (collection.configuration or {}).get("hnsw") or {}
+        if current.get("ef_search") != search_ef:
+            collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+    except (AttributeError, TypeError) as exc:
+        logger.warning("Could not set HNSW search_ef=%s on '%s': %s", search_ef, collection.name, exc)
+
+
+def choose_k(scores: List[float], min_k: int, max_k: int, min_relevance: float, elbow_gap: float) -> int:
+    """
+    How many of the candidates (relevance ``scores``, best first) to keep: those
+    scoring at least ``min_relevance``, cut earlier at the largest drop between
+    neighbours when that drop is at least ``elbow_gap``. Always within
+    [``min_k``, ``max_k``] (and never more than there are candidates).
+    """
+    available = min(len(scores), max_k)
+    floor = min(max(min_k, 1), available)
+    k = sum(1 for score in scores[:available] if score >= min_relevance)
+    gaps = [(scores[i - 1] - scores[i], i) for i in range(floor, k)]
+    if gaps:
+        gap, cut = max(gaps)
+        if gap >= elbow_gap:
+            k = cut
+    return max(k, floor)
+
+
+def format_context(docs: List, max_tokens: int) -> str:
+    """
+    Join retrieved chunks (best first) into a prompt context of at most ``max_tokens``.
+    Chunks that do not fit are dropped whole, except that the top chunk is cut to
+    the budget rather than leaving the context empty.
+    """
+    parts: List[str] = []
+    budget = max_tokens
+    for doc in docs:
+        text = _chunk_header(doc) + doc.page_content.strip()
+        cost = count_tokens(text)
+        if cost > budget:
+            if not parts and budget > 0:
+                # ~4 characters per token, same fallback as count_tokens.
+                parts.append(text[: budget * 4])
+            break
+        parts.append(text)
+        budget -= cost
+    return "\n\n".join(parts)
+
+
+INGEST_STAMP = "ingest_stamp"
+
+
+def touch_ingest_stamp() -> None:
+    """Mark CHROMA_DIR as freshly ingested (see ``corpus_version``)."""
+    with open(os.path.join(settings.chroma_dir, INGEST_STAMP), "w", encoding="utf-8") as f:
+        f.write(f"{time.time()}\n")
+
+
+def corpus_version() -> int:
+    """
+    Changes whenever the documents are re-ingested or the vectors re-exported: the
+    newest mtime (ns) of the ingest stamp and the memory-mapped export's meta file.
+    Answer cache keys include it, so cached RAG answers expire with the corpus.
+    """
+    from vector_index import META_FILE
+
+    stamps = [os.path.join(settings.chroma_dir, INGEST_STAMP), os.path.join(settings.vector_mmap_dir, META_FILE)]
+    return max((os.stat(path).st_mtime_ns for path in stamps if os.path.exists(path)), default=0)
 
-import os
 
 class RAGPipeline:
     """
@@ -31,18 +119,36 @@ class RAGPipeline:
         if not settings.openai_api_key:
             raise ValueError("OPENAI_API_KEY is not set. Please configure it in your environment or .env file.")
 
-        self.embeddings = OpenAIEmbeddings(model=settings.embedding_model, api_key=settings.openai_api_key)
-        self.llm = ChatOpenAI(model=settings.openai_model, api_key=settings.openai_api_key)
         self.vectorstore = None
         self.rag_chain = None
 
+    @lazy_property
+    def embeddings(self) -> Any:
+        from llm_factory import get_embeddings
+
+        return get_embeddings(settings.embedding_model)
+
+    @lazy_property
+    def llm(self) -> Any:
+        from llm_factory import get_chat_model
+
+        return get_chat_model(settings.rag_model)
+
     # ---------- Document Loading & Ingestion ----------
 
-    def _load_documents(self) -> List:
+    @staticmethod
+    def load_documents() -> List:
         """
         Load supported documents from the data directory.
         Add minimal metadata for PDF files (hotel_name, source, page).
         """
+        from langchain_community.document_loaders import (
+            DirectoryLoader,
+            TextLoader,
+            PyPDFLoader,
+            CSVLoader,
+        )
+
         docs: List = []
 
         # --------- Load TXT / MD / CSV as usual ---------
@@ -59,14 +165,17 @@ class RAGPipeline:
                 loader_cls=TextLoader,
                 show_progress=True,
             ),
-            DirectoryLoader(
-                settings.data_dir,
-                glob="**/*.csv",
-                loader_cls=CSVLoader,
-                loader_kwargs={"encoding": "utf-8"},
-                show_progress=True,
-            ),
         ]
+        if settings.csv_ingest_mode == "rows":
+            generic_loaders.append(
+                DirectoryLoader(
+                    settings.data_dir,
+                    glob="**/*.csv",
+                    loader_cls=CSVLoader,
+                    loader_kwargs={"encoding": "utf-8"},
+                    show_progress=True,
+                )
+            )
 
         # Load generic documents
         for loader in generic_loaders:
@@ -75,6 +184,9 @@ class RAGPipeline:
             except Exception as exc:
                 print(f"Error loading documents with loader {loader}: {exc}")
 
+        if settings.csv_ingest_mode != "rows":
+            docs.extend(RAGPipeline._load_csv_summaries())
+
         # --------- Load PDFs with metadata enhancement ---------
         pdf_files = [
             f for f in os.listdir(settings.data_dir)
@@ -111,48 +223,170 @@ class RAGPipeline:
 
         return docs
 
+    @staticmethod
+    def _load_csv_summaries() -> List:
+        """
+        The daily hotels CSV becomes one summary document per hotel and month
+        (csv_summaries.py); daily numbers stay in SQL. Other CSVs load row by row.
+        """
+        import pandas as pd
+        from langchain_community.document_loaders import CSVLoader
+        from langchain_core.documents import Document
+
+        from csv_summaries import csv_files, is_daily_hotels_csv, summarize_hotels_csv
+
+        docs: List = []
+        for path in csv_files(settings.data_dir):
+            try:
+                if is_daily_hotels_csv(pd.read_csv(path, nrows=0).columns):
+                    summaries = summarize_hotels_csv(path)
+                    docs.extend(Document(page_content=d["text"], metadata=d["metadata"]) for d in summaries)
+                    print(f"Summarized {path} into {len(summaries)} hotel-month documents.")
+                else:
+                    docs.extend(CSVLoader(path, encoding="utf-8").load())
+            except Exception as exc:
+                print(f"Error loading CSV {path}: {exc}")
+        return docs
+
+    @staticmethod
+    def split_documents(docs: List, splitter: Optional[str] = None) -> List:
+        """
+        Split with SPLITTER: "tokens" (text_splitter.py: token-sized, section-aware,
+        parallel) or "recursive" (character-sized RecursiveCharacterTextSplitter).
+        """
+        splitter = splitter or settings.splitter
+        if splitter == "recursive":
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+            return RecursiveCharacterTextSplitter(
+                chunk_size=settings.chunk_size,
+                chunk_overlap=settings.chunk_overlap,
+            ).split_documents(docs)
+
+        from text_splitter import split_documents
+
+        return split_documents(
+            docs, settings.chunk_tokens, settings.chunk_overlap_tokens, workers=settings.ingest_workers or None
+        )
+
     def ingest(self) -> None:
         """
         Load documents from disk, split, embed and persist them into Chroma.
         """
-        docs = self._load_documents()
+        docs = self.load_documents()
         if not docs:
             print(f"No documents found under '{settings.data_dir}'.")
             return
 
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.chunk_size,
-            chunk_overlap=settings.chunk_overlap,
-        )
-        split_docs = splitter.split_documents(docs)
+        split_docs = self.split_documents(docs)
 
-        self.vectorstore = Chroma.from_documents(
-            documents=split_docs,
-            embedding=self.embeddings,
-            persist_directory=settings.chroma_dir,
-        )
-        self.vectorstore.persist()
+        if settings.dedup_chunks:
+            from chunk_dedup import dedup_documents
+
+            split_docs, report = dedup_documents(split_docs, threshold=settings.dedup_threshold)
+            print(report)
+
+        self.vectorstore = self._rebuild_collection(split_docs)
+        # Chroma persists on write; there is no separate persist() step any more.
         print(f"Ingestion completed. Stored {len(split_docs)} chunks in '{settings.chroma_dir}'.")
 
+        from vector_index import export_vectors
+
+        # Memory-mapped copy searched by the workers with VECTOR_BACKEND=mmap.
+        export_vectors(self.vectorstore._collection, settings.vector_mmap_dir)
+        print(f"Exported read-only vectors to '{settings.vector_mmap_dir}'.")
+        touch_ingest_stamp()
+
+    def _rebuild_collection(self, split_docs: List) -> Any:
+        """
+        Rebuild the collection from scratch (re-ingesting must not duplicate chunks, and
+        the HNSW build parameters only take effect when a collection is created).
+
+        The chunks are embedded into a staging collection, which replaces the live one
+        only once every chunk is stored: a rate-limit or network error halfway through
+        leaves the previous index (and its mmap export) serving as before. The live
+        collection is renamed aside, not deleted, until staging has taken its name.
+        """
+        import chromadb
+        from langchain_community.vectorstores import Chroma
+
+        client = chromadb.PersistentClient(path=settings.chroma_dir)
+        live = Chroma._LANGCHAIN_DEFAULT_COLLECTION_NAME
+        staging = f"{live}__staging"
+        backup = f"{live}__previous"
+
+        def exists(name: str) -> bool:
+            # list_collections() returns names on older chromadb, Collection objects on 1.x.
+            return name in {getattr(c, "name", c) for c in client.list_collections()}
+
+        if exists(backup):
+            # An earlier ingest stopped between the two renames below.
+            if exists(live):
+                client.delete_collection(backup)
+            else:
+                client.get_collection(backup).modify(name=live)
+        if exists(staging):
+            client.delete_collection(staging)  # left over from an earlier failed ingest
+        try:
+            built = Chroma.from_documents(
+                documents=split_docs,
+                embedding=self.embeddings,
+                client=client,
+                collection_name=staging,
+                collection_metadata=hnsw_metadata(),
+            )
+        except BaseException:
+            if exists(staging):
+                client.delete_collection(staging)
+            raise
+
+        # Rename rather than delete, so a failed swap can put the previous index back.
+        previous = client.get_collection(live) if exists(live) else None
+        if previous is not None:
+            previous.modify(name=backup)
+        try:
+            built._collection.modify(name=live)
+        except BaseException:
+            if previous is not None:
+                previous.modify(name=live)
+            if exists(staging):
+                client.delete_collection(staging)
+            raise
+        if previous is not None:
+            client.delete_collection(backup)
+        return Chroma(client=client, collection_name=live, embedding_function=self.embeddings)
+
     # ---------- Retrieval + Generation ----------
 
     def _load_vectorstore(self) -> None:
         """
-        Load the existing Chroma vector store from disk.
+        Load the existing Chroma vector store from disk (or, with VECTOR_BACKEND=mmap,
+        its memory-mapped export shared by all worker processes).
         """
-        if self.vectorstore is None:
+        if self.vectorstore is None and settings.vector_backend == "mmap":
+            from vector_index import MmapVectorIndex
+
+            self.vectorstore = MmapVectorIndex(settings.vector_mmap_dir, self.embeddings)
+        elif self.vectorstore is None:
+            from langchain_community.vectorstores import Chroma
+
             self.vectorstore = Chroma(
                 embedding_function=self.embeddings,
                 persist_directory=settings.chroma_dir,
             )
+            set_search_ef(self.vectorstore._collection, settings.hnsw_search_ef)
 
     def _build_rag_chain(self) -> None:
         """
         Build the LangChain RAG graph (retriever + LLM).
         """
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.runnables import RunnableLambda, RunnableParallel, RunnablePassthrough
+
         self._load_vectorstore()
 
-        retriever = self.vectorstore.as_retriever(search_kwargs={"k": settings.k})
+        retriever = RunnableLambda(self._search)
 
         def format_docs(docs) -> str:
             return "\n\n".join(doc.page_content for doc in docs)
@@ -186,6 +420,44 @@ class RAGPipeline:
 
         self.rag_chain = rag_inputs | prompt | self.llm | StrOutputParser()
 
+    def warm_up(self) -> None:
+        """Open the vector store and build the chain ahead of the first question."""
+        if self.rag_chain is None:
+            self._build_rag_chain()
+
+    def _search(self, question: str, k: Optional[int] = None) -> List:
+        """
+        Chunks for ``question``, most similar first: exactly ``k`` when given or with
+        RETRIEVAL_MODE=fixed (``settings.k``), otherwise as many as ``choose_k`` keeps
+        out of RETRIEVAL_MAX_K scored candidates.
+        """
+        self._load_vectorstore()
+        if k is not None or settings.retrieval_mode == "fixed":
+            return self.vectorstore.similarity_search(question, k=k or settings.k)
+
+        scored = self.vectorstore.similarity_search_with_relevance_scores(question, k=settings.retrieval_max_k)
+        scores = [score for _, score in scored]
+        chosen = choose_k(
+            scores,
+            settings.retrieval_min_k,
+            settings.retrieval_max_k,
+            settings.retrieval_min_relevance,
+            settings.retrieval_elbow_gap,
+        )
+        logger.info(
+            "Adaptive retrieval: k=%d of %d candidates for %r (scores %s)",
+            chosen,
+            len(scored),
+            question,
+            ", ".join(f"{s:.3f}" for s in scores),
+        )
+        return [doc for doc, _ in scored[:chosen]]
+
+    def retrieve(self, question: str, k: Optional[int] = None) -> List:
+        """Chunks for ``question`` (see ``_search``), most similar first."""
+        # Embedding the question is a provider call: bounded and hedged like the LLM calls.
+        return call_with_deadline(lambda: self._search(question, k), stage="retrieve", hedge=True)
+
     def ask(self, question: str) -> str:
         """
         Ask a question using the RAG pipeline.
@@ -193,7 +465,4 @@ class RAGPipeline:
         """
         if self.rag_chain is None:
             self._build_rag_chain()
-        return self.rag_chain.invoke(question)
-
-
-
+        return call_with_deadline(self.rag_chain.invoke, question, stage="rag")
@@ -0,0 +1,170 @@
+"""
+Client-side rate limiting for the OpenAI API.
+
+All OpenAI clients (chat models for every stage and the embeddings) share one httpx
+client whose transport is ``RateLimitedTransport``. Every request first takes one
+unit from the requests-per-minute bucket and its estimated token count from the
+tokens-per-minute bucket, so bursts from concurrent questions wait locally instead
+of running into 429s (and the SDK's retry storms). A 429 that still gets through
+pauses both buckets for the server's ``retry-after``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from token_utils import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Completion tokens assumed for a chat request that does not set max_tokens.
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+class RateLimitTimeout(TimeoutError):
+    """No capacity became available before the caller's deadline."""
+
+
+class TokenBucket:
+    """
+    ``per_minute`` units refilled continuously, holding at most one minute's worth.
+    ``per_minute`` <= 0 disables the bucket.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self._available = per_minute
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take ``amount`` units (capped at capacity) and return how many seconds the
+        caller must wait before using them. Reservations queue in arrival order by
+        letting the balance go negative.
+        """
+        if self.per_minute <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._available -= min(amount, self.capacity)
+            wait = -self._available * 60 / self.per_minute if self._available < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def refund(self, amount: float) -> None:
+        if self.per_minute <= 0:
+            return
+        with self._lock:
+            self._available = min(self.capacity, self._available + min(amount, self.capacity))
+
+    def pause(self, seconds: float) -> None:
+        """Hold every reservation back for ``seconds`` (after a 429)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets shared by every OpenAI call."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float) -> None:
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, float] = {"requests": 0, "throttled": 0, "wait_seconds": 0.0, "rate_limited": 0}
+
+    def acquire(self, tokens: int, timeout: Optional[float] = None) -> float:
+        """
+        Block until a request of ``tokens`` tokens may be sent; returns the seconds
+        waited. Raises ``RateLimitTimeout`` (and gives the capacity back) when that
+        would take longer than ``timeout``.
+        """
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if timeout is not None and wait > timeout:
+            self.requests.refund(1)
+            self.tokens.refund(tokens)
+            raise RateLimitTimeout(f"OpenAI rate limit: next slot in {wait:.1f}s, only {timeout:.1f}s left.")
+        if wait > 0:
+            time.sleep(wait)
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["throttled"] += wait > 0
+            self._stats["wait_seconds"] += wait
+        return wait
+
+    def rate_limited(self, retry_after: float) -> None:
+        with self._lock:
+            self._stats["rate_limited"] += 1
+        self.requests.pause(retry_after)
+        self.tokens.pause(retry_after)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {**self._stats, "wait_seconds": round(self._stats["wait_seconds"], 3)}
+
+
+def estimate_tokens(body: bytes) -> int:
+    """Prompt plus expected completion tokens of an OpenAI chat or embeddings request body."""
+    try:
+        payload: Any = json.loads(body or b"{}")
+    except ValueError:
+        return 1
+    if not isinstance(payload, dict):
+        return 1
+    if "input" in payload:
+        inputs = payload["input"]
+        items = inputs if isinstance(inputs, list) else [inputs]
+        # Pre-tokenized inputs (lists of ints) are already token counts.
+        return sum(len(i) if isinstance(i, list) else count_tokens(str(i)) for i in items) or 1
+    prompt = 0
+    for message in payload.get("messages", []):
+        content = message.get("content") if isinstance(message, dict) else None
+        prompt += count_tokens(content if isinstance(content, str) else json.dumps(content or ""))
+    completion = payload.get("max_completion_tokens") or payload.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return prompt + int(completion) * max(int(payload.get("n") or 1), 1)
+
+
+def _retry_after(response: httpx.Response) -> float:
+    for header in ("retry-after-ms", "retry-after"):
+        value = response.headers.get(header)
+        if value:
+            try:
+                seconds = float(value)
+            except ValueError:
+                continue
+            return seconds / 1000 if header == "retry-after-ms" else seconds
+    return 1.0
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """httpx transport that waits for the shared ``RateLimiter`` before each request."""
+
+    def __init__(self, limiter: RateLimiter, transport: httpx.BaseTransport) -> None:
+        self.limiter = limiter
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        from resilience import time_left
+
+        self.limiter.acquire(estimate_tokens(request.read()), timeout=time_left())
+        response = self.transport.handle_request(request)
+        if response.status_code == 429:
+            retry_after = _retry_after(response)
+            logger.warning("OpenAI returned 429; pausing outgoing requests for %.1fs", retry_after)
+            self.limiter.rate_limited(retry_after)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
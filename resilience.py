@@ -0,0 +1,410 @@
+"""
+Request deadlines, hedged LLM calls and circuit breakers.
+
+``HybridQAPipeline.ask`` opens a ``deadline_scope``; every stage below it (LLM
+calls, SQL execution, the RAG fallback) reads the time left from the context
+instead of taking a timeout argument. ``call_with_deadline`` runs a blocking call
+on a worker thread so it can be abandoned when its time is up, optionally sends a
+second (hedged) request when the first one is slower than usual, and reports
+provider failures to a per-dependency ``CircuitBreaker`` that fails fast while
+the provider (or the database) is unhealthy.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from config import settings
+from query_log import record_stage, record_tokens
+
+# Latency samples per stage before the hedge delay switches from the configured
+# value to the observed 95th percentile.
+HEDGE_MIN_SAMPLES = 20
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request ran out of time."""
+
+
+class CircuitOpenError(RuntimeError):
+    """A dependency is failing and calls to it are short-circuited."""
+
+    def __init__(self, breaker: str, retry_in: float) -> None:
+        super().__init__(f"{breaker} is unavailable (circuit open, retry in {retry_in:.0f}s).")
+        self.breaker = breaker
+
+
+# ---------- Metrics ----------
+
+
+class Metrics:
+    """Thread-safe counters (timeouts, hedges, breaker rejections) and per-stage latencies."""
+
+    def __init__(self, window: int = 200) -> None:
+        self._lock = threading.Lock()
+        self._counters: Counter = Counter()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._window = window
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(stage, deque(maxlen=self._window)).append(seconds)
+
+    def quantile(self, stage: str, q: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies.get(stage, ()))
+        if len(samples) < max(min_samples, 1):
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = list(self._latencies)
+            counters = dict(self._counters)
+        return {
+            "counters": counters,
+            "latency_p50": {s: self.quantile(s, 0.5) for s in stages},
+            "latency_p95": {s: self.quantile(s, 0.95) for s in stages},
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._latencies.clear()
+
+
+metrics = Metrics()
+
+
+# ---------- Deadlines ----------
+
+
+class Deadline:
+    """Absolute point in (monotonic) time by which the request must be answered."""
+
+    def __init__(self, seconds: float) -> None:
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str) -> None:
+        if self.expired:
+            metrics.incr("deadline_exceeded")
+            raise DeadlineExceeded(f"Request deadline exceeded before {stage}.")
+
+
+_current: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[Deadline]]:
+    """
+    Run the block under a deadline ``seconds`` from now. An enclosing deadline that
+    expires sooner wins; ``seconds`` of None or <= 0 keeps the enclosing one.
+    """
+    outer = _current.get()
+    deadline = outer
+    if seconds is not None and seconds > 0:
+        candidate = Deadline(seconds)
+        if outer is None or candidate.expires_at < outer.expires_at:
+            deadline = candidate
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def time_left(cap: Optional[float] = None) -> Optional[float]:
+    """Seconds left before the current deadline, capped at ``cap``; None when unbounded."""
+    deadline = _current.get()
+    left = deadline.remaining() if deadline is not None else None
+    if cap is not None and cap > 0:
+        left = cap if left is None else min(left, cap)
+    return left
+
+
+def check_deadline(stage: str) -> None:
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+# ---------- Circuit breakers ----------
+
+
+class CircuitBreaker:
+    """
+    Closed → open after ``failure_threshold`` consecutive failures; while open every
+    call fails immediately. After ``reset_seconds`` one trial call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half_open"
+            return "open"
+
+    def before_call(self) -> None:
+        """Raise ``CircuitOpenError`` unless a call may go through now."""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self._opened_at is None:
+                return
+            waited = time.monotonic() - self._opened_at
+            if waited >= self.reset_seconds and not self._probing:
+                self._probing = True
+                return
+            metrics.incr(f"{self.name}_circuit_rejections")
+            raise CircuitOpenError(self.name, max(self.reset_seconds - waited, 0.0))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self.failure_threshold > 0 and self._failures >= self.failure_threshold):
+                if self._opened_at is None or self._probing:
+                    metrics.incr(f"{self.name}_circuit_opened")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release(self) -> None:
+        """Give up a half-open trial call without an outcome (e.g. it was abandoned)."""
+        with self._lock:
+            self._probing = False
+
+    def call(self, fn: Callable[..., Any], *args: Any, is_failure: Callable[[BaseException], bool] = lambda e: True, **kwargs: Any) -> Any:
+        """Run ``fn`` through the breaker; only exceptions for which ``is_failure`` is true count."""
+        self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            if is_failure(exc):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self._failures}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Process-wide breaker per dependency ("llm", "sql")."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(
+                name, settings.breaker_failure_threshold, settings.breaker_reset_seconds
+            )
+        return breaker
+
+
+def is_provider_failure(exc: BaseException) -> bool:
+    """
+    True for errors that say the LLM provider is unhealthy (timeouts, connection
+    errors, 429 and 5xx), not for bad requests caused by the caller.
+    """
+    cause: Optional[BaseException] = exc
+    while cause is not None:
+        # Waiting on our own client-side limiter (rate_limit.py) says nothing about the provider.
+        if type(cause).__name__ == "RateLimitTimeout":
+            return False
+        cause = cause.__cause__
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return type(exc).__name__ in {"APIConnectionError", "APITimeoutError", "RateLimitError"}
+
+
+# ---------- Deadline-bound and hedged calls ----------
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.llm_max_workers, thread_name_prefix="llm-call")
+    return _executor
+
+
+def hedge_delay(stage: str) -> Optional[float]:
+    """
+    Seconds to wait before hedging a ``stage`` call: the observed p95 latency once
+    there are enough samples, LLM_HEDGE_AFTER_SECONDS before that. None disables hedging.
+    """
+    if settings.llm_hedge_after_seconds <= 0:
+        return None
+    p95 = metrics.quantile(stage, 0.95, min_samples=HEDGE_MIN_SAMPLES)
+    return p95 if p95 is not None else settings.llm_hedge_after_seconds
+
+
+def call_with_deadline(
+    fn: Callable[..., Any],
+    *args: Any,
+    stage: str,
+    hedge: bool = False,
+    breaker: str = "llm",
+    timeout: Optional[float] = None,
+) -> Any:
+    """
+    Call ``fn(*args)`` on a worker thread and wait at most until the current deadline
+    or ``timeout`` (default LLM_TIMEOUT_SECONDS), whichever comes first.
+
+    With ``hedge``, a second identical call is started when the first is slower than
+    ``hedge_delay(stage)`` (or fails with a provider error); the first successful
+    result wins. Only use it for idempotent calls. A call that times out is abandoned
+    (its thread finishes in the background and the result is discarded).
+    """
+    circuit = get_breaker(breaker)
+    check_deadline(stage)
+    circuit.before_call()
+
+    cap = timeout if timeout is not None else settings.llm_timeout_seconds
+    budget = time_left(cap)
+    delay = hedge_delay(stage) if hedge else None
+    start = time.monotonic()
+    executor = _get_executor()
+
+    def submit() -> Future:
+        # Each attempt runs in its own copy of the context (deadline included).
+        return executor.submit(contextvars.copy_context().run, fn, *args)
+
+    attempts: List[Future] = [submit()]
+    metrics.incr(f"{stage}_calls")
+    try:
+        return _wait_for_attempts(stage, attempts, submit, circuit, hedge, budget, delay, start)
+    finally:
+        # Per-question stage latency (query_log.py), failed and timed-out calls included.
+        record_stage(stage, time.monotonic() - start)
+
+
+def _wait_for_attempts(
+    stage: str,
+    attempts: List[Future],
+    submit: Callable[[], Future],
+    circuit: CircuitBreaker,
+    hedge: bool,
+    budget: Optional[float],
+    delay: Optional[float],
+    start: float,
+) -> Any:
+    hedged: Optional[Future] = None
+    error: Optional[BaseException] = None
+    while True:
+        elapsed = time.monotonic() - start
+        waits = [t for t in (
+            None if budget is None else budget - elapsed,
+            None if delay is None or hedged is not None else delay - elapsed,
+        ) if t is not None]
+        done, _ = wait(attempts, timeout=max(min(waits), 0.0) if waits else None, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            attempts.remove(future)
+            exc = future.exception()
+            if exc is None:
+                for other in attempts:
+                    other.cancel()
+                if future is hedged:
+                    metrics.incr(f"{stage}_hedges_won")
+                metrics.observe(stage, time.monotonic() - start)
+                circuit.record_success()
+                return future.result()
+            error = exc
+
+        if error is not None and not attempts:
+            if hedge and hedged is None and is_provider_failure(error) and (budget is None or time.monotonic() - start < budget):
+                hedged = submit()
+                attempts.append(hedged)
+                metrics.incr(f"{stage}_hedges")
+                error = None
+                continue
+            if is_provider_failure(error):
+                circuit.record_failure()
+            else:
+                # The provider answered; the request itself was bad.
+                circuit.record_success()
+            raise error
+
+        elapsed = time.monotonic() - start
+        if budget is not None and elapsed >= budget:
+            for future in attempts:
+                future.cancel()
+            metrics.incr(f"{stage}_timeouts")
+            deadline = current_deadline()
+            if deadline is not None and deadline.expired:
+                circuit.release()
+                metrics.incr("deadline_exceeded")
+                raise DeadlineExceeded(f"Request deadline exceeded during {stage} ({elapsed:.1f}s).")
+            # The per-call cap (not the request deadline) ran out: the provider is slow.
+            circuit.record_failure()
+            raise TimeoutError(f"{stage} call timed out after {elapsed:.1f}s.")
+
+        if delay is not None and hedged is None and elapsed >= delay and attempts:
+            hedged = submit()
+            attempts.append(hedged)
+            metrics.incr(f"{stage}_hedges")
+
+
+def invoke_llm(llm: Any, msg: Any, stage: str, hedge: bool = False) -> Any:
+    """``llm.invoke(msg)`` under the current deadline, the "llm" breaker and optional hedging."""
+    response = call_with_deadline(llm.invoke, msg, stage=stage, hedge=hedge)
+    record_tokens(stage, response)
+    return response
+
+
+def stats() -> Dict[str, Any]:
+    """Counters, latencies and breaker states (for the /resilience_stats endpoint)."""
+    with _breakers_lock:
+        breakers = {name: b.stats() for name, b in _breakers.items()}
+    return {**metrics.snapshot(), "breakers": breakers}
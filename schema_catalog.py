@@ -0,0 +1,274 @@
+"""
+Embedded catalog of SQL tables and columns, for picking the schema subset a
+question needs.
+
+Putting every table's schema into the Text-to-SQL prompt stops scaling once there
+are more than a handful of tables. Instead, every table and every column gets a
+short description (name, type, comment or a description from SQL_SCHEMA_DESCRIPTIONS,
+and the values of low-cardinality text columns). These descriptions are embedded
+once and cached in SQL_CATALOG_PATH. For each question, ``SchemaCatalog.select``
+ranks tables and columns by similarity to the question and keeps at most
+SQL_SCHEMA_MAX_TABLES tables with SQL_SCHEMA_MAX_COLUMNS columns each. Key columns
+(primary and foreign keys) are always kept so joins still work. The schema part of
+the prompt therefore has a fixed upper size however large the database grows.
+
+Build the cache ahead of time with:
+    uv run schema_catalog.py
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import xxhash
+from sqlalchemy import inspect, text
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Text columns with at most this many distinct values list them in the catalog.
+MAX_LISTED_VALUES = 10
+
+# Descriptions of the hotels table, used when SQL_SCHEMA_DESCRIPTIONS does not describe it.
+DEFAULT_DESCRIPTIONS: Dict[str, Dict[str, Any]] = {
+    "dubai_hotels_daily": {
+        "description": "Daily performance of each Dubai hotel: price, occupancy, rooms and the reasons behind them.",
+        "columns": {
+            "hotel_name": "Hotel name.",
+            "date": "Raw DD/MM/YYYY date text; use parsed_date_temp instead.",
+            "parsed_date_temp": "Calendar day of the row (DATE).",
+            "ADR": "Average daily rate (room price) of the hotel in AED.",
+            "ADR_Competition": "Average daily rate of the competitor set in AED.",
+            "Occupancy_%": "Share of available rooms sold that day, in percent.",
+            "Occupancy_Competition_%": "Occupancy of the competitor set, in percent.",
+            "Rooms_Available": "Rooms the hotel has (structural; use MAX, never SUM).",
+            "Rooms_Sold": "Rooms sold that day.",
+            "Justification": "Free-text explanation of the day's demand, pricing and occupancy.",
+        },
+    }
+}
+
+
+@dataclass
+class ColumnInfo:
+    name: str
+    type: str
+    description: str = ""
+    key: bool = False
+    values: List[str] = field(default_factory=list)
+
+    def catalog_text(self, table: str) -> str:
+        parts = [f"{table}.{self.name} ({self.type})"]
+        if self.description:
+            parts.append(self.description)
+        if self.values:
+            parts.append("Values: " + ", ".join(self.values))
+        return " ".join(parts)
+
+
+@dataclass
+class TableInfo:
+    name: str
+    columns: List[ColumnInfo]
+    description: str = ""
+    # (column, referenced table, referenced column)
+    foreign_keys: List[Tuple[str, str, str]] = field(default_factory=list)
+
+    def catalog_text(self) -> str:
+        names = ", ".join(c.name for c in self.columns)
+        return f"Table {self.name}: {self.description} Columns: {names}".replace("  ", " ")
+
+
+def load_descriptions(path: str = "") -> Dict[str, Dict[str, Any]]:
+    """
+    Table and column descriptions: DEFAULT_DESCRIPTIONS overlaid with the JSON file at
+    ``path`` (``{"table": {"description": "...", "columns": {"column": "..."}}}``).
+    """
+    descriptions = {name: dict(entry) for name, entry in DEFAULT_DESCRIPTIONS.items()}
+    path = path or settings.sql_schema_descriptions
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for name, entry in json.load(f).items():
+                merged = descriptions.setdefault(name, {})
+                merged["description"] = entry.get("description", merged.get("description", ""))
+                merged["columns"] = {**merged.get("columns", {}), **entry.get("columns", {})}
+    return descriptions
+
+
+def _distinct_values(engine: Any, table: str, column: str) -> List[str]:
+    quote = engine.dialect.identifier_preparer.quote
+    sql = f"SELECT DISTINCT {quote(column)} FROM {quote(table)} LIMIT {MAX_LISTED_VALUES + 1}"
+    try:
+        with engine.connect() as conn:
+            values = [row[0] for row in conn.execute(text(sql)) if row[0] is not None]
+    except Exception as exc:
+        logger.warning("Could not list values of %s.%s: %s", table, column, exc)
+        return []
+    if len(values) > MAX_LISTED_VALUES or any(len(str(v)) > 60 for v in values):
+        return []
+    return sorted(str(v) for v in values)
+
+
+def describe_tables(engine: Any, tables: Sequence[str], descriptions: Optional[Dict[str, Any]] = None) -> List[TableInfo]:
+    """Columns, keys and descriptions of ``tables`` as they exist in the database."""
+    descriptions = load_descriptions() if descriptions is None else descriptions
+    inspector = inspect(engine)
+    out = []
+    for table in tables:
+        described = descriptions.get(table, {})
+        column_docs = described.get("columns", {})
+        keys = set(inspector.get_pk_constraint(table).get("constrained_columns") or [])
+        foreign_keys = []
+        for fk in inspector.get_foreign_keys(table):
+            for column, referred in zip(fk["constrained_columns"], fk["referred_columns"]):
+                foreign_keys.append((column, fk["referred_table"], referred))
+                keys.add(column)
+        try:
+            comment = inspector.get_table_comment(table).get("text") or ""
+        except NotImplementedError:
+            comment = ""
+
+        columns = []
+        for col in inspector.get_columns(table):
+            type_name = str(col["type"])
+            is_text = any(t in type_name.upper() for t in ("CHAR", "TEXT", "VARCHAR"))
+            columns.append(
+                ColumnInfo(
+                    name=col["name"],
+                    type=type_name,
+                    description=column_docs.get(col["name"]) or col.get("comment") or "",
+                    key=col["name"] in keys,
+                    values=_distinct_values(engine, table, col["name"]) if is_text else [],
+                )
+            )
+        out.append(TableInfo(table, columns, described.get("description") or comment, foreign_keys))
+    return out
+
+
+class SchemaCatalog:
+    """Tables and columns with their embedded descriptions."""
+
+    def __init__(self, tables: Sequence[TableInfo]) -> None:
+        self.tables = list(tables)
+        # One entry per table (column None) and per column.
+        self.entries: List[Tuple[str, Optional[str], str]] = []
+        for table in self.tables:
+            self.entries.append((table.name, None, table.catalog_text()))
+            self.entries.extend((table.name, c.name, c.catalog_text(table.name)) for c in table.columns)
+        self.vectors: Optional[np.ndarray] = None
+        self.embeddings: Any = None
+
+    def fits(self, max_tables: int, max_columns: int) -> bool:
+        """True if the whole schema is within the prompt budget (no selection needed)."""
+        return len(self.tables) <= max_tables and all(len(t.columns) <= max_columns for t in self.tables)
+
+    def fingerprint(self, model: str) -> str:
+        texts = json.dumps([model] + [entry[2] for entry in self.entries])
+        return xxhash.xxh3_64_hexdigest(texts)
+
+    def index(self, embeddings: Any, model: str = "", cache_path: str = "") -> None:
+        """
+        Embed every entry, reusing ``cache_path`` when it was built from the same
+        descriptions and model. ``embeddings`` needs ``embed_documents`` / ``embed_query``.
+        """
+        self.embeddings = embeddings
+        fingerprint = self.fingerprint(model)
+        if cache_path and os.path.exists(cache_path):
+            with np.load(cache_path, allow_pickle=False) as cached:
+                if str(cached["fingerprint"]) == fingerprint:
+                    self.vectors = cached["vectors"]
+                    return
+        vectors = np.asarray(embeddings.embed_documents([entry[2] for entry in self.entries]), dtype=np.float32)
+        self.vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if cache_path:
+            np.savez(cache_path, fingerprint=np.array(fingerprint), vectors=self.vectors)
+            logger.info("Embedded %d schema catalog entries into %s", len(self.entries), cache_path)
+
+    def select(self, question: str, max_tables: int, max_columns: int) -> List[TableInfo]:
+        """
+        The at most ``max_tables`` tables most relevant to ``question``, each reduced to
+        its key columns plus its most relevant columns (``max_columns`` in total when
+        the keys allow), in their original order.
+        """
+        if self.vectors is None:
+            raise RuntimeError("SchemaCatalog.index() must run before select().")
+        query = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        scores = self.vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+
+        by_table: Dict[str, Dict[Optional[str], float]] = {}
+        for (table, column, _), score in zip(self.entries, scores.tolist()):
+            by_table.setdefault(table, {})[column] = score
+        ranked = sorted(self.tables, key=lambda t: -max(by_table[t.name].values()))
+
+        selected = []
+        for table in ranked[:max_tables]:
+            column_scores = by_table[table.name]
+            keep = {c.name for c in table.columns if c.key}
+            for column in sorted(table.columns, key=lambda c: -column_scores[c.name]):
+                if len(keep) >= max_columns:
+                    break
+                keep.add(column.name)
+            selected.append(
+                TableInfo(
+                    table.name,
+                    [c for c in table.columns if c.name in keep],
+                    table.description,
+                    [fk for fk in table.foreign_keys if fk[0] in keep],
+                )
+            )
+        return selected
+
+
+def render_schema(tables: Sequence[TableInfo], catalog: Optional[SchemaCatalog] = None) -> str:
+    """Compact CREATE TABLE listing with descriptions as SQL comments."""
+    totals = {t.name: len(t.columns) for t in catalog.tables} if catalog else {}
+    blocks = []
+    for table in tables:
+        items: List[Tuple[str, str]] = []
+        for column in table.columns:
+            comment = column.description
+            if column.values:
+                comment = f"{comment} Values: {', '.join(column.values)}".strip()
+            items.append((f"`{column.name}` {column.type}", comment))
+        for column, ref_table, ref_column in table.foreign_keys:
+            items.append((f"FOREIGN KEY (`{column}`) REFERENCES {ref_table}(`{ref_column}`)", ""))
+
+        lines = [f"-- {table.description}"] if table.description else []
+        lines.append(f"CREATE TABLE {table.name} (")
+        for i, (definition, comment) in enumerate(items):
+            comma = "," if i < len(items) - 1 else ""
+            lines.append(f"  {definition}{comma}{f'  -- {comment}' if comment else ''}")
+        total = totals.get(table.name, len(table.columns))
+        shown = f"  -- {len(table.columns)} of {total} columns shown" if total > len(table.columns) else ""
+        lines.append(f"){shown}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def build_catalog(engine: Any, tables: Sequence[str]) -> SchemaCatalog:
+    """Catalog of ``tables``, embedded with the shared embeddings client (cached on disk)."""
+    from llm_factory import get_embeddings
+
+    catalog = SchemaCatalog(describe_tables(engine, tables))
+    catalog.index(get_embeddings(settings.embedding_model), settings.embedding_model, settings.sql_catalog_path)
+    return catalog
+
+
+def main() -> None:
+    from db_engines import get_engine
+    from sql_core import get_sql_uri, sql_tables
+
+    tables = sql_tables()
+    catalog = build_catalog(get_engine(get_sql_uri()), tables)
+    columns = sum(len(t.columns) for t in catalog.tables)
+    print(f"Schema catalog: {len(tables)} tables, {columns} columns embedded into '{settings.sql_catalog_path}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+State shared by the worker processes of one host (WORKER_MODE=multi).
+
+Several uvicorn/gunicorn workers each hold their own pipeline, but they should not
+each keep their own caches or decide chat state on their own. Everything that has
+to be consistent across workers lives under SHARED_STATE_DIR:
+
+- ``SharedStore``: a SQLite key/value cache in WAL mode (``cache.sqlite``), holding
+  the answer, SQL and embedding caches and Telegram update ids. WAL lets every
+  worker read while one writes. Entries expire after SHARED_CACHE_TTL_SECONDS, and
+  each namespace is trimmed to SHARED_CACHE_MAX_ENTRIES, oldest writes first.
+- ``chat_lock``: a cross-process lock per chat (``flock`` on one of
+  ``CHAT_LOCK_STRIPES`` lock files). A chat turn (read history, answer, store
+  history) holds it, so a chat's turns do not interleave whichever worker gets them.
+- ``acquire_leadership``: exactly one worker runs once-per-deployment startup
+  work, such as registering the Telegram webhook.
+
+With WORKER_MODE=single (the default) ``get_shared_store`` returns None and the
+in-process caches are used as before.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+from config import settings
+
+CHAT_LOCK_STRIPES = 256
+
+
+def multi_worker() -> bool:
+    return settings.worker_mode == "multi"
+
+
+def shared_path(name: str) -> str:
+    os.makedirs(settings.shared_state_dir, exist_ok=True)
+    return os.path.join(settings.shared_state_dir, name)
+
+
+class SharedStore:
+    """Namespaced JSON key/value store in one SQLite file, safe across threads and processes."""
+
+    def __init__(self, path: str, max_entries: int = 50_000, ttl_seconds: float = 0) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats: Dict[str, int] = {"hits": 0, "misses": 0, "writes": 0}
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: commits do not fsync, a power loss can only drop the newest entries.
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS shared_cache ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_shared_cache_updated ON shared_cache (namespace, updated_at)")
+        self._db.commit()
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, updated_at FROM shared_cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None or (self.ttl_seconds > 0 and time.time() - row[1] > self.ttl_seconds):
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        payload = json.dumps(value, default=str)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO shared_cache (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                (namespace, key, payload, time.time()),
+            )
+            self._after_write_locked(namespace)
+            self._db.commit()
+
+    def add(self, namespace: str, key: str) -> bool:
+        """Insert ``key`` unless present; True for the first caller in any process."""
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO shared_cache (namespace, key, value, updated_at) VALUES (?, ?, 'null', ?)",
+                (namespace, key, time.time()),
+            )
+            self._after_write_locked(namespace)
+            self._db.commit()
+            return cursor.rowcount == 1
+
+    def _after_write_locked(self, namespace: str) -> None:
+        self._writes += 1
+        self._stats["writes"] += 1
+        if self._writes % 1000:
+            return
+        if self.ttl_seconds > 0:
+            self._db.execute("DELETE FROM shared_cache WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+        if self.max_entries > 0:
+            self._db.execute(
+                "DELETE FROM shared_cache WHERE namespace = ? AND updated_at < ("
+                "SELECT updated_at FROM shared_cache WHERE namespace = ? "
+                "ORDER BY updated_at DESC LIMIT 1 OFFSET ?)",
+                (namespace, namespace, self.max_entries - 1),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT namespace, COUNT(*) FROM shared_cache GROUP BY namespace"))
+            return {**self._stats, "entries": counts}
+
+
+_store: Optional[SharedStore] = None
+_store_lock = threading.Lock()
+
+
+def get_shared_store() -> Optional[SharedStore]:
+    """The process-wide SharedStore in multi-worker mode, else None."""
+    global _store
+    if not multi_worker():
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SharedStore(
+                    shared_path("cache.sqlite"),
+                    max_entries=settings.shared_cache_max_entries,
+                    ttl_seconds=settings.shared_cache_ttl_seconds,
+                )
+    return _store
+
+
+class FileLock:
+    """
+    Exclusive ``flock`` on ``path``. Every acquisition opens its own file descriptor,
+    so the lock excludes other threads of this process as well as other processes.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.release()
+
+
+def chat_lock(chat_id: object) -> FileLock:
+    """Cross-process lock for one chat (chats share CHAT_LOCK_STRIPES lock files)."""
+    stripe = zlib.crc32(str(chat_id).encode()) % CHAT_LOCK_STRIPES
+    os.makedirs(shared_path("locks"), exist_ok=True)
+    return FileLock(os.path.join(settings.shared_state_dir, "locks", f"chat-{stripe:03d}.lock"))
+
+
+# Leadership locks stay held for the life of the process.
+_leaders: Dict[str, FileLock] = {}
+
+
+def acquire_leadership(name: str) -> bool:
+    """
+    True in exactly one process of the deployment (always True in single-worker
+    mode). The winner keeps the lock until it exits; a restarted worker can take over.
+    """
+    if not multi_worker():
+        return True
+    if name in _leaders:
+        return True
+    lock = FileLock(shared_path(f"leader-{name}.lock"))
+    if lock.acquire(blocking=False):
+        _leaders[name] = lock
+        return True
+    return False
@@ -0,0 +1,118 @@
+"""
+Compare the token-aware splitter (text_splitter.py) with the character-based
+RecursiveCharacterTextSplitter on the documents under DATA_DIR.
+
+Usage:
+    uv run splitter_report.py                  # chunk counts, embedding tokens, split time
+    uv run splitter_report.py --workers 4      # token splitter with 4 processes
+    uv run splitter_report.py --retrieval      # also embed both chunk sets and time top-k search
+                                               # (needs OPENAI_API_KEY; embeds every chunk twice)
+
+Embedding tokens are counted with tiktoken (``token_utils.count_tokens``), i.e. what
+embedding the chunks would bill.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from typing import Dict, List, Sequence
+
+from config import settings
+from rag_core import RAGPipeline
+from token_utils import count_tokens
+
+SAMPLE_QUESTIONS = [
+    "What facilities does St Regis Downtown Dubai offer?",
+    "How far is Grand Millennium Business Bay from Dubai Mall?",
+    "Which hotel is best for budget business travellers near Dubai Investments Park?",
+    "Why was occupancy high at St Regis Dubai in December 2024?",
+    "What dining options are there at Grand Millennium Business Bay?",
+    "What do guests say about Premier Inn rooms?",
+]
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+def split_stats(docs: List, splitter: str) -> Dict[str, float]:
+    start = time.perf_counter()
+    chunks = RAGPipeline.split_documents(docs, splitter)
+    seconds = time.perf_counter() - start
+    tokens = [count_tokens(c.page_content) for c in chunks]
+    return {
+        "chunks": chunks,
+        "count": len(chunks),
+        "tokens": sum(tokens),
+        "mean": statistics.mean(tokens) if tokens else 0.0,
+        "p95": _percentile(tokens, 0.95),
+        "max": max(tokens, default=0),
+        "split_ms": seconds * 1000,
+    }
+
+
+def retrieval_ms(chunks: List, name: str, questions: List[str], repeats: int) -> Dict[str, float]:
+    """Embed ``chunks`` into a throwaway in-memory collection and time top-k searches."""
+    from langchain_community.vectorstores import Chroma
+
+    from llm_factory import get_embeddings
+
+    embeddings = get_embeddings(settings.embedding_model)
+    store = Chroma.from_documents(chunks, embedding=embeddings, collection_name=f"splitter_report_{name}")
+    vectors = embeddings.embed_documents(questions)
+    timings = []
+    try:
+        for _ in range(repeats):
+            for vector in vectors:
+                start = time.perf_counter()
+                store.similarity_search_by_vector(vector, k=settings.k)
+                timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        store.delete_collection()
+    return {"mean": statistics.mean(timings), "p95": _percentile(timings, 0.95)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=settings.ingest_workers, help="Processes for the token splitter.")
+    parser.add_argument("--retrieval", action="store_true", help="Also time retrieval (embeds all chunks).")
+    parser.add_argument("--repeats", type=int, default=20, help="Search repetitions per question.")
+    args = parser.parse_args()
+    settings.ingest_workers = args.workers
+
+    docs = RAGPipeline.load_documents()
+    print(f"{len(docs)} documents under '{settings.data_dir}'\n")
+
+    results = {
+        f"recursive ({settings.chunk_size} chars, {settings.chunk_overlap} overlap)": split_stats(docs, "recursive"),
+        f"tokens ({settings.chunk_tokens} tokens, {settings.chunk_overlap_tokens} overlap at cuts)": split_stats(
+            docs, "tokens"
+        ),
+    }
+
+    print(f"{'splitter':<48} {'chunks':>7} {'emb. tokens':>12} {'mean':>6} {'p95':>6} {'max':>6} {'split ms':>9}")
+    for name, r in results.items():
+        print(
+            f"{name:<48} {r['count']:>7} {r['tokens']:>12,} {r['mean']:>6.0f} {r['p95']:>6.0f} "
+            f"{r['max']:>6} {r['split_ms']:>9.0f}"
+        )
+
+    old, new = results.values()
+    if old["count"] and old["tokens"]:
+        print(
+            f"\nToken splitter: {new['count'] / old['count']:.2f}x chunks, "
+            f"{new['tokens'] / old['tokens']:.2f}x embedding tokens of the recursive splitter."
+        )
+
+    if args.retrieval:
+        print(f"\nTop-{settings.k} retrieval over {len(SAMPLE_QUESTIONS)} questions x {args.repeats}:")
+        for label, r in (("recursive", old), ("tokens", new)):
+            timing = retrieval_ms(r["chunks"], label, SAMPLE_QUESTIONS, args.repeats)
+            print(f"  {label:<10} mean {timing['mean']:6.2f} ms   p95 {timing['p95']:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
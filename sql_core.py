@@ -1,13 +1,63 @@
 from __future__ import annotations
 
+import logging
+import re
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from datetime import date
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
 
-from langchain_community.utilities import SQLDatabase
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+from sqlalchemy import inspect
 
 from config import settings
+from db_engines import get_engine
+from lazy import LazyChatPrompt, lazy_property
+from query_log import record_cache_hit, record_sql
+from llm_factory import get_chat_model, get_embeddings, sql_cascade
+from resilience import (
+    CircuitOpenError,
+    DeadlineExceeded,
+    call_with_deadline,
+    check_deadline,
+    get_breaker,
+    invoke_llm,
+    time_left,
+)
+from shared_state import get_shared_store
+from sql_dialect import translate_mysql_to_sqlite
+from sql_guard import GuardedResult, SQLGuard, SQLTimeoutError
+from sql_results import SQLResult, render_table
+from sql_rollups import RollupRewrite, RollupRewriter, results_match
+
+if TYPE_CHECKING:
+    from schema_catalog import SchemaCatalog
+
+logger = logging.getLogger(__name__)
+
+_DATE_LITERAL = re.compile(r"'(\d{4}-\d{2}-\d{2})")
+_YEAR_FILTER = re.compile(r"YEAR\s*\([^)]*\)\s*(?:=|>=?|<=?|IN\s*\()\s*(\d{4})", re.IGNORECASE)
+
+# MySQL client/server errors that mean the database itself is unreachable or overloaded:
+# too many connections, shutdown in progress, can't connect, server gone away, lost connection.
+_DB_OUTAGE_CODES = {1040, 1053, 2002, 2003, 2006, 2013}
+
+
+def is_db_outage(exc: BaseException) -> bool:
+    """True when ``exc`` says the database is down, as opposed to a bad query."""
+    from sqlalchemy import exc as sa_exc
+
+    if isinstance(exc, sa_exc.TimeoutError):
+        # Pool checkout timed out.
+        return True
+    if isinstance(exc, sa_exc.DBAPIError):
+        if exc.connection_invalidated:
+            return True
+        args = getattr(exc.orig, "args", ())
+        if args and args[0] in _DB_OUTAGE_CODES:
+            return True
+        message = str(exc.orig).lower()
+        return "unable to open database" in message or "database is locked" in message
+    return False
 
 
 def get_mysql_uri() -> str:
@@ -23,31 +73,80 @@ def get_mysql_uri() -> str:
     )
 
 
+def get_sql_uri() -> str:
+    """
+    SQLAlchemy URI for the configured backend. For "sqlite" the embedded database
+    is (re)built from the hotels CSV first if needed.
+    """
+    if settings.sql_backend == "sqlite":
+        from load_mysql import ensure_sqlite_database
+
+        return ensure_sqlite_database()
+    return get_mysql_uri()
+
+
 @dataclass
 class SQLAnswer:
     sql: str
+    # JSON-friendly row dicts (dates as ISO strings).
     rows: List[Dict[str, Any]]
+    # Compact, token-capped table of the result, used in the answer prompts.
     raw_result: Any
+    # SQL that was actually executed, when it differs from the generated one
+    # (rollup rewrite and/or sargable date rewrites from the guard).
+    executed_sql: Optional[str] = None
+    # True when the result hit SQL_MAX_ROWS and was cut off.
+    truncated: bool = False
+    # Typed, columnar result.
+    result: Optional[SQLResult] = None
+    # Model that produced the SQL and its cascade tier ("fast" or "strong").
+    model: Optional[str] = None
+    tier: Optional[str] = None
+
+
+def sql_tables(main_table: Optional[str] = None) -> List[str]:
+    """The main hotels table followed by the extra tables listed in SQL_TABLES."""
+    tables = [main_table or settings.mysql_table]
+    for name in settings.sql_tables.split(","):
+        if name.strip() and name.strip() not in tables:
+            tables.append(name.strip())
+    return tables
 
 
 class SQLPipeline:
     """
     Simple Text-to-SQL pipeline on top of a MySQL database using LangChain.
+
+    With SQL_BACKEND=sqlite the same MySQL-flavoured SQL is generated and translated
+    to SQLite before execution against the embedded database.
     """
 
     def __init__(self, table: Optional[str] = None) -> None:
         if not settings.openai_api_key:
             raise ValueError("OPENAI_API_KEY is not set. Please configure it in your environment or .env file.")
 
-        uri = get_mysql_uri()
-        # Limit tables to the main Dubai hotels table for safety by default.
-        include_tables = [table or settings.mysql_table]
-
-        self.db = SQLDatabase.from_uri(uri, include_tables=include_tables)
-        self.llm = ChatOpenAI(model=settings.openai_model, api_key=settings.openai_api_key)
+        uri = get_sql_uri()
+        # Limit tables to the main Dubai hotels table (plus SQL_TABLES) for safety.
+        self.table = table or settings.mysql_table
+        self.tables = sql_tables(self.table)
+
+        # Deferred: langchain_community pulls in a large import graph.
+        from langchain_community.utilities import SQLDatabase
+
+        # Engines are shared per URL across pipelines so pooled connections stay warm.
+        self.db = SQLDatabase(get_engine(uri), include_tables=self.tables)
+        self.rollups = self._init_rollups()
+        self.guard = SQLGuard(
+            self.db._engine,
+            max_cost=settings.sql_max_cost,
+            timeout_ms=settings.sql_timeout_ms,
+            max_rows=settings.sql_max_rows,
+        )
+        # (data version, (first date, last date)) of the main table.
+        self._date_bounds: Optional[Tuple[int, Optional[Tuple[date, date]]]] = None
 
         # Prompt to generate SQL directly from schema + question
-        self.sql_prompt = ChatPromptTemplate.from_template(
+        self.sql_prompt = LazyChatPrompt(
             """
           You are an expert MySQL analyst. Generate ONLY valid MySQL queries.
 
@@ -162,6 +261,8 @@ SAFETY RULES
 ====================================================
 - NEVER invent columns.
 - NEVER guess table names.
+- Use ONLY the tables and columns listed in SCHEMA (it may list just the
+  ones relevant to this question).
 - NEVER output explanations.
 - Output ONLY a valid SQL query.
 
@@ -176,21 +277,197 @@ USER QUESTION
 Write ONLY the SQL query:""".strip()
         )
 
-    def ask_sql(self, question: str) -> SQLAnswer:
+    @property
+    def llm(self) -> Any:
+        """Client of the first (fast) SQL generation tier."""
+        return get_chat_model(settings.sql_model)
+
+    @lazy_property
+    def schema_catalog(self) -> Optional[SchemaCatalog]:
         """
-        Generate SQL for a natural language question, execute it, and return the results.
+        Embedded catalog of the included tables, or None while the whole schema fits
+        in SQL_SCHEMA_MAX_TABLES tables of SQL_SCHEMA_MAX_COLUMNS columns (the full
+        schema, with sample rows, then goes into the prompt as before).
+        """
+        from schema_catalog import SchemaCatalog, describe_tables
+
+        catalog = SchemaCatalog(describe_tables(self.db._engine, self.tables))
+        if catalog.fits(settings.sql_schema_max_tables, settings.sql_schema_max_columns):
+            return None
+        catalog.index(get_embeddings(settings.embedding_model), settings.embedding_model, settings.sql_catalog_path)
+        return catalog
+
+    @lazy_property
+    def full_schema(self) -> str:
+        """CREATE TABLE statements with sample rows, reflected once and shared by every question."""
+        return self.db.get_table_info()
+
+    def _schema_for(self, question: str) -> str:
+        """Schema text for the SQL prompt: everything, or the subset relevant to ``question``."""
+        catalog = self.schema_catalog
+        if catalog is None:
+            return self.full_schema
+        from schema_catalog import render_schema
+
+        # Embedding the question is a provider call: bounded and hedged like the LLM calls.
+        tables = call_with_deadline(
+            catalog.select,
+            question,
+            settings.sql_schema_max_tables,
+            settings.sql_schema_max_columns,
+            stage="schema",
+            hedge=True,
+        )
+        logger.info("Schema subset for %r: %s", question, ", ".join(f"{t.name}({len(t.columns)})" for t in tables))
+        return render_schema(tables, catalog)
+
+    def _init_rollups(self) -> Optional[RollupRewriter]:
+        """Enable rollup rewrites only if load_mysql.py has built the rollup tables."""
+        if not settings.sql_rollups:
+            return None
+        from load_mysql import ROLLUP_GRAINS, rollup_table_name
+
+        inspector = inspect(self.db._engine)
+        if not all(inspector.has_table(rollup_table_name(self.table, g)) for g in ROLLUP_GRAINS):
+            return None
+        return RollupRewriter(self.table, verify_runs=settings.rollup_verify_runs)
+
+    def _dialect_sql(self, sql: str) -> str:
+        """Translate generated MySQL into the dialect of the configured backend."""
+        if self.db.dialect == "sqlite":
+            return translate_mysql_to_sqlite(sql)
+        return sql
+
+    def _execute(self, sql: str) -> GuardedResult:
+        """
+        Run generated (MySQL-flavoured) SQL through the guard: read-only check,
+        sargable rewrites, dialect translation, EXPLAIN cost check, timeout and row cap.
+        """
+        guarded_sql, rewrites = self.guard.prepare(sql)
+        check_deadline("SQL execution")
+        # Never let the query outlive the request deadline.
+        left = time_left(settings.sql_timeout_ms / 1000 if settings.sql_timeout_ms > 0 else None)
+        timeout_ms = max(int(left * 1000), 1) if left is not None else None
+        start = time.monotonic()
+        result = get_breaker("sql").call(
+            self.guard.execute, self._dialect_sql(guarded_sql), rewrites, timeout_ms, is_failure=is_db_outage
+        )
+        record_sql(time.monotonic() - start, len(result.rows))
+        result.sql = guarded_sql
+        return result
+
+    def _fetch_rows(self, sql: str) -> Sequence[Sequence[Any]]:
+        return self._execute(sql).rows
+
+    def _choose_rollup(self, sql: str, rewrite: RollupRewrite) -> str:
+        """
+        Return the SQL to execute for a rewritable query. The first runs of each query
+        shape (per data version) execute both forms and only trust the rollup if the
+        results match; a mismatch pins that shape to the original query.
         """
+        version = self.data_version()
+        if self.rollups.is_rejected(rewrite, version):
+            return sql
+        if not self.rollups.needs_verification(rewrite, version):
+            return rewrite.sql
+
+        try:
+            matched = results_match(
+                self._fetch_rows(sql),
+                self._fetch_rows(rewrite.sql),
+                ordered="order by" in sql.lower(),
+            )
+        except Exception as exc:
+            logger.warning("Rollup rewrite failed to execute (%s): %s", exc, rewrite.sql)
+            matched = False
+        if not matched:
+            logger.warning("Rollup rewrite does not match the original query, disabled: %s", rewrite.sql)
+        self.rollups.record_verification(rewrite, version, matched)
+        return rewrite.sql if matched else sql
+
+    def data_version(self) -> int:
+        """
+        Load version of the main table, bumped by load_mysql.py whenever rows change.
+        Include it in cache keys so cached answers expire after a data refresh.
+        """
+        from load_mysql import get_table_version
+
+        return get_breaker("sql").call(get_table_version, self.db._engine, self.table, is_failure=is_db_outage)
+
+    def cache_version(self) -> str:
+        """
+        Data stamp for answer cache keys: the load version of the main table and, for
+        each other SQL_TABLES table, its load version (if load_mysql.py stamps it) and
+        row count, so answers also expire when a joined table changes.
+        """
+        parts = [str(self.data_version())]
+        if len(self.tables) > 1:
+            from sqlalchemy import text
+
+            from load_mysql import get_table_version
+
+            def read() -> List[str]:
+                engine = self.db._engine
+                with engine.connect() as conn:
+                    quote = conn.dialect.identifier_preparer.quote
+                    counts = [conn.execute(text(f"SELECT COUNT(*) FROM {quote(t)}")).scalar() for t in self.tables[1:]]
+                return [f"{get_table_version(engine, t)}/{n}" for t, n in zip(self.tables[1:], counts)]
+
+            parts += get_breaker("sql").call(read, is_failure=is_db_outage)
+        return ".".join(parts)
+
+    def _date_range(self) -> Optional[Tuple[date, date]]:
+        """First and last parsed_date_temp of the main table, re-read after each data refresh."""
+        version = self.data_version()
+        if self._date_bounds is None or self._date_bounds[0] != version:
+            from sqlalchemy import text
+
+            def read() -> Optional[Tuple[date, date]]:
+                with self.db._engine.connect() as conn:
+                    low, high = conn.execute(
+                        text(f"SELECT MIN(parsed_date_temp), MAX(parsed_date_temp) FROM {self.table}")
+                    ).one()
+                if low is None or high is None:
+                    return None
+                return date.fromisoformat(str(low)[:10]), date.fromisoformat(str(high)[:10])
+
+            self._date_bounds = (version, get_breaker("sql").call(read, is_failure=is_db_outage))
+        return self._date_bounds[1]
+
+    def _outside_data(self, sql: str) -> bool:
+        """
+        True when every date the SQL filters on lies before the first or after the last
+        day of data (e.g. a question about next year): no rows is then the right answer.
+        """
+        try:
+            dates = [date.fromisoformat(d) for d in _DATE_LITERAL.findall(sql)]
+        except ValueError:  # e.g. '2025-02-30'
+            return False
+        years = [int(y) for y in _YEAR_FILTER.findall(sql)]
+        if not dates and not years:
+            return False
+        try:
+            bounds = self._date_range()
+        except Exception as exc:
+            logger.info("Date range unavailable (%s); treating the empty result as unexpected.", exc)
+            return False
+        if bounds is None:
+            return False
+        low, high = bounds
+        before = all(d < low for d in dates) and all(y < low.year for y in years)
+        after = all(d > high for d in dates) and all(y > high.year for y in years)
+        return before or after
+
+    def _generate_sql(self, question: str, llm: Any) -> str:
         # Get schema info for better SQL generation
-        schema = self.db.get_table_info()
+        schema = self._schema_for(question)
 
         # Ask LLM to generate SQL
         msg = self.sql_prompt.format(schema=schema, question=question)
-        sql_query = self.llm.invoke(msg).content.strip()
+        sql_query = invoke_llm(llm, msg, stage="sql", hedge=True).content.strip()
 
         # Defensive cleanup: strip markdown fences like ```sql ... ``` while keeping the inner query.
         if "```" in sql_query:
-            import re
-
             match = re.search(r"```(?:sql)?\s*(.*?)```", sql_query, re.IGNORECASE | re.DOTALL)
             if match:
                 sql_query = match.group(1).strip()
@@ -200,15 +477,90 @@ Write ONLY the SQL query:""".strip()
 
         if not sql_query:
             raise ValueError("Generated SQL query was empty. Check the LLM prompt or question.")
+        return sql_query
+
+    def _run_sql(self, sql_query: str) -> SQLAnswer:
+        # Answer aggregate queries from the rollup tables when they can be rewritten.
+        executed_sql = sql_query
+        rewrite = self.rollups.rewrite(sql_query) if self.rollups else None
+        if rewrite is not None:
+            executed_sql = self._choose_rollup(sql_query, rewrite)
+
+        # Execute the SQL query through the guard.
+        guarded = self._execute(executed_sql)
+        if guarded.rewrites:
+            logger.info("Sargable rewrites applied: %s", "; ".join(guarded.rewrites))
+        executed_sql = guarded.sql
+
+        result = SQLResult.from_rows(guarded.columns, guarded.rows, truncated=guarded.truncated)
+        raw_result = render_table(
+            result, max_rows=settings.sql_prompt_max_rows, max_tokens=settings.sql_prompt_max_tokens
+        )
 
-        # Execute the SQL query
-        raw_result = self.db.run(sql_query)
-
-        # SQLDatabase.run may return a string representation; we keep it as-is and
-        # also expose it in a rows-like field for convenience (best-effort parsing).
-        rows: List[Dict[str, Any]] = []
-
-        return SQLAnswer(sql=sql_query, rows=rows, raw_result=raw_result)
+        return SQLAnswer(
+            sql=sql_query,
+            rows=result.records(),
+            raw_result=raw_result,
+            executed_sql=executed_sql if executed_sql != sql_query.rstrip(";").strip() else None,
+            truncated=result.truncated,
+            result=result,
+        )
 
+    def ask_sql(self, question: str) -> SQLAnswer:
+        """
+        Generate SQL for a natural language question, execute it, and return the results.
 
+        SQL is generated by the fast model first. If that SQL fails to parse or execute
+        (including guard rejections) or returns no rows, the question is retried once
+        with the strong model, told what went wrong.
 
+        In multi-worker mode, SQL that returned rows is cached per question in the shared
+        store and re-run (on current data) when any worker gets the question again.
+        """
+        store = get_shared_store()
+        cache_key = f"{','.join(self.tables)}:{' '.join(question.lower().split()).rstrip('?. ')}"
+        cached = store.get("sql", cache_key) if store is not None else None
+        if cached is not None:
+            # SQL generated for the same question by any worker: re-run it on the current data.
+            try:
+                answer = self._run_sql(cached["sql"])
+            except (DeadlineExceeded, CircuitOpenError):
+                raise
+            except Exception as exc:
+                logger.info("Cached SQL failed (%s); generating again.", exc)
+            else:
+                if answer.rows:
+                    answer.model, answer.tier = cached["model"], cached["tier"]
+                    record_cache_hit("sql_cache")
+                    return answer
+
+        tiers = sql_cascade()
+        prompt_question = question
+        for i, (tier, model) in enumerate(tiers):
+            last = i == len(tiers) - 1
+            sql_query = ""
+            try:
+                sql_query = self._generate_sql(prompt_question, get_chat_model(model))
+                answer = self._run_sql(sql_query)
+            except (DeadlineExceeded, CircuitOpenError, SQLTimeoutError):
+                # No time left, the provider/database is down, or the query is simply
+                # slow: a second model and a second query cannot help.
+                raise
+            except Exception as exc:
+                if last:
+                    raise
+                problem = f"failed with: {exc}"
+            else:
+                if answer.rows or last or self._outside_data(sql_query):
+                    answer.model, answer.tier = model, tier
+                    if store is not None and answer.rows:
+                        store.set("sql", cache_key, {"sql": sql_query, "model": model, "tier": tier})
+                    return answer
+                problem = "returned no rows"
+
+            logger.info("SQL from %s (%s) %s; escalating.", model, tier, problem)
+            prompt_question = (
+                f"{question}\n\nA previous attempt produced this SQL:\n{sql_query or '(none)'}\n"
+                f"which {problem}. Write a corrected query."
+            )
+        raise RuntimeError("No SQL model configured.")
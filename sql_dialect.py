@@ -0,0 +1,186 @@
+"""
+Translate the MySQL-flavoured SQL produced by the Text-to-SQL prompt into SQLite.
+
+Only function calls are rewritten; everything else the prompt produces (backtick
+identifiers, LIMIT, subqueries, self-joins, GROUP BY) is valid SQLite already.
+Dates are stored as ISO 'YYYY-MM-DD' text, so date parts come from strftime().
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# MySQL DATE_FORMAT specifiers → strftime ones. %M / %b (month names) become a CASE;
+# any other specifier makes DATE_FORMAT untranslatable, so the query fails loudly
+# instead of formatting the wrong field (strftime's %M is minutes).
+_DATE_FORMAT_SPECIFIERS = {
+    "%Y": "%Y",
+    "%y": "%y",
+    "%m": "%m",
+    "%c": "%m",
+    "%d": "%d",
+    "%e": "%d",
+    "%H": "%H",
+    "%i": "%M",
+    "%s": "%S",
+    "%S": "%S",
+    "%j": "%j",
+    "%w": "%w",
+    "%%": "%%",
+}
+_MONTH_NAMES = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+]
+_SPECIFIER = re.compile(r"(%.)")
+
+_INTERVAL = re.compile(r"^INTERVAL\s+(-?\d+)\s+(DAY|WEEK|MONTH|YEAR)S?$", re.IGNORECASE)
+
+
+def _part(fmt: str) -> Callable[[List[str]], str]:
+    return lambda args: f"CAST(strftime('{fmt}', {args[0]}) AS INTEGER)"
+
+
+def _month_name(date: str, abbreviated: bool) -> str:
+    whens = " ".join(
+        f"WHEN {i} THEN '{name[:3] if abbreviated else name}'" for i, name in enumerate(_MONTH_NAMES, start=1)
+    )
+    return f"CASE CAST(strftime('%m', {date}) AS INTEGER) {whens} END"
+
+
+def _date_format(args: List[str]) -> Optional[str]:
+    literal = args[1].strip()
+    if len(literal) < 2 or literal[0] != "'" or literal[-1] != "'":
+        return None
+    pieces, fmt = [], ""
+    for token in _SPECIFIER.split(literal[1:-1]):
+        if not _SPECIFIER.fullmatch(token):
+            fmt += token
+        elif token in _DATE_FORMAT_SPECIFIERS:
+            fmt += _DATE_FORMAT_SPECIFIERS[token]
+        elif token in ("%M", "%b"):
+            if fmt:
+                pieces.append(f"strftime('{fmt}', {args[0]})")
+                fmt = ""
+            pieces.append(_month_name(args[0], abbreviated=token == "%b"))
+        else:
+            return None
+    if fmt or not pieces:
+        pieces.append(f"strftime('{fmt}', {args[0]})")
+    return pieces[0] if len(pieces) == 1 else "(" + " || ".join(pieces) + ")"
+
+
+def _date_shift(sign: int) -> Callable[[List[str]], Optional[str]]:
+    def translate(args: List[str]) -> Optional[str]:
+        match = _INTERVAL.match(args[1].strip())
+        if not match:
+            return None
+        amount, unit = int(match.group(1)) * sign, match.group(2).lower()
+        if unit == "week":
+            amount, unit = amount * 7, "day"
+        return f"date({args[0]}, '{amount:+d} {unit}s')"
+
+    return translate
+
+
+_FUNCTIONS: Dict[str, Callable[[List[str]], Optional[str]]] = {
+    "YEAR": _part("%Y"),
+    "MONTH": _part("%m"),
+    "DAY": _part("%d"),
+    "DAYOFMONTH": _part("%d"),
+    "DAYOFYEAR": _part("%j"),
+    "DAYOFWEEK": lambda args: f"(CAST(strftime('%w', {args[0]}) AS INTEGER) + 1)",
+    "WEEKDAY": lambda args: f"((CAST(strftime('%w', {args[0]}) AS INTEGER) + 6) % 7)",
+    "QUARTER": lambda args: f"((CAST(strftime('%m', {args[0]}) AS INTEGER) + 2) / 3)",
+    "DATE_FORMAT": _date_format,
+    "DATEDIFF": lambda args: f"CAST(julianday({args[0]}) - julianday({args[1]}) AS INTEGER)",
+    "DATE_SUB": _date_shift(-1),
+    "DATE_ADD": _date_shift(1),
+    "CURDATE": lambda args: "date('now')",
+    "NOW": lambda args: "datetime('now')",
+    "CONCAT": lambda args: "(" + " || ".join(args) + ")",
+    "IF": lambda args: f"CASE WHEN {args[0]} THEN {args[1]} ELSE {args[2]} END",
+}
+
+_CALL = re.compile(r"\b(" + "|".join(_FUNCTIONS) + r")\s*\(", re.IGNORECASE)
+
+
+def _matching_paren(sql: str, open_idx: int) -> int:
+    depth, quote = 0, None
+    for i in range(open_idx, len(sql)):
+        ch = sql[i]
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"`":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError(f"Unbalanced parentheses in SQL: {sql}")
+
+
+def _split_args(args: str) -> List[str]:
+    parts, depth, start, quote = [], 0, 0, None
+    for i, ch in enumerate(args):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"`":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(args[start:i].strip())
+            start = i + 1
+    tail = args[start:].strip()
+    if tail or parts:
+        parts.append(tail)
+    return parts
+
+
+def _in_literal(sql: str, idx: int) -> bool:
+    return sql.count("'", 0, idx) % 2 == 1
+
+
+def _next_call(sql: str, pos: int) -> Optional[Tuple[re.Match, int]]:
+    for match in _CALL.finditer(sql, pos):
+        if not _in_literal(sql, match.start()):
+            return match, _matching_paren(sql, match.end() - 1)
+    return None
+
+
+def translate_mysql_to_sqlite(sql: str) -> str:
+    """
+    Rewrite MySQL-only functions (YEAR/MONTH/DAY, DATE_FORMAT, DATE_SUB, CONCAT, ...)
+    into SQLite equivalents. Nested calls are translated inside-out.
+    """
+    out: List[str] = []
+    pos = 0
+    while True:
+        found = _next_call(sql, pos)
+        if found is None:
+            out.append(sql[pos:])
+            break
+        match, close = found
+        name = match.group(1).upper()
+        args = [translate_mysql_to_sqlite(arg) for arg in _split_args(sql[match.end() : close])]
+        replacement = _FUNCTIONS[name](args)
+        out.append(sql[pos : match.start()])
+        if replacement is None:
+            out.append(f"{match.group(1)}({', '.join(args)})")
+        else:
+            out.append(replacement)
+        pos = close + 1
+
+    translated = "".join(out)
+    # Keyword forms without parentheses.
+    translated = re.sub(r"\bCURRENT_DATE\b(?!\s*\()", "date('now')", translated, flags=re.IGNORECASE)
+    return translated
@@ -0,0 +1,282 @@
+"""
+Execution guard for LLM-generated SQL.
+
+Before a generated query reaches the database it is:
+
+1. checked to be a single read-only SELECT,
+2. rewritten so function-wrapped date predicates can use the indexes
+   (``YEAR(parsed_date_temp) = 2025`` → a date range, and the same-day-last-year
+   self-join gets an indexable ``t2.parsed_date_temp = DATE_SUB(t1.parsed_date_temp, ...)``),
+3. EXPLAINed and rejected when the estimated cost is above ``SQL_MAX_COST``,
+4. executed with a server-side timeout (``SQL_TIMEOUT_MS``) and a row cap
+   (``SQL_MAX_ROWS``).
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+
+
+class SQLGuardError(ValueError):
+    """Raised when a generated query is rejected or aborted by the guard."""
+
+
+class SQLTimeoutError(SQLGuardError):
+    """The query ran past its time limit and was interrupted."""
+
+
+@dataclass
+class GuardedResult:
+    sql: str
+    columns: List[str]
+    rows: List[Tuple[Any, ...]]
+    truncated: bool = False
+    estimated_cost: Optional[float] = None
+    rewrites: List[str] = field(default_factory=list)
+
+
+_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+_WRITE_KEYWORDS = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|DROP|ALTER|CREATE|TRUNCATE|GRANT|REVOKE|RENAME|SET|CALL|LOAD|HANDLER|LOCK|OUTFILE|DUMPFILE)\b"
+    # REPLACE is also a string function; only the statement form writes.
+    r"|^\s*(REPLACE)\b|\b(REPLACE)\s+INTO\b",
+    re.IGNORECASE,
+)
+_DATE_COL = r"((?:\w+\.)?`?parsed_date_temp`?)"
+_YEAR_EQ = re.compile(rf"YEAR\s*\(\s*{_DATE_COL}\s*\)\s*=\s*(\d{{4}})", re.IGNORECASE)
+_YEAR_BETWEEN = re.compile(
+    rf"YEAR\s*\(\s*{_DATE_COL}\s*\)\s+BETWEEN\s+(\d{{4}})\s+AND\s+(\d{{4}})", re.IGNORECASE
+)
+_SAME_MONTH = re.compile(rf"MONTH\s*\(\s*{_DATE_COL}\s*\)\s*=\s*MONTH\s*\(\s*{_DATE_COL}\s*\)", re.IGNORECASE)
+_SAME_DAY = re.compile(rf"DAY\s*\(\s*{_DATE_COL}\s*\)\s*=\s*DAY\s*\(\s*{_DATE_COL}\s*\)", re.IGNORECASE)
+_YEAR_MINUS = re.compile(
+    rf"YEAR\s*\(\s*{_DATE_COL}\s*\)\s*=\s*YEAR\s*\(\s*{_DATE_COL}\s*\)\s*-\s*(\d+)", re.IGNORECASE
+)
+_TRAILING_LIMIT = re.compile(r"\bLIMIT\s+\d+(?:\s*(?:,|OFFSET)\s*\d+)?\s*$", re.IGNORECASE)
+
+
+def _mask_literals(sql: str) -> str:
+    return _LITERAL.sub(lambda m: "'" + " " * (len(m.group(0)) - 2) + "'", sql)
+
+
+def check_read_only(sql: str) -> str:
+    """Return ``sql`` without a trailing semicolon, or raise if it is not a single SELECT."""
+    sql = sql.strip().rstrip(";").strip()
+    masked = _mask_literals(sql)
+    if ";" in masked:
+        raise SQLGuardError("Only a single SQL statement is allowed.")
+    if not re.match(r"^\(*\s*(SELECT|WITH)\b", masked, re.IGNORECASE):
+        raise SQLGuardError("Only SELECT queries are allowed.")
+    keyword = _WRITE_KEYWORDS.search(masked)
+    if keyword:
+        word = next(g for g in keyword.groups() if g)
+        raise SQLGuardError(f"Read-only guard rejected keyword '{word.upper()}'.")
+    return sql
+
+
+def _bare(col: str) -> str:
+    return col.replace("`", "").lower()
+
+
+def _alias_of(col: str) -> str:
+    return col.split(".", 1)[0].replace("`", "").lower() if "." in col else ""
+
+
+def rewrite_sargable(sql: str) -> Tuple[str, List[str]]:
+    """
+    Rewrite function-wrapped date predicates into index-friendly ones.
+    Returns the new SQL and a short description of every rewrite applied.
+    """
+    notes: List[str] = []
+
+    # 1) Same-day-last-year self-join: add t2.d = DATE_SUB(t1.d, INTERVAL k YEAR).
+    #    The DAY/MONTH equalities stay as residual filters, so 29 February still never matches.
+    if _SAME_DAY.search(sql):
+        years: Dict[str, int] = {_alias_of(m.group(1)): int(m.group(2)) for m in _YEAR_EQ.finditer(sql)}
+
+        def add_join_key(m: re.Match) -> str:
+            a, b = m.group(1), m.group(2)
+            offset = None
+            ya, yb = years.get(_alias_of(a)), years.get(_alias_of(b))
+            if ya is not None and yb is not None and ya != yb:
+                offset = ya - yb
+            for minus in _YEAR_MINUS.finditer(sql):
+                if {_bare(minus.group(1)), _bare(minus.group(2))} == {_bare(a), _bare(b)}:
+                    offset = int(minus.group(3)) if _bare(minus.group(1)) == _bare(b) else -int(minus.group(3))
+            if not offset or _bare(a) == _bare(b):
+                return m.group(0)
+            later, earlier, k = (a, b, offset) if offset > 0 else (b, a, -offset)
+            notes.append(f"same-day join on {earlier} = DATE_SUB({later}, INTERVAL {k} YEAR)")
+            return f"{m.group(0)} AND {earlier} = DATE_SUB({later}, INTERVAL {k} YEAR)"
+
+        sql = _SAME_MONTH.sub(add_join_key, sql, count=1)
+
+    # 2) YEAR(d) = Y AND MONTH(d) = M → one-month range.
+    def month_range(m: re.Match) -> str:
+        col, year, month = m.group(1), int(m.group(2)), int(m.group(4))
+        if _bare(col) != _bare(m.group(3)) or not 1 <= month <= 12:
+            return m.group(0)
+        nxt_year, nxt_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        notes.append(f"YEAR/MONTH({col}) → month range")
+        return f"({col} >= '{year:04d}-{month:02d}-01' AND {col} < '{nxt_year:04d}-{nxt_month:02d}-01')"
+
+    sql = re.sub(
+        rf"{_YEAR_EQ.pattern}\s+AND\s+MONTH\s*\(\s*{_DATE_COL}\s*\)\s*=\s*(\d{{1,2}})",
+        month_range,
+        sql,
+        flags=re.IGNORECASE,
+    )
+
+    # 3) YEAR(d) BETWEEN A AND B / YEAR(d) = Y → year ranges.
+    def years_range(m: re.Match) -> str:
+        col, first, last = m.group(1), int(m.group(2)), int(m.group(3))
+        notes.append(f"YEAR({col}) BETWEEN → date range")
+        return f"({col} >= '{first:04d}-01-01' AND {col} < '{last + 1:04d}-01-01')"
+
+    sql = _YEAR_BETWEEN.sub(years_range, sql)
+
+    def year_range(m: re.Match) -> str:
+        col, year = m.group(1), int(m.group(2))
+        notes.append(f"YEAR({col}) = {year} → date range")
+        return f"({col} >= '{year:04d}-01-01' AND {col} < '{year + 1:04d}-01-01')"
+
+    sql = _YEAR_EQ.sub(year_range, sql)
+    return sql, notes
+
+
+class SQLGuard:
+    """
+    Runs generated SQL through the checks above against ``engine``.
+    ``max_cost`` <= 0 disables the EXPLAIN check; ``timeout_ms`` <= 0 disables the timeout.
+    """
+
+    def __init__(self, engine: Engine, max_cost: float, timeout_ms: int, max_rows: int) -> None:
+        self.engine = engine
+        self.max_cost = max_cost
+        self.timeout_ms = timeout_ms
+        self.max_rows = max_rows
+        self._table_rows: Dict[str, int] = {}
+
+    @property
+    def dialect(self) -> str:
+        return self.engine.dialect.name
+
+    def prepare(self, sql: str) -> Tuple[str, List[str]]:
+        """Read-only check + sargable rewrites (input and output are MySQL-flavoured SQL)."""
+        return rewrite_sargable(check_read_only(sql))
+
+    def execute(self, sql: str, rewrites: Optional[List[str]] = None, timeout_ms: Optional[int] = None) -> GuardedResult:
+        """
+        EXPLAIN, then execute ``sql`` (already in the backend's dialect) with timeout and row cap.
+        ``timeout_ms`` overrides the guard's timeout for this query (e.g. the time left
+        before the request deadline).
+        """
+        sql = check_read_only(sql)
+        with self.engine.connect() as conn:
+            cost = self._estimate_cost(conn, sql) if self.max_cost > 0 else None
+            if cost is not None and cost > self.max_cost:
+                raise SQLGuardError(
+                    f"Query rejected: estimated cost {cost:,.0f} exceeds the limit of {self.max_cost:,.0f}."
+                )
+            capped = sql if _TRAILING_LIMIT.search(_mask_literals(sql)) else f"{sql}\nLIMIT {self.max_rows + 1}"
+            columns, rows = self._run_with_timeout(conn, capped, self.timeout_ms if timeout_ms is None else timeout_ms)
+
+        truncated = len(rows) > self.max_rows
+        return GuardedResult(
+            sql=sql,
+            columns=columns,
+            rows=[tuple(r) for r in rows[: self.max_rows]],
+            truncated=truncated,
+            estimated_cost=cost,
+            rewrites=list(rewrites or []),
+        )
+
+    # ---------- Cost estimation ----------
+
+    def _estimate_cost(self, conn: Connection, sql: str) -> Optional[float]:
+        if self.dialect == "mysql":
+            plan = conn.execute(text(f"EXPLAIN FORMAT=JSON {sql}")).scalar()
+            cost = json.loads(plan).get("query_block", {}).get("cost_info", {}).get("query_cost")
+            return float(cost) if cost is not None else None
+        if self.dialect == "sqlite":
+            return self._sqlite_cost(conn, sql)
+        return None
+
+    def _sqlite_cost(self, conn: Connection, sql: str) -> float:
+        """
+        Rough nested-loop estimate from EXPLAIN QUERY PLAN: every SCAN of a
+        table multiplies by its row count, every index SEARCH by a small constant.
+        """
+        cost = 1.0
+        for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")):
+            detail = str(row[-1])
+            # A SCAN reads the whole table even through a covering index.
+            scan = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+            if scan and scan.group(1).upper() != "CONSTANT":
+                cost *= max(self._row_count(conn, scan.group(1)), 1)
+            elif detail.startswith("SEARCH"):
+                cost *= 10
+        return cost
+
+    def _row_count(self, conn: Connection, name: str) -> int:
+        if not self._table_rows:
+            tables = [r[0] for r in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))]
+            for table in tables:
+                self._table_rows[table] = conn.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar() or 0
+        # EXPLAIN QUERY PLAN reports aliases (t1, t2) rather than tables; assume the largest table.
+        return self._table_rows.get(name, max(self._table_rows.values(), default=1))
+
+    # ---------- Timeout ----------
+
+    def _fetch(self, conn: Connection, sql: str) -> Tuple[List[str], Sequence[Any]]:
+        """
+        Read at most ``max_rows + 1`` rows through a server-side (streaming) cursor
+        where the driver supports one, so large results are never buffered whole.
+        """
+        result = conn.execution_options(stream_results=True, max_row_buffer=self.max_rows + 1).execute(text(sql))
+        try:
+            return list(result.keys()), result.fetchmany(self.max_rows + 1)
+        finally:
+            result.close()
+
+    def _run_with_timeout(self, conn: Connection, sql: str, timeout_ms: int) -> Tuple[List[str], Sequence[Any]]:
+        if timeout_ms <= 0:
+            return self._fetch(conn, sql)
+
+        if self.dialect == "mysql":
+            # The connection goes back to the shared pool: restore its limit afterwards,
+            # or every later query on it (version checks, reflection) inherits ours.
+            previous = conn.execute(text("SELECT @@SESSION.max_execution_time")).scalar() or 0
+            conn.execute(text(f"SET SESSION MAX_EXECUTION_TIME = {int(timeout_ms)}"))
+            try:
+                return self._fetch(conn, sql)
+            except OperationalError as exc:
+                # 3024: "Query execution was interrupted, maximum statement execution time exceeded"
+                if "3024" in str(exc.orig) or "maximum statement execution time" in str(exc):
+                    raise SQLTimeoutError(f"Query timed out after {timeout_ms} ms.") from exc
+                raise
+            finally:
+                conn.execute(text(f"SET SESSION MAX_EXECUTION_TIME = {int(previous)}"))
+
+        if self.dialect == "sqlite":
+            raw = conn.connection.driver_connection
+            deadline = time.monotonic() + timeout_ms / 1000
+            raw.set_progress_handler(lambda: int(time.monotonic() > deadline), 10_000)
+            try:
+                return self._fetch(conn, sql)
+            except OperationalError as exc:
+                if "interrupted" in str(exc):
+                    raise SQLTimeoutError(f"Query timed out after {timeout_ms} ms.") from exc
+                raise
+            finally:
+                raw.set_progress_handler(None, 0)
+
+        return self._fetch(conn, sql)
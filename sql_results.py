@@ -0,0 +1,222 @@
+"""
+Typed, columnar SQL results and a compact, token-capped table renderer for prompts.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Dict, List, Sequence, Set, Tuple
+
+from token_utils import count_tokens
+
+
+def _normalize(value: Any) -> Any:
+    """DB driver values → plain Python: Decimal → float, bytes → str, numpy scalars → Python."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if type(value).__module__ == "numpy" and hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def _column_type(values: Sequence[Any]) -> str:
+    present = [v for v in values if v is not None]
+    if not present:
+        return "null"
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return "number"
+    if all(isinstance(v, (dt.date, dt.datetime)) for v in present):
+        return "date"
+    return "text"
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, (dt.date, dt.datetime)):
+        return value.isoformat()
+    return value
+
+
+@dataclass
+class SQLResult:
+    """
+    Query result stored column by column. ``types`` holds one of
+    "number", "date", "text" or "null" per column.
+    """
+
+    columns: List[str]
+    data: Dict[str, List[Any]]
+    types: List[str] = field(default_factory=list)
+    row_count: int = 0
+    # True when the guard's row cap cut the result off.
+    truncated: bool = False
+
+    @classmethod
+    def from_rows(cls, columns: Sequence[str], rows: Sequence[Sequence[Any]], truncated: bool = False) -> "SQLResult":
+        columns = _unique_names(columns)
+        data: Dict[str, List[Any]] = {c: [] for c in columns}
+        for row in rows:
+            for col, value in zip(columns, row):
+                data[col].append(_normalize(value))
+        return cls(
+            columns=columns,
+            data=data,
+            types=[_column_type(data[c]) for c in columns],
+            row_count=len(rows),
+            truncated=truncated,
+        )
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]]) -> "SQLResult":
+        columns = list(records[0]) if records else []
+        return cls.from_rows(columns, [[r.get(c) for c in columns] for r in records])
+
+    def row(self, index: int) -> List[Any]:
+        return [self.data[c][index] for c in self.columns]
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Rows as JSON-friendly dicts (dates as ISO strings)."""
+        return [{c: _json_value(self.data[c][i]) for c in self.columns} for i in range(self.row_count)]
+
+
+def _unique_names(columns: Sequence[str]) -> List[str]:
+    seen: Dict[str, int] = {}
+    out = []
+    for col in columns:
+        name = str(col)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 0
+        out.append(name)
+    return out
+
+
+def format_value(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, float):
+        return str(round(value, 6))
+    if isinstance(value, (dt.date, dt.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+# Numeric columns that describe a row rather than measure it (ids, calendar parts,
+# capacities). Their max/min ties on whole hotels, so they never force rows in.
+_STRUCTURAL = re.compile(r"(?i)^(id|.*_id|year|month|day|rooms_available|capacity)$")
+
+# (column, "max" or "min", value, row indices)
+ExtremeGroup = Tuple[str, str, Any, List[int]]
+
+
+def _extreme_groups(result: SQLResult) -> List[ExtremeGroup]:
+    groups = []
+    for col, kind in zip(result.columns, result.types):
+        if kind != "number" or _STRUCTURAL.match(col):
+            continue
+        values = result.data[col]
+        present = [v for v in values if v is not None]
+        if not present:
+            continue
+        high, low = max(present), min(present)
+        if high == low:
+            continue
+        groups.append((col, "max", high, [i for i, v in enumerate(values) if v == high]))
+        groups.append((col, "min", low, [i for i, v in enumerate(values) if v == low]))
+    # Small groups first: a unique highest row is worth more than one of many ties.
+    return sorted(groups, key=lambda g: len(g[3]))
+
+
+def _select_extremes(
+    result: SQLResult, lines: Sequence[str], max_rows: int, max_tokens: int
+) -> Tuple[Set[int], List[ExtremeGroup]]:
+    """
+    Rows of whole extreme groups that fit into ``max_rows`` / ``max_tokens``, and the
+    groups that did not fit (summarized as ties instead of listed).
+    """
+    chosen: Set[int] = set()
+    skipped: List[ExtremeGroup] = []
+    tokens = 0
+    for group in _extreme_groups(result):
+        new = [i for i in group[3] if i not in chosen]
+        cost = sum(count_tokens(lines[i]) for i in new)
+        if len(chosen) + len(new) > max_rows or tokens + cost > max_tokens:
+            skipped.append(group)
+            continue
+        chosen.update(new)
+        tokens += cost
+    return chosen, skipped
+
+
+def extreme_rows(result: SQLResult, max_rows: int = 50, max_tokens: int = 1500) -> List[int]:
+    """
+    Indices of rows holding the max or min of a measure column (numeric, not
+    constant, not an id/calendar/capacity column), so tied "highest"/"lowest" rows
+    survive rendering. A tie group is kept whole or not at all, within the caps.
+    """
+    lines = [" | ".join(format_value(v) for v in result.row(i)) for i in range(result.row_count)]
+    return sorted(_select_extremes(result, lines, max_rows, max_tokens)[0])
+
+
+def _summary(result: SQLResult, shown: int) -> str:
+    parts = []
+    for col, kind in zip(result.columns, result.types):
+        values = [v for v in result.data[col] if v is not None]
+        if kind == "number" and values:
+            avg = sum(values) / len(values)
+            parts.append(f"{col}: min {format_value(min(values))}, max {format_value(max(values))}, avg {format_value(avg)}")
+        elif kind == "date" and values:
+            parts.append(f"{col}: {format_value(min(values))} to {format_value(max(values))}")
+    line = f"... {result.row_count - shown} more rows not shown"
+    if parts:
+        line += f" (over all {result.row_count} rows: " + "; ".join(parts) + ")"
+    return line
+
+
+def render_table(result: SQLResult, max_rows: int, max_tokens: int) -> str:
+    """
+    Render ``result`` as a pipe-separated table for LLM prompts.
+
+    Tied extreme rows (see ``extreme_rows``) come first, then rows in result order
+    until ``max_rows`` or ``max_tokens`` is reached. Omitted rows are summarized with
+    per-column min/max/avg, and tie groups too large to list as "N rows tied at max X".
+    """
+    if not result.columns:
+        return ""
+    if result.row_count == 0:
+        return " | ".join(result.columns) + "\n(no rows)"
+
+    header = " | ".join(result.columns)
+    lines = [" | ".join(format_value(v) for v in result.row(i)) for i in range(result.row_count)]
+    budget = max_tokens - count_tokens(header)
+    must, skipped = _select_extremes(result, lines, max_rows, budget)
+
+    budget -= sum(count_tokens(lines[i]) for i in must)
+    optional_slots = max(max_rows - len(must), 0)
+    chosen = set(must)
+    for i, line in enumerate(lines):
+        if i in must:
+            continue
+        if optional_slots <= 0:
+            break
+        cost = count_tokens(line)
+        if cost > budget:
+            break
+        chosen.add(i)
+        budget -= cost
+        optional_slots -= 1
+
+    out = [header] + [lines[i] for i in sorted(chosen)]
+    if len(chosen) < result.row_count:
+        out.append(_summary(result, len(chosen)))
+    for col, which, value, rows in skipped:
+        out.append(f"{col}: {len(rows)} rows tied at {which} {format_value(value)}")
+    if result.truncated:
+        out.append(f"(result truncated at {result.row_count} rows by SQL_MAX_ROWS)")
+    return "\n".join(out)
@@ -0,0 +1,308 @@
+"""
+Rewrite generated aggregate SQL onto the per-hotel rollup tables built by load_mysql.py.
+
+The rewriter is deliberately conservative: it only handles single-table SELECTs
+over the daily table whose every column reference can be expressed with the
+rollup columns (hotel_name, year, month and the ROLLUP_MEASURES). Anything else
+(joins, subqueries, day-level columns, OR predicates, ...) is left untouched.
+
+Aggregates are re-aggregated from stored sums and counts, e.g.
+
+    AVG(ADR)          → SUM(sum_adr) / SUM(adr_days)
+    MAX(ADR)          → MAX(max_adr)
+    SUM(ADR * Rooms_Sold) → SUM(revenue)
+
+so a rewrite is exact at the rollup grain and at any coarser grain (a yearly
+average from monthly rows, an all-time maximum from yearly rows, ...).
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import threading
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from load_mysql import rollup_table_name
+
+
+_QUAL = r"(?:[`\"]?\w+[`\"]?\.)?"
+
+
+def _col(pattern: str) -> str:
+    """Regex for an optionally qualified / quoted column reference."""
+    return rf"{_QUAL}[`\"]?(?:{pattern})[`\"]?(?![\w%])"
+
+
+_ADR = _col("adr")
+_OCC = _col(r"occupancy_%|occupancy")
+_SOLD = _col("rooms_sold")
+_DATE = _col("parsed_date_temp")
+
+# (pattern, replacement) pairs applied in order, case-insensitively.
+_SUBSTITUTIONS: List[Tuple[str, str]] = [
+    (rf"SUM\s*\(\s*{_ADR}\s*\*\s*{_SOLD}\s*\)", "SUM(revenue)"),
+    (rf"SUM\s*\(\s*{_SOLD}\s*\*\s*{_ADR}\s*\)", "SUM(revenue)"),
+    (rf"AVG\s*\(\s*{_ADR}\s*\)", "(SUM(sum_adr) / SUM(adr_days))"),
+    (rf"MAX\s*\(\s*{_ADR}\s*\)", "MAX(max_adr)"),
+    (rf"MIN\s*\(\s*{_ADR}\s*\)", "MIN(min_adr)"),
+    (rf"AVG\s*\(\s*{_OCC}\s*\)", "(SUM(sum_occupancy) / SUM(occupancy_days))"),
+    (rf"MAX\s*\(\s*{_OCC}\s*\)", "MAX(max_occupancy)"),
+    (rf"MIN\s*\(\s*{_OCC}\s*\)", "MIN(min_occupancy)"),
+    (rf"SUM\s*\(\s*{_SOLD}\s*\)", "SUM(sum_rooms_sold)"),
+    (r"COUNT\s*\(\s*\*\s*\)", "SUM(day_count)"),
+    (rf"YEAR\s*\(\s*{_DATE}\s*\)", "year"),
+    (rf"MONTH\s*\(\s*{_DATE}\s*\)", "month"),
+    (_col("hotel_name"), "hotel_name"),
+]
+
+# Daily-table columns that must not survive the substitution.
+_DAILY_ONLY = re.compile(
+    r"(?<![\w%])(?:parsed_date_temp|date|adr|adr_competition|occupancy_%|occupancy|"
+    r"occupancy_competition_%|occupancy_competition|rooms_available|rooms_sold|justification)(?![\w%])",
+    re.IGNORECASE,
+)
+_REJECT = re.compile(r"\b(?:JOIN|UNION|OVER|WITH|INTO|SELECT\s+\*)\b|\(\s*SELECT\b|\bOR\b", re.IGNORECASE)
+_AGGREGATE = re.compile(r"\b(AVG|SUM|MIN|MAX|COUNT)\s*\(\s*(DISTINCT\s+)?([^()]*)\)", re.IGNORECASE)
+_ROLLUP_ARGS = {
+    "sum_adr", "adr_days", "max_adr", "min_adr", "sum_occupancy", "occupancy_days",
+    "max_occupancy", "min_occupancy", "sum_rooms_sold", "revenue", "day_count",
+}
+_CLAUSES = ["SELECT", "FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY", "LIMIT"]
+
+
+@dataclass
+class RollupRewrite:
+    sql: str
+    table: str
+    signature: str
+
+
+_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+
+
+def _strip_literals(sql: str) -> str:
+    return _LITERAL.sub("''", sql)
+
+
+def _mask_literals(sql: str) -> str:
+    """Blank out string literal contents, preserving offsets."""
+    return _LITERAL.sub(lambda m: "'" + " " * (len(m.group(0)) - 2) + "'", sql)
+
+
+def _split_clauses(sql: str) -> Optional[Dict[str, str]]:
+    """Split a flat SELECT into its top-level clauses (outside parentheses / quotes)."""
+    masked = list(_mask_literals(sql))
+    # Blank out parenthesised text so keywords inside function calls are ignored.
+    depth = 0
+    for i, ch in enumerate(masked):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            continue
+        if depth > 0:
+            masked[i] = " "
+    flat = "".join(masked)
+
+    positions: List[Tuple[int, int, str]] = []
+    for clause in _CLAUSES:
+        pattern = r"\b" + clause.replace(" ", r"\s+") + r"\b"
+        matches = list(re.finditer(pattern, flat, re.IGNORECASE))
+        if len(matches) > 1:
+            return None
+        if matches:
+            positions.append((matches[0].start(), matches[0].end(), clause))
+    positions.sort()
+    if not positions or positions[0][2] != "SELECT" or positions[0][0] != 0:
+        return None
+
+    clauses: Dict[str, str] = {}
+    for idx, (_, end, clause) in enumerate(positions):
+        stop = positions[idx + 1][0] if idx + 1 < len(positions) else len(sql)
+        clauses[clause] = sql[end:stop].strip()
+    return clauses
+
+
+def _split_select_list(select: str) -> List[str]:
+    items, depth, start, quote = [], 0, 0, None
+    for i, ch in enumerate(select):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'`\"":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            items.append(select[start:i].strip())
+            start = i + 1
+    items.append(select[start:].strip())
+    return items
+
+
+_ALIAS = re.compile(r"(?:\s+AS\s+|(?<=\))\s+)[`\"]?(\w+)[`\"]?$", re.IGNORECASE)
+_ADDED_ALIAS = re.compile(r"\s+AS\s+`[^`]*`", re.IGNORECASE)
+_PLAIN_COLUMN = re.compile(_QUAL + r"[`\"]?\w+[`\"]?")
+
+
+def _alias(item: str) -> Optional[str]:
+    match = _ALIAS.search(item)
+    return match.group(1) if match else None
+
+
+def _daily_refs(clause: str, aliases: set) -> bool:
+    """True if ``clause`` still references a daily-only column (select aliases excepted)."""
+    clause = _ADDED_ALIAS.sub(" ", _strip_literals(clause)).replace("`", " ")
+    return any(m.group(0).lower() not in aliases for m in _DAILY_ONLY.finditer(clause))
+
+
+def _substitute(expr: str) -> str:
+    for pattern, replacement in _SUBSTITUTIONS:
+        expr = re.sub(pattern, replacement, expr, flags=re.IGNORECASE)
+    return expr
+
+
+class RollupRewriter:
+    """
+    Rewrites eligible queries on ``table`` to ``<table>_yearly`` / ``<table>_monthly``
+    and tracks, per query shape and data version, whether the rewrite has been
+    verified against the original query.
+    """
+
+    def __init__(self, table: str, verify_runs: int = 3) -> None:
+        self.table = table
+        self.verify_runs = verify_runs
+        self._verified: Dict[Tuple[str, int], int] = {}
+        self._rejected: set = set()
+        self._lock = threading.Lock()
+
+    def rewrite(self, sql: str) -> Optional[RollupRewrite]:
+        """Return the rollup form of ``sql``, or None if it cannot be answered from a rollup."""
+        sql = sql.strip().rstrip(";").strip()
+        if _REJECT.search(_strip_literals(sql)):
+            return None
+
+        clauses = _split_clauses(sql)
+        if clauses is None or "FROM" not in clauses:
+            return None
+
+        from_match = re.fullmatch(
+            rf"[`\"]?{re.escape(self.table)}[`\"]?(?:\s+(?:AS\s+)?(?P<alias>\w+))?",
+            clauses["FROM"],
+            re.IGNORECASE,
+        )
+        if not from_match:
+            return None
+
+        select = clauses["SELECT"]
+        distinct = bool(re.match(r"DISTINCT\b", select, re.IGNORECASE))
+        if distinct:
+            select = select[len("DISTINCT"):].strip()
+
+        items, aliases = [], set()
+        for item in _split_select_list(select):
+            new_item = _substitute(item)
+            alias = _alias(item)
+            if alias:
+                aliases.add(alias.lower())
+            elif new_item != item and not _PLAIN_COLUMN.fullmatch(item):
+                # Keep the original output column name for API clients / prompts.
+                new_item = f"{new_item} AS `{item.replace('`', '')}`"
+            items.append(new_item)
+
+        rewritten: Dict[str, str] = {"SELECT": ("DISTINCT " if distinct else "") + ", ".join(items)}
+        for clause in ("WHERE", "GROUP BY", "HAVING", "ORDER BY"):
+            if clause in clauses:
+                rewritten[clause] = _substitute(clauses[clause])
+
+        body = _ADDED_ALIAS.sub(" ", " ".join(rewritten.values()))
+        aggregates = list(_AGGREGATE.finditer(body))
+        for clause, expr in rewritten.items():
+            # MySQL resolves select aliases in GROUP BY / HAVING / ORDER BY only.
+            visible = aliases if clause in ("GROUP BY", "HAVING", "ORDER BY") else set()
+            if clause == "SELECT":
+                expr = ", ".join(_ALIAS.sub("", item) for item in items)
+            if _daily_refs(expr, visible):
+                return None
+        for agg in aggregates:
+            arg = agg.group(3).strip()
+            if not agg.group(2) and arg not in _ROLLUP_ARGS:
+                return None
+        # Without aggregation every daily row would map to one output row.
+        if not aggregates and not distinct and "GROUP BY" not in clauses:
+            return None
+
+        grain = "monthly" if re.search(r"\bmonth\b", _strip_literals(body), re.IGNORECASE) else "yearly"
+        rollup = rollup_table_name(self.table, grain)
+        alias = from_match.group("alias")
+        parts = [f"SELECT {rewritten['SELECT']}", f"FROM {rollup}" + (f" {alias}" if alias else "")]
+        for clause in ("WHERE", "GROUP BY", "HAVING", "ORDER BY"):
+            if clause in rewritten:
+                parts.append(f"{clause} {rewritten[clause]}")
+        if "LIMIT" in clauses:
+            parts.append(f"LIMIT {clauses['LIMIT']}")
+        new_sql = " ".join(parts)
+
+        signature = re.sub(r"\b\d+(?:\.\d+)?\b", "?", _strip_literals(new_sql))
+        return RollupRewrite(sql=new_sql, table=rollup, signature=signature)
+
+    # ---------- Verification bookkeeping ----------
+
+    def needs_verification(self, rewrite: RollupRewrite, version: int) -> bool:
+        with self._lock:
+            return self._verified.get((rewrite.signature, version), 0) < self.verify_runs
+
+    def is_rejected(self, rewrite: RollupRewrite, version: int) -> bool:
+        with self._lock:
+            return (rewrite.signature, version) in self._rejected
+
+    def record_verification(self, rewrite: RollupRewrite, version: int, matched: bool) -> None:
+        key = (rewrite.signature, version)
+        with self._lock:
+            if matched:
+                self._verified[key] = self._verified.get(key, 0) + 1
+            else:
+                self._rejected.add(key)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def results_match(original: Sequence[Sequence[Any]], rewritten: Sequence[Sequence[Any]], ordered: bool) -> bool:
+    """Compare two result sets, allowing float rounding differences from re-aggregation."""
+    if len(original) != len(rewritten):
+        return False
+    left = [tuple(_normalize(v) for v in row) for row in original]
+    right = [tuple(_normalize(v) for v in row) for row in rewritten]
+    if not ordered:
+        left, right = sorted(left, key=_sort_key), sorted(right, key=_sort_key)
+    return all(_rows_equal(a, b) for a, b in zip(left, right))
+
+
+def _sort_key(row: Tuple[Any, ...]) -> Tuple[Tuple[int, Any], ...]:
+    # Round floats so last-digit differences from re-aggregation sort identically.
+    return tuple(
+        (0, round(float(v), 6)) if isinstance(v, (int, float)) else (1, str(v))
+        for v in row
+    )
+
+
+def _rows_equal(a: Tuple[Any, ...], b: Tuple[Any, ...]) -> bool:
+    if len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        if isinstance(x, (int, float)) and isinstance(y, (int, float)) and not isinstance(x, bool):
+            if not math.isclose(float(x), float(y), rel_tol=1e-9, abs_tol=1e-9):
+                return False
+        elif x != y:
+            return False
+    return True
+
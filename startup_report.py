@@ -0,0 +1,95 @@
+"""
+Import-time and startup profile for the API servers.
+
+Usage:
+    uv run startup_report.py                          # profile `import api_server`
+    uv run startup_report.py --module telegram_bot    # needs TELEGRAM_BOT_TOKEN
+    uv run startup_report.py --budget-ms 1500         # exit 1 if the import is slower
+    uv run startup_report.py --warm-up                # also time HybridQAPipeline.warm_up()
+
+The import is measured in a fresh interpreter with `python -X importtime`, so
+nothing already imported by this script skews the numbers.
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+
+def profile_import(module: str) -> Tuple[float, List[Tuple[str, int, int, int]]]:
+    """
+    Import ``module`` in a subprocess. Returns the wall-clock import time in ms and
+    (name, depth, self_us, cumulative_us) for every module it imported.
+    """
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000)"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=False
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, (len(indent) - 1) // 2, int(self_us), int(cumulative_us)))
+    return float(proc.stdout.strip().splitlines()[-1]), entries
+
+
+def print_import_report(module: str, wall_ms: float, entries: List[Tuple[str, int, int, int]], top: int) -> None:
+    print(f"import {module}: {wall_ms:.0f} ms wall, {len(entries)} modules")
+
+    print("\nHeaviest direct dependencies (cumulative):")
+    direct = sorted((e for e in entries if e[1] == 1), key=lambda e: -e[3])[:top]
+    for name, _, _, cumulative in direct:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    print("\nHeaviest modules (self time):")
+    for name, _, self_us, _ in sorted(entries, key=lambda e: -e[2])[:top]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+
+def print_warm_up_report() -> None:
+    start = time.perf_counter()
+    from hybrid_qa import HybridQAPipeline
+
+    pipeline = HybridQAPipeline()
+    built = time.perf_counter() - start
+    print(f"\nHybridQAPipeline(): {built * 1000:.0f} ms")
+
+    print("warm_up():")
+    for step, seconds in pipeline.warm_up().items():
+        print(f"  {seconds * 1000:8.0f} ms  {step}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="api_server", help="Module to import (default: api_server).")
+    parser.add_argument("--top", type=int, default=15, help="Rows per section.")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if the import takes longer.")
+    parser.add_argument("--warm-up", action="store_true", help="Also time building the QA subsystems.")
+    args = parser.parse_args()
+
+    wall_ms, entries = profile_import(args.module)
+    print_import_report(args.module, wall_ms, entries, args.top)
+
+    if args.warm_up:
+        print_warm_up_report()
+
+    if args.budget_ms is not None:
+        verdict = "OK" if wall_ms <= args.budget_ms else "OVER BUDGET"
+        print(f"\nImport budget: {wall_ms:.0f} / {args.budget_ms:.0f} ms -> {verdict}")
+        if wall_ms > args.budget_ms:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
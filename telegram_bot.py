@@ -1,5 +1,5 @@
+import asyncio
 import os
-from collections import defaultdict, deque
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from telegram import Update
@@ -9,7 +9,11 @@ from pydantic import BaseModel
 import logging
 
 
+from config import settings
 from hybrid_qa import HybridQAPipeline
+from memory_store import memory_store
+from shared_state import acquire_leadership, chat_lock, get_shared_store, multi_worker
+from update_dispatcher import UpdateDispatcher
 
 # ------------------------
 # Load env variables
@@ -21,14 +25,11 @@ if not BOT_TOKEN:
     raise ValueError("Missing TELEGRAM_BOT_TOKEN in environment")
 
 # ------------------------
-# Telegram Bot + QA Pipeline + In-memory chat history
+# Telegram Bot + QA Pipeline + bounded chat memory (memory_store.py)
 # ------------------------
 app_bot = Application.builder().token(BOT_TOKEN).build()
 qa_pipeline = HybridQAPipeline()
 
-# Per-chat memory: last 10 messages (user + bot) per Telegram chat id
-chat_histories = defaultdict(lambda: deque(maxlen=20))  # 10 user + 10 bot messages
-
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Process incoming Telegram messages."""
@@ -38,33 +39,47 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     user_message = update.message.text
 
-    # Build conversation context for this chat
-    history = chat_histories[chat_id]
-    history_text = "\n".join(history) if history else "No previous messages."
-
-    full_question = (
-        "You are chatting with a user over Telegram.\n"
-        "Use the conversation history to resolve pronouns and references, "
-        "but answer only the user's latest message.\n\n"
-        f"Conversation history:\n{history_text}\n\n"
-        f"Latest user message:\n{user_message}\n\n"
-        "Answer the latest user message clearly."
-    )
+    # With several worker processes, a chat's turns are serialized across all of them.
+    lock = chat_lock(chat_id) if multi_worker() else None
+    if lock is not None:
+        await asyncio.to_thread(lock.acquire)
+    try:
+        # Route and answer on the current message; the history is only used to resolve references.
+        # The QA chain is blocking, so it runs in a worker thread to keep the event loop free.
+        result = await asyncio.to_thread(qa_pipeline.ask, user_message, memory_store.history_text(chat_id))
 
-    result = qa_pipeline.ask(full_question)
+        # Update memory for this chat (older turns are compacted into a summary)
+        memory_store.add(chat_id, "User", user_message)
+        memory_store.add(chat_id, "Assistant", result.answer)
+    finally:
+        if lock is not None:
+            lock.release()
 
     reply = f"{result.answer}"
-    
-
-    # Update memory for this chat (keep last ~10 turns)
-    history.append(f"User: {user_message}")
-    history.append(f"Assistant: {result.answer}")
 
     await update.message.reply_text(reply, parse_mode="Markdown")
 
 
 app_bot.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
+BUSY_REPLY = "I'm still working on your previous questions. Please send this one again in a moment."
+
+
+async def reply_busy(update: Update):
+    """Tell the user their chat's queue is full instead of silently dropping the message."""
+    if update.effective_chat:
+        await app_bot.bot.send_message(update.effective_chat.id, BUSY_REPLY)
+
+
+# Updates are processed in per-chat order, with a global concurrency limit.
+dispatcher = UpdateDispatcher(
+    handler=app_bot.process_update,
+    on_busy=reply_busy,
+    max_concurrency=settings.telegram_max_concurrency,
+    chat_queue_size=settings.telegram_chat_queue_size,
+    max_pending=settings.telegram_max_pending,
+)
+
 # ------------------------
 # FASTAPI APP (ONE APP)
 # ------------------------
@@ -81,8 +96,13 @@ def home():
 async def telegram_webhook(request: Request):
     data = await request.json()
     update = Update.de_json(data, app_bot.bot)
-    await app_bot.process_update(update)
-    return JSONResponse({"status": "ok"})
+    store = get_shared_store()
+    if store is not None and not store.add("telegram_updates", str(update.update_id)):
+        # Already taken by another worker process.
+        return JSONResponse({"status": "duplicate"})
+    # Acknowledge right away so Telegram does not retry while the answer is computed.
+    status = dispatcher.submit(update)
+    return JSONResponse({"status": status})
 
 
 # 👉 NORMAL API ENDPOINT FOR RAG/SQL
@@ -104,10 +124,22 @@ def ask(question: Question):
 async def startup_event():
     try:
         await app_bot.initialize()
-        await app_bot.bot.delete_webhook(drop_pending_updates=True)
-        await app_bot.bot.set_webhook(WEBHOOK_URL)
-        print("🚀 Webhook set to:", WEBHOOK_URL)
+        # With several workers only one registers the webhook; the others would drop
+        # the updates queued for it while they start.
+        if acquire_leadership("telegram_webhook"):
+            await app_bot.bot.delete_webhook(drop_pending_updates=True)
+            await app_bot.bot.set_webhook(WEBHOOK_URL)
+            print("🚀 Webhook set to:", WEBHOOK_URL)
     except TimedOut:
         print("⚠️ Telegram webhook setup timed out (retry later).")
     except Exception as e:
-        print(f"⚠️ Webhook setup error: {e}")
\ No newline at end of file
+        print(f"⚠️ Webhook setup error: {e}")
+
+    # Build the QA subsystems in the background; the webhook is already accepting updates.
+    if settings.warm_up:
+        asyncio.get_running_loop().run_in_executor(None, qa_pipeline.warm_up)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await dispatcher.close()
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+from config import settings
+from rag_core import RAGPipeline, choose_k
+
+
+def test_keeps_candidates_above_threshold():
+    assert choose_k([0.8, 0.78, 0.75, 0.2, 0.1], 1, 8, 0.3, 0.5) == 3
+
+
+def test_cuts_at_largest_drop():
+    assert choose_k([0.82, 0.8, 0.55, 0.52, 0.5], 1, 8, 0.3, 0.1) == 2
+
+
+def test_small_drops_keep_everything_relevant():
+    assert choose_k([0.6, 0.58, 0.55, 0.53, 0.5], 1, 8, 0.3, 0.1) == 5
+
+
+def test_bounds():
+    # Nothing relevant: still min_k.
+    assert choose_k([0.1, 0.05, 0.02], 2, 8, 0.3, 0.1) == 2
+    # A drop before min_k is not a cut point.
+    assert choose_k([0.9, 0.4, 0.39, 0.38], 3, 8, 0.3, 0.1) == 4
+    # Never more than max_k or than there are candidates.
+    assert choose_k([0.9] * 10, 2, 8, 0.3, 0.1) == 8
+    assert choose_k([0.9], 2, 8, 0.3, 0.1) == 1
+    assert choose_k([], 2, 8, 0.3, 0.1) == 0
+
+
+class FakeStore:
+    def __init__(self, scores):
+        self.scores = scores
+        self.calls = []
+
+    def similarity_search_with_relevance_scores(self, question, k):
+        self.calls.append(("scored", k))
+        return [(SimpleNamespace(page_content=f"doc{i}"), s) for i, s in enumerate(self.scores[:k])]
+
+    def similarity_search(self, question, k):
+        self.calls.append(("plain", k))
+        return [SimpleNamespace(page_content=f"doc{i}") for i in range(k)]
+
+
+def _pipeline(store):
+    rag = RAGPipeline.__new__(RAGPipeline)
+    rag.vectorstore = store
+    rag._load_vectorstore = lambda: None
+    return rag
+
+
+def test_retrieve_adaptive(monkeypatch):
+    monkeypatch.setattr(settings, "retrieval_mode", "adaptive")
+    monkeypatch.setattr(settings, "retrieval_max_k", 6)
+    monkeypatch.setattr(settings, "retrieval_min_k", 1)
+    store = FakeStore([0.85, 0.83, 0.4, 0.38, 0.35, 0.1])
+    docs = _pipeline(store).retrieve("Where is St Regis Dubai?")
+    assert [d.page_content for d in docs] == ["doc0", "doc1"]
+    assert store.calls == [("scored", 6)]
+
+
+def test_retrieve_fixed_and_explicit_k(monkeypatch):
+    monkeypatch.setattr(settings, "retrieval_mode", "fixed")
+    monkeypatch.setattr(settings, "k", 4)
+    store = FakeStore([])
+    assert len(_pipeline(store).retrieve("q")) == 4
+    monkeypatch.setattr(settings, "retrieval_mode", "adaptive")
+    assert len(_pipeline(store).retrieve("q", k=3)) == 3
+    assert store.calls == [("plain", 4), ("plain", 3)]
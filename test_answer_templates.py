@@ -0,0 +1,39 @@
+from answer_templates import column_label, render_answer
+from sql_results import SQLResult
+
+
+def test_scalar_and_single_row_put_the_exact_value_first():
+    assert render_answer(SQLResult.from_rows(["AVG(ADR)"], [[1160.333]])) == "1160.333 AED (average ADR)."
+    row = SQLResult.from_rows(["hotel_name", "parsed_date_temp", "`Occupancy_%`"], [["St Regis Dubai", "2025-03-07", 95.4]])
+    assert render_answer(row) == "95.4% occupancy (St Regis Dubai, 7 March 2025)."
+    assert render_answer(SQLResult.from_rows(["year", "month", "avg_occupancy"], [[2025, 3, 80.1]])) == (
+        "80.1% average occupancy (year 2025, month 3)."
+    )
+
+
+def test_ties_list_every_row():
+    result = SQLResult.from_rows(["parsed_date_temp", "max_adr"], [["2025-03-07", 1500.0], ["2025-03-08", 1500.0]])
+    assert render_answer(result) == "1500.0 AED highest ADR, tied across 2 results:\n- 7 March 2025\n- 8 March 2025"
+
+
+def test_small_table_and_signed_occupancy_change():
+    result = SQLResult.from_rows(["hotel_name", "occupancy_change"], [["A", 2.5], ["B", -1.0]])
+    assert render_answer(result) == (
+        "- +2.5 percentage points occupancy change — A\n- -1.0 percentage points occupancy change — B"
+    )
+
+
+def test_complex_results_are_left_to_the_llm():
+    wide = SQLResult.from_rows(list("abcdef"), [[1, 2, 3, 4, 5, 6]])
+    long = SQLResult.from_rows(["d", "adr"], [[f"2025-01-{i:02d}", float(i)] for i in range(1, 13)])
+    capped = SQLResult.from_rows(["adr"], [[1.0], [2.0]], truncated=True)
+    assert render_answer(wide) is None
+    assert render_answer(long, max_rows=10) is None
+    assert render_answer(capped) is None
+    assert render_answer(SQLResult.from_rows(["adr"], [])) == "No data matched the query."
+
+
+def test_column_labels():
+    assert column_label("COUNT(*)") == "count"
+    assert column_label("AVG(t1.ADR)") == "average ADR"
+    assert column_label("max_revenue") == "highest revenue"
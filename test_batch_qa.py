@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+
+import pytest
+
+import api_server
+import hybrid_cli
+from batch_qa import BatchProgress, BatchQuestion, answered_ids, read_questions, run_batch
+from hybrid_qa import HybridAnswer, HybridQAPipeline
+
+
+class FakeQA:
+    """Answers after a delay given in the question ("slow ..." takes longer)."""
+
+    _cache_key = staticmethod(HybridQAPipeline._cache_key)
+
+    def __init__(self):
+        self.asked = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def ask(self, question, history=None):
+        with self._lock:
+            self.asked.append(question)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(0.2 if question.startswith("slow") else 0.02)
+            if "boom" in question:
+                raise RuntimeError("boom")
+            return HybridAnswer(route="sql", answer=f"answer to {question}")
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _questions(*texts):
+    return [BatchQuestion(str(i), text) for i, text in enumerate(texts, start=1)]
+
+
+def test_results_stream_in_completion_order_with_bounded_concurrency():
+    qa = FakeQA()
+    questions = _questions("slow one", "fast two", "fast three", "fast four", "fast five")
+    records = list(run_batch(qa, questions, concurrency=2))
+
+    assert sorted(r["id"] for r in records) == ["1", "2", "3", "4", "5"]
+    assert records[-1]["id"] == "1"
+    assert qa.max_active == 2
+    assert records[0]["answer"] == f"answer to {questions[int(records[0]['id']) - 1].question}"
+
+
+def test_repeated_questions_are_answered_once():
+    qa = FakeQA()
+    records = list(run_batch(qa, _questions("ADR in 2024?", "adr in 2024", "Occupancy in 2024?"), concurrency=4))
+
+    assert len(qa.asked) == 2
+    assert {r["id"]: r["answer"] for r in records}["2"] == "answer to ADR in 2024?"
+
+
+def test_failed_question_yields_error_record():
+    progress = BatchProgress(2)
+    records = {r["id"]: r for r in run_batch(FakeQA(), _questions("boom", "fine"), progress=progress)}
+
+    assert records["1"]["route"] == "error" and records["1"]["error"] == "boom"
+    assert records["2"]["error"] is None
+    assert progress.snapshot()["done"] == 2 and progress.snapshot()["failed"] == 1
+    assert str(progress).startswith("[2/2] 1 failed")
+
+
+def test_read_questions_and_resume(tmp_path):
+    questions = tmp_path / "questions.jsonl"
+    questions.write_text('"plain question"\n\n{"id": "q7", "question": "with id"}\n')
+    assert [(q.id, q.question) for q in read_questions(str(questions))] == [
+        ("1", "plain question"),
+        ("q7", "with id"),
+    ]
+
+    output = tmp_path / "answers.jsonl"
+    output.write_text('{"id": "1", "answer": "a"}\n{"id": "q7", "error": "timeout"}\n{"id": "q8", "ans')
+    assert answered_ids(str(output)) == {"1"}
+    # Failed and truncated lines are dropped so the resumed run can append their retries.
+    assert output.read_text() == '{"id": "1", "answer": "a"}\n'
+
+
+def test_cli_batch_resumes(tmp_path, capsys):
+    questions = tmp_path / "questions.jsonl"
+    questions.write_text("\n".join(json.dumps({"id": i, "question": f"fast {i}"}) for i in range(4)))
+    output = tmp_path / "answers.jsonl"
+    output.write_text(json.dumps({"id": "0", "answer": "earlier"}) + "\n")
+    qa = FakeQA()
+
+    hybrid_cli.run_batch_file(qa, str(questions), str(output), concurrency=2)
+
+    assert sorted(qa.asked) == ["fast 1", "fast 2", "fast 3"]
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(r["id"] for r in lines) == ["0", "1", "2", "3"]
+    assert "[3/3] 0 failed" in capsys.readouterr().err
+
+
+def test_ask_batch_endpoint_streams_ndjson(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(api_server, "get_pipeline", lambda: FakeQA())
+    client = TestClient(api_server.app)
+
+    response = client.post("/ask_batch", json={"questions": ["fast a", {"id": "x", "question": "fast b"}]})
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert sorted(line["id"] for line in lines[:-1]) == ["1", "x"]
+    assert lines[-1]["summary"]["done"] == 2
+
+
+@pytest.mark.parametrize("body, status", [({"questions": [{"id": 1}]}, 422), ({"questions": ["q"] * 3}, 413)])
+def test_ask_batch_rejects_bad_batches(monkeypatch, body, status):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(api_server.settings, "batch_max_questions", 2)
+    assert TestClient(api_server.app).post("/ask_batch", json=body).status_code == status
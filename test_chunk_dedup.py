@@ -0,0 +1,54 @@
+import random
+from types import SimpleNamespace
+
+from chunk_dedup import dedup_documents
+
+
+def _chunk(text, **metadata):
+    return SimpleNamespace(page_content=text, metadata=metadata)
+
+
+def _words(n, seed):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(["beach", "spa", "suite", "pool", "view", "dining", "metro", "mall"]) + str(rng.randrange(500)) for _ in range(n))
+
+
+def test_exact_and_near_duplicates_collapse_into_one_canonical_chunk():
+    body = _words(200, seed=1)
+    docs = [
+        _chunk(body, source="st_regis.pdf", page=0),
+        _chunk("  " + body.upper() + "\n", source="st_regis.pdf", page=3),
+        _chunk(f"St Regis profile, page 5. {body} Confidential.", source="st_regis.pdf", page=5),
+        _chunk(_words(200, seed=2), source="premier_inn.pdf", page=0),
+    ]
+
+    kept, report = dedup_documents(docs, threshold=0.85)
+
+    assert [d.metadata["source"] for d in kept] == ["st_regis.pdf", "premier_inn.pdf"]
+    assert (report.exact_removed, report.near_removed, report.kept) == (1, 1, 2)
+    assert kept[0].metadata["sources"] == "st_regis.pdf p.0; st_regis.pdf p.3; st_regis.pdf p.5"
+    assert kept[0].metadata["duplicates"] == 2
+    assert "sources" not in kept[1].metadata
+
+
+def test_threshold_one_only_removes_exact_copies():
+    body = _words(200, seed=3)
+    docs = [_chunk(body, source="a"), _chunk(body + " footer", source="b"), _chunk(body, source="c")]
+    kept, report = dedup_documents(docs, threshold=1.0)
+    assert len(kept) == 2 and report.exact_removed == 1 and report.near_removed == 0
+
+
+def test_monthly_csv_summaries_are_never_merged():
+    from langchain_core.documents import Document
+
+    from csv_summaries import summarize_hotels_csv
+    from rag_core import RAGPipeline
+
+    summaries = summarize_hotels_csv("dubai_hotels_synthetic_daily_2y_enriched.csv")
+    chunks = RAGPipeline.split_documents([Document(page_content=d["text"], metadata=d["metadata"]) for d in summaries])
+
+    kept, report = dedup_documents(chunks, threshold=0.85)
+
+    # Same template, different ADR/occupancy/revenue: e.g. St Regis July 2024 vs July 2025.
+    assert report.near_removed == 0 and len(kept) == len(chunks)
+    assert ("St Regis Dubai", "2025-07") in {(d.metadata["hotel_name"], d.metadata["month"]) for d in kept}
@@ -0,0 +1,46 @@
+import pandas as pd
+
+from csv_summaries import is_daily_hotels_csv, summarize_frame, summarize_hotels_csv
+
+CSV = "dubai_hotels_synthetic_daily_2y_enriched.csv"
+
+
+def test_one_document_per_hotel_month_instead_of_per_row():
+    rows = len(pd.read_csv(CSV))
+    docs = summarize_hotels_csv(CSV)
+
+    assert len(docs) * 20 < rows
+    assert len({(d["metadata"]["hotel_name"], d["metadata"]["month"]) for d in docs}) == len(docs)
+    assert sum(d["metadata"]["days"] for d in docs) == rows
+
+
+def test_summary_stats_and_distinct_justifications():
+    df = pd.DataFrame(
+        {
+            "hotel_name": ["St Regis Dubai"] * 3,
+            "date": ["01/03/2025", "02/03/2025", "03/03/2025"],
+            "ADR": [1000.0, 1200.0, 1100.0],
+            "ADR_Competition": [900.0, 900.0, 900.0],
+            "Occupancy_%": [80.0, 90.0, 85.0],
+            "Occupancy_Competition_%": [70.0, 70.0, 70.0],
+            "Rooms_Available": [100, 100, 100],
+            "Rooms_Sold": [80, 90, 85],
+            "Justification": ["High season. Strong brand.", "High season. Strong brand.", "High season. Event week."],
+        }
+    )
+    assert is_daily_hotels_csv(df.columns)
+    (doc,) = summarize_frame(df, "hotels.csv")
+    text = doc["text"]
+
+    assert text.startswith("St Regis Dubai — March 2025")
+    assert "ADR: average 1100.0 AED (lowest 1000.0 AED, highest 1200.0 AED)" in text
+    assert "Occupancy: average 85.0%" in text
+    assert "Rooms sold: 255 of 300 available. Room revenue: 281,500.0 AED." in text
+    assert "- High season (3 days)." in text and "- Event week (1 day)." in text
+    assert doc["metadata"] == {
+        "hotel_name": "St Regis Dubai",
+        "month": "2025-03",
+        "days": 3,
+        "source": "hotels.csv",
+        "doc_type": "csv_month_summary",
+    }
@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+from db_engines import dispose_engines, get_engine, pool_stats
+from sql_guard import SQLGuard
+
+
+def test_engine_is_shared_and_connections_are_reused(tmp_path):
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    engine = get_engine(url)
+    assert get_engine(url) is engine
+
+    def query(_):
+        with get_engine(url).connect() as conn:
+            return conn.execute(text("SELECT 1")).scalar()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        assert list(pool.map(query, range(40))) == [1] * 40
+
+    stats = pool_stats()[url]
+    assert stats["checkouts"] == 40
+    assert stats["in_use"] == 0
+    assert stats["connections_opened"] <= 4
+    dispose_engines()
+
+
+def test_guard_streams_rows_within_cap(tmp_path):
+    engine = get_engine(f"sqlite:///{tmp_path / 'stream.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        conn.execute(text("INSERT INTO t (x) VALUES (:x)"), [{"x": i} for i in range(500)])
+
+    result = SQLGuard(engine, max_cost=0, timeout_ms=1000, max_rows=100).execute("SELECT x FROM t ORDER BY x")
+
+    assert result.truncated and result.rows[-1] == (99,)
+    dispose_engines()
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from hnsw_benchmark import benchmark, exact_neighbors, recall_at_k
+from rag_core import hnsw_metadata
+
+
+def test_exact_neighbors():
+    vectors = np.array([[0.0, 0.0], [1.0, 0.0], [5.0, 5.0], [0.0, 2.0]], dtype=np.float32)
+    queries = np.array([[0.9, 0.1], [4.0, 4.0]], dtype=np.float32)
+    assert exact_neighbors(vectors, queries, 2).tolist() == [[1, 0], [2, 3]]
+    # Cosine ignores length: [5, 5] points the same way as [4, 4].
+    assert exact_neighbors(vectors, queries[1:], 1, "cosine").tolist() == [[2]]
+
+
+def test_recall_at_k():
+    assert recall_at_k([[1, 2], [3, 4]], [[1, 2], [3, 5]]) == 0.75
+
+
+def test_hnsw_metadata_defaults_and_overrides():
+    meta = hnsw_metadata(m=8)
+    assert meta["hnsw:M"] == 8
+    assert set(meta) == {"hnsw:M", "hnsw:construction_ef", "hnsw:search_ef"}
+
+
+def test_benchmark_sweeps_search_ef():
+    # A sparse graph (M=4, construction_ef=8) over 2000 vectors is far from exact, so
+    # only a search_ef that really reaches the index can raise recall.
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((2000, 32)).astype(np.float32)
+    sample = list(range(0, 2000, 40))
+    rows = benchmark(vectors, vectors[sample], 5, 4, 8, [5, 200], exclude=sample)
+    assert [r["search_ef"] for r in rows] == [5, 200]
+    assert rows[0]["recall"] < 0.6
+    assert rows[1]["recall"] > rows[0]["recall"] + 0.3
+    assert all(r["build_ms"] > 0 and r["mean_ms"] > 0 for r in rows)
+
+
+class _Embeddings:
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+
+    def embed_documents(self, texts):
+        if self.fail_after is not None and len(texts) > self.fail_after:
+            raise ConnectionError("rate limited")
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+def test_failed_ingest_keeps_the_live_collection(tmp_path, monkeypatch):
+    import chromadb
+    from langchain_core.documents import Document
+
+    from config import settings
+    from rag_core import RAGPipeline
+
+    monkeypatch.setattr(settings, "chroma_dir", str(tmp_path))
+    rag = RAGPipeline.__new__(RAGPipeline)
+    docs = [Document(page_content=f"chunk {i}" * (i + 1)) for i in range(5)]
+
+    rag.embeddings = _Embeddings()
+    store = rag._rebuild_collection(docs)
+    assert store._collection.count() == 5
+    assert store._collection.metadata["hnsw:M"] == settings.hnsw_m
+
+    rag.embeddings = _Embeddings(fail_after=2)
+    with pytest.raises(ConnectionError):
+        rag._rebuild_collection(docs + docs)
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    assert {getattr(c, "name", c) for c in client.list_collections()} == {"langchain"}
+    assert client.get_collection("langchain").count() == 5
+
+    # Every chunk embedded, but renaming staging to the live name fails.
+    from chromadb.api.models.Collection import Collection
+
+    modify = Collection.modify
+
+    def failing_modify(self, *args, **kwargs):
+        if self.name == "langchain__staging" and kwargs.get("name") == "langchain":
+            raise RuntimeError("rename failed")
+        return modify(self, *args, **kwargs)
+
+    monkeypatch.setattr(Collection, "modify", failing_modify)
+    rag.embeddings = _Embeddings()
+    with pytest.raises(RuntimeError):
+        rag._rebuild_collection(docs + docs)
+    assert {getattr(c, "name", c) for c in client.list_collections()} == {"langchain"}
+    assert client.get_collection("langchain").count() == 5
+
+    monkeypatch.setattr(Collection, "modify", modify)
+    assert rag._rebuild_collection(docs + docs)._collection.count() == 10
+    assert {getattr(c, "name", c) for c in client.list_collections()} == {"langchain"}
@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from hybrid_qa import HybridAnswer, HybridQAPipeline, needs_history
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("What was the ADR for St Regis Dubai on 1 January 2025?", False),
+        ("Which hotel had the highest occupancy in 2025?", False),
+        ("What about 2024?", True),
+        ("And for Premier Inn?", True),
+        ("What was their occupancy on that day?", True),
+        ("why?", True),
+        ("How so?", True),
+        ("ADR 2024?", False),
+        ("Occupancy St Regis?", False),
+    ],
+)
+def test_needs_history(question, expected):
+    assert needs_history(question) is expected
+
+
+class _Reply:
+    def __init__(self, content):
+        self.content = content
+
+
+class _RecordingLLM:
+    def __init__(self, reply):
+        self.reply = reply
+        self.prompts = []
+
+    def invoke(self, msg):
+        self.prompts.append(msg)
+        return _Reply(self.reply)
+
+
+class _Versioned:
+    def cache_version(self):
+        return "1"
+
+
+def _pipeline(llm):
+    # Bypass __init__ (needs OpenAI + a database); only the ask() plumbing is under test.
+    pipeline = HybridQAPipeline.__new__(HybridQAPipeline)
+    pipeline.router_llm = llm
+    pipeline.sql_pipeline = _Versioned()
+    pipeline.answered = []
+
+    def answer(question):
+        pipeline.answered.append(question)
+        return HybridAnswer(route="sql", answer=f"answer to {question}")
+
+    pipeline._answer = answer
+    pipeline._answer_cache = OrderedDict()
+    pipeline._answer_cache_lock = threading.Lock()
+    return pipeline
+
+
+def test_follow_up_is_rewritten_and_history_stays_out_of_answering():
+    llm = _RecordingLLM("What was the ADR for St Regis Dubai in 2024?")
+    pipeline = _pipeline(llm)
+
+    result = pipeline.ask("What about 2024?", history="User: What was the ADR for St Regis Dubai in 2025?")
+
+    assert pipeline.answered == ["What was the ADR for St Regis Dubai in 2024?"]
+    assert result.standalone_question == "What was the ADR for St Regis Dubai in 2024?"
+    assert len(llm.prompts) == 1
+
+
+def test_standalone_questions_skip_the_rewrite_and_hit_the_cache():
+    llm = _RecordingLLM("unused")
+    pipeline = _pipeline(llm)
+    question = "What was the ADR for St Regis Dubai on 1 January 2025?"
+
+    first = pipeline.ask(question, history="User: hello\nAssistant: hi")
+    second = pipeline.ask(question.lower(), history="User: something else entirely")
+
+    assert llm.prompts == []
+    assert pipeline.answered == [question]
+    assert first.fast_path is None and second.fast_path == "answer_cache"
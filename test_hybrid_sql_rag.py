@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from hybrid_qa import HybridQAPipeline
+from rag_core import format_context
+from sql_core import SQLAnswer
+
+
+def _doc(text, **metadata):
+    return SimpleNamespace(page_content=text, metadata=metadata)
+
+
+def test_format_context_keeps_best_chunks_within_budget():
+    docs = [_doc("a" * 40, hotel_name="St Regis Dubai", source="st_regis.pdf", page=0), _doc("b" * 40), _doc("c" * 400)]
+    context = format_context(docs, max_tokens=30)
+    assert context.startswith("[St Regis Dubai | st_regis.pdf | p.0]\n" + "a" * 40)
+    assert "b" * 40 in context and "c" not in context
+    assert format_context([_doc("x" * 400)], max_tokens=10) == "x" * 40
+
+
+class _LLM:
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, msg):
+        self.prompts.append(msg)
+        return SimpleNamespace(content="1200.5 AED. The hotel has a beach.")
+
+
+class _RAG:
+    def retrieve(self, question):
+        return [_doc("Private beach and spa.", hotel_name="St Regis Dubai")]
+
+    def ask(self, question):
+        raise AssertionError("sql+rag must not run a nested RAG generation")
+
+
+class _SQL:
+    def ask_sql(self, question):
+        return SQLAnswer(sql="SELECT ADR FROM t", raw_result="ADR\n1200.5", rows=[{"ADR": 1200.5}])
+
+
+def test_hybrid_route_makes_a_single_generation_over_raw_chunks():
+    pipeline = HybridQAPipeline.__new__(HybridQAPipeline)
+    pipeline.combine_llm = _LLM()
+    pipeline.sql_pipeline = _SQL()
+    pipeline.rag_pipeline = _RAG()
+
+    result = pipeline._answer_with_sql_and_rag("ADR and amenities of St Regis Dubai?")
+
+    assert result.route == "sql+rag" and result.answer.startswith("1200.5 AED")
+    assert len(pipeline.combine_llm.prompts) == 1
+    prompt = pipeline.combine_llm.prompts[0]
+    assert "[St Regis Dubai]\nPrivate beach and spa." in prompt and "ADR\n1200.5" in prompt
+    assert set(result.models) == {"sql", "combine"}
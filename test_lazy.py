@@ -0,0 +1,39 @@
+import subprocess
+import sys
+import threading
+import time
+
+from lazy import lazy_property
+
+
+def test_lazy_property_builds_once_across_threads():
+    calls = []
+
+    class Service:
+        @lazy_property
+        def client(self):
+            calls.append(1)
+            time.sleep(0.05)
+            return object()
+
+    service = Service()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.client)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+
+
+def test_importing_pipelines_defers_heavy_dependencies():
+    code = (
+        "import sys, hybrid_qa, rag_core; "
+        "print(sorted(m for m in ('langchain_openai', 'langchain_community', 'langchain_core.prompts', "
+        "'chromadb', 'pandas') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+
+    assert out.strip() == "[]"
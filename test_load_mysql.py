@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from load_mysql import get_table_version, load_csv
+
+
+TABLE = "dubai_hotels_daily"
+CSV_PATH = "dubai_hotels_synthetic_daily_2y_enriched.csv"
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # SQLite stands in for MySQL: the loader uses the same upsert / swap code paths.
+    return create_engine(f"sqlite:///{tmp_path / 'hotels.db'}")
+
+
+def _count(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT COUNT(*) FROM {TABLE}")).scalar()
+
+
+def test_first_load_rebuilds_and_stamps_version(engine):
+    stats = load_csv(engine, CSV_PATH, TABLE)
+
+    assert stats.mode == "rebuild"
+    assert _count(engine) == stats.inserted == 2193
+    assert get_table_version(engine, TABLE) == 1
+    assert not inspect(engine).has_table(f"{TABLE}__shadow")
+
+
+def test_incremental_load_only_writes_new_and_changed_rows(engine, tmp_path):
+    load_csv(engine, CSV_PATH, TABLE)
+
+    unchanged = load_csv(engine, CSV_PATH, TABLE)
+    assert (unchanged.inserted, unchanged.updated) == (0, 0)
+    # No data change → no version bump, so caches stay warm.
+    assert get_table_version(engine, TABLE) == 1
+
+    df = pd.read_csv(CSV_PATH)
+    df.loc[0, "ADR"] = 999.99
+    new_day = df.iloc[[1]].copy()
+    new_day["date"] = "27/11/2025"
+    refreshed = tmp_path / "refresh.csv"
+    pd.concat([df, new_day]).to_csv(refreshed, index=False)
+
+    stats = load_csv(engine, str(refreshed), TABLE)
+    assert (stats.inserted, stats.updated) == (1, 1)
+    assert stats.version == get_table_version(engine, TABLE) == 2
+    with engine.connect() as conn:
+        adr = conn.execute(
+            text(f"SELECT ADR FROM {TABLE} WHERE hotel_name = :h AND parsed_date_temp = '2023-11-27'"),
+            {"h": df.loc[0, "hotel_name"]},
+        ).scalar()
+    assert adr == pytest.approx(999.99)
+
+
+def test_rebuild_swaps_shadow_table_in(engine):
+    load_csv(engine, CSV_PATH, TABLE)
+    stats = load_csv(engine, CSV_PATH, TABLE, mode="rebuild")
+
+    assert stats.version == 2
+    assert _count(engine) == 2193
+    tables = set(inspect(engine).get_table_names())
+    assert f"{TABLE}__shadow" not in tables and f"{TABLE}__old" not in tables
+
+
+def test_since_never_drops_history(engine):
+    # First load (and a legacy, unkeyed table) rebuilds from the whole CSV.
+    stats = load_csv(engine, CSV_PATH, TABLE, since=pd.Timestamp("2025-11-01").date())
+    assert stats.mode == "rebuild" and _count(engine) == 2193
+
+    stats = load_csv(engine, CSV_PATH, TABLE, since=pd.Timestamp("2025-11-01").date())
+    assert stats.mode == "incremental" and (stats.inserted, stats.updated) == (0, 0)
+    assert 0 < stats.unchanged < 2193 and _count(engine) == 2193
+
+    with pytest.raises(ValueError):
+        load_csv(engine, CSV_PATH, TABLE, mode="rebuild", since=pd.Timestamp("2025-11-01").date())
+    assert _count(engine) == 2193
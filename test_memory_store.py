@@ -0,0 +1,51 @@
+import time
+
+from memory_store import ChatMemoryStore
+from token_utils import count_tokens
+
+
+def test_lru_bound_on_chats():
+    store = ChatMemoryStore(max_chats=100, ttl_seconds=0)
+    for chat in range(1000):
+        store.add(chat, "User", f"hello {chat}")
+
+    assert len(store) == 100
+    assert store.history_text(0) == ""
+    assert store.history_text(999) == "User: hello 999"
+
+
+def test_idle_chats_expire():
+    store = ChatMemoryStore(ttl_seconds=60)
+    store.add(1, "User", "hi")
+    store._chats["1"].updated_at = time.time() - 120
+
+    assert store.history_text(1) == ""
+    assert len(store) == 0
+
+
+def test_old_turns_are_compacted_under_budget():
+    store = ChatMemoryStore(max_messages=4, summary_max_tokens=60, ttl_seconds=0)
+    for turn in range(20):
+        store.add(7, "User", f"What was the ADR for St Regis Dubai in month {turn}?")
+        store.add(7, "Assistant", f"The ADR was {1000 + turn} AED. It rose because of events in month {turn}.")
+
+    memory = store.get(7)
+    assert len(memory.messages) == 4
+    assert memory.summary and count_tokens(memory.summary) <= 60
+    # Assistant replies are cut to their first sentence in the summary.
+    assert "It rose" not in memory.summary
+    assert memory.text().startswith("Summary of earlier conversation:")
+
+
+def test_sqlite_persistence_survives_restart_and_eviction(tmp_path):
+    db = str(tmp_path / "chats.db")
+    store = ChatMemoryStore(max_chats=1, db_path=db)
+    store.add("a", "User", "first chat")
+    store.add("b", "User", "second chat")
+
+    # "a" was evicted from process memory but is reloaded from SQLite.
+    assert len(store) == 1
+    assert store.history_text("a") == "User: first chat"
+
+    restarted = ChatMemoryStore(db_path=db)
+    assert restarted.history_text("b") == "User: second chat"
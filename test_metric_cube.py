@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+
+from evaluate_hybrid import extract_first_number
+from load_mysql import prepare_frame
+from metric_cube import MetricCube
+
+
+CSV_PATH = "dubai_hotels_synthetic_daily_2y_enriched.csv"
+
+
+@pytest.fixture(scope="module")
+def cube():
+    return MetricCube(prepare_frame(pd.read_csv(CSV_PATH)), "dubai_hotels_daily")
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        # Same curated examples as evaluate_hybrid.main(); the value must be the first number.
+        ("What was the occupancy percentage for St Regis Dubai on 1 January 2025?", 85.8),
+        ("What was the ADR for St Regis Dubai on 1 January 2025?", 1160.33),
+        (
+            "In 2025, which day did St Regis Dubai have the highest occupancy, "
+            "and what was that occupancy percentage?",
+            95.4,
+        ),
+        (
+            "When did Premier Inn Al Furjan have the highest occupancy in 2025, "
+            "and what was the occupancy percentage?",
+            97.0,
+        ),
+    ],
+)
+def test_eval_questions_answered_exactly(cube, question, expected):
+    result = cube.answer(question)
+
+    assert result is not None
+    assert extract_first_number(result.answer) == pytest.approx(expected)
+
+
+def test_extreme_lists_every_tied_day(cube):
+    result = cube.answer("When did Premier Inn Al Furjan have the highest occupancy in 2025?")
+
+    assert len(result.rows) == 20
+    assert {row["occupancy"] for row in result.rows} == {97.0}
+    assert "20 days (tied)" in result.answer
+    assert "limit" not in result.sql.lower()
+
+
+def test_same_day_last_year(cube):
+    result = cube.answer(
+        "In 2025, which day did St Regis Dubai have the highest occupancy, "
+        "and what was the occupancy on the same day in 2024?"
+    )
+
+    assert result.rows == [
+        {"hotel_name": "St Regis Dubai", "date": "2025-03-07", "occupancy": 95.4, "occupancy_2024": 75.9}
+    ]
+    assert "DAY(t1.parsed_date_temp) = DAY(t2.parsed_date_temp)" in result.sql
+
+
+def test_year_over_year_phrasing(cube):
+    result = cube.answer("What was the ADR for St Regis Dubai on 1 January 2025, year over year?")
+
+    assert [row["date"] for row in result.rows] == ["2025-01-01", "2024-01-01"]
+    assert "same day in 2024" in result.answer
+
+
+def test_point_and_extreme_values_are_rounded(cube):
+    # 228585.01 is stored as 228585.00999999998; users see the 2-decimal figure.
+    point = cube.answer("What was the room revenue for St Regis Dubai on 1 January 2025, year over year?")
+    assert point.answer.startswith("Room revenue for St Regis Dubai was 228585.01 AED on 1 January 2025.")
+    assert "(+7853.08 AED)" in point.answer
+    assert "0000" not in point.answer and "9999" not in point.answer
+
+    extreme = cube.answer("Which day had the highest room revenue for St Regis Dubai in 2025?")
+    assert "was 292704.24 AED in 2025" in extreme.answer
+
+
+def test_range_aggregate(cube):
+    result = cube.answer("total rooms sold for premier inn in Feb 2025")
+
+    assert result.rows[0]["rooms_sold"] == 7804
+    assert result.rows[0]["days"] == 28
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Which hotel had the strongest year-on-year ADR improvement from 2024 to 2025?",
+        "Why was St Regis occupancy so high in March 2025?",
+        "Tell me about the St Regis amenities",
+        "What was the ADR competition for St Regis Dubai on 1 January 2025?",
+        "How many days did St Regis Dubai have occupancy above 90% in 2025?",
+        "Days St Regis Dubai had occupancy over 90% in 2025",
+        "What was the ADR on 1 January 2025?",
+    ],
+)
+def test_unsupported_questions_fall_back(cube, question):
+    assert cube.answer(question) is None
@@ -0,0 +1,141 @@
+import json
+import threading
+from collections import OrderedDict
+
+import pytest
+
+import query_log
+import query_report
+from config import settings
+from hybrid_qa import HybridAnswer, HybridQAPipeline
+from query_log import QueryLog, QueryTrace, record_sql
+from resilience import invoke_llm
+
+
+class _Reply:
+    def __init__(self, content, usage):
+        self.content = content
+        self.usage_metadata = usage
+
+
+class _LLM:
+    def invoke(self, msg):
+        return _Reply("SELECT 1", {"input_tokens": 120, "output_tokens": 15})
+
+
+class _Versioned:
+    def cache_version(self):
+        return "1"
+
+
+@pytest.fixture
+def log_path():
+    # conftest.py points QUERY_LOG_PATH at a per-test file.
+    return settings.query_log_path
+
+
+def _pipeline():
+    # Bypass __init__ (needs OpenAI + a database); _answer runs one LLM stage and one query.
+    pipeline = HybridQAPipeline.__new__(HybridQAPipeline)
+    pipeline.sql_pipeline = _Versioned()
+
+    def answer(question):
+        response = invoke_llm(_LLM(), question, stage="sql")
+        record_sql(0.25, 3)
+        return HybridAnswer(route="sql", answer="42", sql_query=response.content)
+
+    pipeline._answer = answer
+    pipeline._answer_cache = OrderedDict()
+    pipeline._answer_cache_lock = threading.Lock()
+    return pipeline
+
+
+def test_ask_writes_one_row_per_question(log_path):
+    pipeline = _pipeline()
+    pipeline.ask("ADR at St Regis in 2024?")
+    pipeline.ask("adr at st regis in 2024")
+
+    rows = query_report.load_rows(log_path)
+    assert [r["normalized_question"] for r in rows] == ["adr at st regis in 2024"] * 2
+    first, second = rows
+    assert first["route"] == "sql" and first["sql_query"] == "SELECT 1"
+    assert first["sql_seconds"] == 0.25 and first["sql_rows"] == 3
+    assert (first["prompt_tokens"], first["completion_tokens"]) == (120, 15)
+    assert json.loads(first["tokens"]) == {"sql": {"prompt": 120, "completion": 15}}
+    assert {"sql", "sql_exec"} <= set(json.loads(first["stages"]))
+    assert first["cache_hits"] is None
+    # The repeat is served from the answer cache without any stage running.
+    assert second["cache_hits"] == "answer_cache" and second["fast_path"] == "answer_cache"
+    assert json.loads(second["stages"]) == {} and second["prompt_tokens"] == 0
+    assert query_log.current_trace() is None
+
+
+def test_empty_path_disables_the_log(monkeypatch):
+    monkeypatch.setattr(settings, "query_log_path", "")
+    assert query_log.get_query_log() is None
+    assert _pipeline().ask("Occupancy in May?").answer == "42"
+
+
+def test_records_outside_a_question_are_ignored():
+    record_sql(1.0, 1)
+    query_log.record_stage("sql", 1.0)
+    assert query_log.current_trace() is None
+
+
+def _log_rows(path):
+    log = QueryLog(path)
+    for question, route, sql, sql_seconds, stages, cached in [
+        ("adr in may", "sql", "SELECT adr FROM t", 0.5, {"sql": 1.0, "sql_exec": 0.5}, False),
+        ("adr in may", "sql", "SELECT adr FROM t", 1.5, {"sql": 1.2, "sql_exec": 1.5}, True),
+        ("adr in may", "sql", None, None, {}, True),
+        ("why was june slow", "sql+rag", "SELECT occ FROM t", 0.1, {"sql": 0.8, "explain": 3.0}, False),
+        ("facilities at st regis", "rag", None, None, {"retrieve": 0.2, "rag": 2.0}, False),
+    ]:
+        trace = QueryTrace(question, stages=dict(stages))
+        if sql_seconds is not None:
+            trace.sql_seconds, trace.sql_rows = sql_seconds, 1
+        if cached:
+            trace.add_cache_hit("answer_cache")
+        trace.add_tokens("sql", 100, 10)
+        log.append(trace, question, HybridAnswer(route=route, answer="", sql_query=sql))
+
+
+def test_report_sections(tmp_path):
+    path = str(tmp_path / "log.sqlite")
+    _log_rows(path)
+    rows = query_report.load_rows(path)
+
+    hot = query_report.hot_questions(rows, top=2)
+    assert [(q["question"], q["count"]) for q in hot] == [("adr in may", 3), ("facilities at st regis", 1)]
+    assert hot[0]["cached"] == pytest.approx(2 / 3)
+
+    stages = query_report.slowest_stages(rows)
+    assert stages[0]["stage"] == "explain"
+    assert next(s for s in stages if s["stage"] == "sql")["calls"] == 3
+
+    sql = query_report.worst_sql(rows)
+    assert [(s["sql"], s["count"], s["max_seconds"]) for s in sql] == [
+        ("SELECT adr FROM t", 2, 1.5),
+        ("SELECT occ FROM t", 1, 0.1),
+    ]
+
+    routes = {r["route"]: r for r in query_report.route_distribution(rows)}
+    assert routes["sql"]["count"] == 3 and routes["sql"]["share"] == pytest.approx(0.6)
+    assert routes["rag"]["avg_tokens"] == 110
+
+
+def test_report_cli(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / "log.sqlite")
+    _log_rows(path)
+    monkeypatch.setattr("sys.argv", ["query_report.py", "--path", path, "--top", "3", "--since", "1"])
+    query_report.main()
+    out = capsys.readouterr().out
+    assert "5 questions logged in the last 1 days" in out
+    assert "SELECT adr FROM t" in out and "Routes:" in out
+
+
+def test_report_without_a_log(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / "missing.sqlite")
+    monkeypatch.setattr("sys.argv", ["query_report.py", "--path", path])
+    query_report.main()
+    assert capsys.readouterr().out.strip() == f"No questions logged in '{path}'."
@@ -0,0 +1,56 @@
+import json
+
+import httpx
+import pytest
+
+import llm_factory
+from config import settings
+from rate_limit import RateLimitedTransport, RateLimiter, RateLimitTimeout, TokenBucket, estimate_tokens
+from resilience import deadline_scope
+
+
+def test_bucket_queues_bursts_instead_of_rejecting():
+    bucket = TokenBucket(per_minute=60)  # one unit per second, burst of 60
+    assert bucket.reserve(60) == 0
+    assert bucket.reserve(1) == pytest.approx(1, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2, abs=0.05)
+    assert TokenBucket(per_minute=0).reserve(10**9) == 0
+
+
+def test_limiter_gives_capacity_back_when_the_deadline_is_too_close():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=0)
+    limiter.acquire(0)
+    limiter.requests.reserve(59)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(0, timeout=0.1)
+    assert limiter.requests.reserve(1) == pytest.approx(1, abs=0.05)
+
+
+def test_estimate_tokens_for_chat_and_embeddings():
+    chat = json.dumps({"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 50}).encode()
+    assert estimate_tokens(chat) >= 50 + 10
+    embed = json.dumps({"input": [[1, 2, 3], [4, 5]]}).encode()
+    assert estimate_tokens(embed) == 5
+
+
+def test_429_pauses_every_later_request():
+    responses = iter([httpx.Response(429, headers={"retry-after": "2"}), httpx.Response(200)])
+    limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=0)
+    client = httpx.Client(transport=RateLimitedTransport(limiter, httpx.MockTransport(lambda r: next(responses))))
+
+    assert client.post("https://api.openai.com/v1/chat/completions", json={"messages": []}).status_code == 429
+    with deadline_scope(0.5), pytest.raises(RateLimitTimeout):
+        client.post("https://api.openai.com/v1/chat/completions", json={"messages": []})
+    assert limiter.stats()["rate_limited"] == 1
+
+
+def test_all_openai_clients_share_one_http_client(monkeypatch):
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(llm_factory, "_clients", {})
+    router, sql = llm_factory.get_chat_model("model-a"), llm_factory.get_chat_model("model-b")
+    embeddings = llm_factory.get_embeddings("embedding-model")
+
+    shared = llm_factory.get_http_client()
+    assert router.root_client._client is shared
+    assert sql.root_client._client is shared
+    assert embeddings.client._client._client is shared
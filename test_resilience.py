@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+import resilience
+from config import settings
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, call_with_deadline, deadline_scope, time_left
+
+
+def test_inner_deadline_never_extends_the_outer_one():
+    with deadline_scope(1.0):
+        with deadline_scope(60):
+            assert time_left() <= 1.0
+        with deadline_scope(0.5):
+            assert time_left() <= 0.5
+    assert time_left() is None
+
+
+def test_slow_call_is_abandoned_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(settings, "llm_hedge_after_seconds", 0)
+    start = time.monotonic()
+    with deadline_scope(0.1):
+        with pytest.raises(DeadlineExceeded):
+            call_with_deadline(time.sleep, 2, stage="t-slow", breaker="t-slow")
+    assert time.monotonic() - start < 1
+    assert resilience.metrics.snapshot()["counters"]["t-slow_timeouts"] == 1
+
+
+def test_hedged_call_returns_the_faster_attempt(monkeypatch):
+    monkeypatch.setattr(settings, "llm_hedge_after_seconds", 0.05)
+    delays = iter([2.0, 0.0])
+
+    def call():
+        delay = next(delays)
+        time.sleep(delay)
+        return delay
+
+    start = time.monotonic()
+    assert call_with_deadline(call, stage="t-hedge", hedge=True, breaker="t-hedge") == 0.0
+    assert time.monotonic() - start < 1
+    counters = resilience.metrics.snapshot()["counters"]
+    assert counters["t-hedge_hedges"] == 1 and counters["t-hedge_hedges_won"] == 1
+
+
+def test_breaker_opens_fails_fast_and_recovers_after_a_trial_call():
+    breaker = CircuitBreaker("t-db", failure_threshold=2, reset_seconds=0.05)
+
+    def down():
+        raise ConnectionError("down")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(down)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "not called")
+
+    time.sleep(0.06)
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_bad_requests_do_not_trip_the_breaker():
+    breaker = CircuitBreaker("t-bad", failure_threshold=1, reset_seconds=60)
+    with pytest.raises(ValueError):
+        breaker.call(int, "x", is_failure=lambda exc: not isinstance(exc, ValueError))
+    assert breaker.state == "closed"
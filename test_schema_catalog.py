@@ -0,0 +1,159 @@
+import re
+import zlib
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, text
+
+import sql_core
+from config import settings
+from schema_catalog import SchemaCatalog, describe_tables, render_schema
+from sql_core import SQLPipeline
+
+CSV_PATH = "dubai_hotels_synthetic_daily_2y_enriched.csv"
+
+
+class WordEmbeddings:
+    """Bag-of-words vectors: texts sharing words are similar."""
+
+    def __init__(self):
+        self.documents = 0
+
+    def _vector(self, text):
+        vector = np.zeros(256)
+        for word in re.findall(r"[a-z]+", text.lower()):
+            # crc32, not hash(): str hashing is randomized per process.
+            vector[zlib.crc32(word.encode()) % 256] += 1
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        self.documents += len(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE hotels (hotel_id INTEGER PRIMARY KEY, hotel_name TEXT, stars INTEGER)"))
+        conn.execute(
+            text(
+                "CREATE TABLE events (event_id INTEGER PRIMARY KEY, event_name TEXT, venue TEXT, "
+                "attendance INTEGER, event_date DATE)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE TABLE competitor_rates (hotel_id INTEGER REFERENCES hotels(hotel_id), "
+                "competitor TEXT, rate_date DATE, competitor_rate REAL, channel TEXT, currency TEXT)"
+            )
+        )
+        conn.execute(text("INSERT INTO hotels VALUES (1, 'St Regis Dubai', 5), (2, 'Premier Inn', 3)"))
+    return engine
+
+
+def test_describe_tables(engine):
+    descriptions = {"events": {"description": "City events.", "columns": {"attendance": "Visitors."}}}
+    tables = {t.name: t for t in describe_tables(engine, ["hotels", "events", "competitor_rates"], descriptions)}
+
+    assert tables["events"].description == "City events."
+    assert next(c for c in tables["events"].columns if c.name == "attendance").description == "Visitors."
+    hotel_name = next(c for c in tables["hotels"].columns if c.name == "hotel_name")
+    assert hotel_name.values == ["Premier Inn", "St Regis Dubai"]
+    assert tables["competitor_rates"].foreign_keys == [("hotel_id", "hotels", "hotel_id")]
+    assert [c.name for c in tables["competitor_rates"].columns if c.key] == ["hotel_id"]
+
+
+def test_select_keeps_relevant_tables_and_key_columns(engine):
+    catalog = SchemaCatalog(describe_tables(engine, ["hotels", "events", "competitor_rates"], {}))
+    catalog.index(WordEmbeddings())
+
+    selected = catalog.select("Which competitor rate was lowest?", max_tables=1, max_columns=3)
+
+    assert [t.name for t in selected] == ["competitor_rates"]
+    columns = [c.name for c in selected[0].columns]
+    assert len(columns) == 3
+    assert "hotel_id" in columns and "competitor_rate" in columns
+
+
+def test_schema_size_is_bounded(engine):
+    catalog = SchemaCatalog(describe_tables(engine, ["hotels", "events", "competitor_rates"], {}))
+    catalog.index(WordEmbeddings())
+    assert not catalog.fits(2, 4)
+
+    selected = catalog.select("event attendance", max_tables=2, max_columns=2)
+    assert len(selected) == 2 and all(len(t.columns) <= 2 for t in selected)
+    rendered = render_schema(selected, catalog)
+    assert "CREATE TABLE events" in rendered
+    assert "2 of 5 columns shown" in rendered
+
+
+def test_render_schema(engine):
+    tables = describe_tables(engine, ["competitor_rates"], {"competitor_rates": {"columns": {"channel": "Sales channel."}}})
+    rendered = render_schema(tables)
+    assert "`channel` TEXT,  -- Sales channel." in rendered
+    assert rendered.splitlines()[-2] == "  FOREIGN KEY (`hotel_id`) REFERENCES hotels(`hotel_id`)"
+    assert "columns shown" not in rendered
+
+
+def test_index_reuses_cache(engine, tmp_path):
+    path = str(tmp_path / "catalog.npz")
+    tables = describe_tables(engine, ["hotels", "events"], {})
+    first = WordEmbeddings()
+    SchemaCatalog(tables).index(first, "model", path)
+    second = WordEmbeddings()
+    catalog = SchemaCatalog(tables)
+    catalog.index(second, "model", path)
+
+    assert first.documents == len(catalog.entries) and second.documents == 0
+    assert catalog.vectors.shape == (len(catalog.entries), 256)
+    # A different embedding model invalidates the cache.
+    SchemaCatalog(tables).index(second, "other-model", path)
+    assert second.documents == len(catalog.entries)
+
+
+class _Reply:
+    def __init__(self, content):
+        self.content = content
+
+
+class _RecordingLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, msg):
+        self.prompts.append(str(msg))
+        return _Reply("SELECT hotel_name FROM dubai_hotels_daily LIMIT 1")
+
+
+def _pipeline(tmp_path, monkeypatch, max_columns):
+    monkeypatch.setattr(settings, "openai_api_key", "test-key")
+    monkeypatch.setattr(settings, "sql_backend", "sqlite")
+    monkeypatch.setattr(settings, "sqlite_path", str(tmp_path / "hotels.sqlite"))
+    monkeypatch.setattr(settings, "hotels_csv", CSV_PATH)
+    monkeypatch.setattr(settings, "sql_catalog_path", str(tmp_path / "catalog.npz"))
+    monkeypatch.setattr(settings, "sql_schema_max_columns", max_columns)
+    monkeypatch.setattr(settings, "sql_cascade", False)
+    monkeypatch.setattr(sql_core, "get_embeddings", lambda model: WordEmbeddings())
+    llm = _RecordingLLM()
+    monkeypatch.setattr(sql_core, "get_chat_model", lambda model: llm)
+    return SQLPipeline(), llm
+
+
+def test_pipeline_uses_full_schema_when_it_fits(tmp_path, monkeypatch):
+    pipeline, llm = _pipeline(tmp_path, monkeypatch, max_columns=15)
+    pipeline.ask_sql("Which hotels are there?")
+    assert pipeline.schema_catalog is None
+    assert "Justification" in llm.prompts[0]
+
+
+def test_pipeline_prompts_with_schema_subset(tmp_path, monkeypatch):
+    pipeline, llm = _pipeline(tmp_path, monkeypatch, max_columns=4)
+    pipeline.ask_sql("Average competition ADR per hotel_name?")
+    prompt = llm.prompts[0]
+    assert "`ADR_Competition`" in prompt and "`hotel_name`" in prompt
+    assert "`Justification`" not in prompt
+    assert "4 of 10 columns shown" in prompt
@@ -0,0 +1,222 @@
+import itertools
+import multiprocessing
+import time
+
+import numpy as np
+import pytest
+
+import shared_state
+from config import settings
+from llm_factory import CachedEmbeddings
+from memory_store import ChatMemoryStore
+from shared_state import FileLock, SharedStore, acquire_leadership, chat_lock
+from vector_index import MmapVectorIndex, export_vectors
+
+
+@pytest.fixture
+def multi(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "worker_mode", "multi")
+    monkeypatch.setattr(settings, "shared_state_dir", str(tmp_path / "shared"))
+    monkeypatch.setattr(shared_state, "_store", None)
+    monkeypatch.setattr(shared_state, "_leaders", {})
+    return tmp_path / "shared"
+
+
+def test_store_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first, second = SharedStore(path), SharedStore(path)
+
+    first.set("answers", "q", {"answer": "42", "rows": [1, 2]})
+    assert second.get("answers", "q") == {"answer": "42", "rows": [1, 2]}
+    assert second.get("answers", "other") is None
+    assert second.stats()["hits"] == 1 and second.stats()["entries"] == {"answers": 1}
+
+    assert first.add("telegram_updates", "17") is True
+    assert second.add("telegram_updates", "17") is False
+
+
+def test_store_expiry_and_trim(tmp_path, monkeypatch):
+    store = SharedStore(str(tmp_path / "cache.sqlite"), max_entries=3, ttl_seconds=60)
+    store.set("sql", "old", 1)
+    clock = itertools.count(1e12)
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+    assert store.get("sql", "old") is None
+
+    store._writes = 995  # the next write triggers the cleanup pass
+    for i in range(5):
+        store.set("sql", f"k{i}", i)
+    assert store.stats()["entries"] == {"sql": 3}
+    assert store.get("sql", "k4") == 4
+
+
+def test_get_shared_store_only_in_multi_worker_mode(multi, monkeypatch):
+    assert shared_state.get_shared_store() is shared_state.get_shared_store()
+    assert (multi / "cache.sqlite").exists()
+    monkeypatch.setattr(settings, "worker_mode", "single")
+    assert shared_state.get_shared_store() is None
+
+
+def test_file_lock_excludes_other_holders(tmp_path):
+    path = str(tmp_path / "x.lock")
+    first, second = FileLock(path), FileLock(path)
+    assert first.acquire(blocking=False)
+    assert not second.acquire(blocking=False)
+    first.release()
+    assert second.acquire(blocking=False)
+    second.release()
+
+
+def _hold_leadership(directory, queue):
+    settings.worker_mode = "multi"
+    settings.shared_state_dir = directory
+    shared_state._leaders.clear()  # forked: drop the parent's record, its lock is still held
+    queue.put(acquire_leadership("webhook"))
+
+
+def test_one_leader_across_processes(multi):
+    assert acquire_leadership("webhook")
+    queue = multiprocessing.get_context("fork").Queue()
+    process = multiprocessing.get_context("fork").Process(target=_hold_leadership, args=(str(multi), queue))
+    process.start()
+    process.join(10)
+    assert queue.get(timeout=5) is False
+
+
+def test_chat_lock_is_per_chat(multi):
+    with chat_lock(1):
+        assert not chat_lock(1).acquire(blocking=False)
+        other = next(c for c in range(2, 1000) if chat_lock(c).path != chat_lock(1).path)
+        lock = chat_lock(other)
+        assert lock.acquire(blocking=False)
+        lock.release()
+
+
+def test_shared_chat_memory_sees_other_workers(tmp_path):
+    path = str(tmp_path / "chat.sqlite")
+    worker_a = ChatMemoryStore(db_path=path, shared=True)
+    worker_b = ChatMemoryStore(db_path=path, shared=True)
+
+    worker_a.add(7, "User", "ADR at St Regis in May?")
+    assert "ADR at St Regis" in worker_b.history_text(7)
+    worker_b.add(7, "Assistant", "1,050 AED.")
+    worker_a.add(7, "User", "And in June?")
+    assert [m["msg"] for m in worker_b.get(7).messages] == ["ADR at St Regis in May?", "1,050 AED.", "And in June?"]
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        self.texts.append(text)
+        return [float(len(text)), 1.0]
+
+
+def test_cached_embeddings(tmp_path):
+    store = SharedStore(str(tmp_path / "cache.sqlite"))
+    inner = CountingEmbeddings()
+    worker_a, worker_b = CachedEmbeddings(inner, store, "m"), CachedEmbeddings(inner, store, "m")
+
+    assert worker_a.embed_documents(["a", "bb"]) == [[1.0, 1.0], [2.0, 1.0]]
+    assert worker_b.embed_documents(["bb", "ccc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert worker_b.embed_query("a") == [1.0, 1.0]
+    assert inner.texts == ["a", "bb", "ccc"]
+    assert worker_a.texts is inner.texts  # other attributes come from the wrapped client
+
+
+class VectorEmbeddings:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+def test_mmap_index_matches_chroma(tmp_path):
+    import chromadb
+    from langchain_community.vectorstores import Chroma
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50, 8)).astype(np.float32)
+    client = chromadb.EphemeralClient()
+    collection = client.create_collection("mmap-test")
+    collection.add(
+        ids=[str(i) for i in range(50)],
+        embeddings=vectors,
+        documents=[f"chunk {i}" for i in range(50)],
+        metadatas=[{"page": i} for i in range(50)],
+    )
+    query = {"q": (vectors[3] + 0.1).tolist()}
+    store = Chroma(client=client, collection_name="mmap-test", embedding_function=VectorEmbeddings(query))
+
+    assert export_vectors(collection, str(tmp_path / "mmap")) == 50
+    index = MmapVectorIndex(str(tmp_path / "mmap"), VectorEmbeddings(query))
+
+    expected = store.similarity_search_with_relevance_scores("q", k=5)
+    got = index.similarity_search_with_relevance_scores("q", k=5)
+    assert [d.page_content for d, _ in got] == [d.page_content for d, _ in expected]
+    assert np.allclose([s for _, s in got], [s for _, s in expected], atol=1e-4)
+    assert got[0][0].metadata == {"page": 3}
+    assert isinstance(index.vectors, np.memmap)
+
+    # A re-export is picked up by running workers.
+    collection.delete(ids=["3"])
+    export_vectors(collection, str(tmp_path / "mmap"))
+    index._loaded_mtime = None
+    assert "chunk 3" not in [d.page_content for d in index.similarity_search("q", k=5)]
+
+
+class _Tables:
+    version = "1"
+
+    def cache_version(self):
+        return self.version
+
+
+def test_shared_answer_cache_expires_with_data_corpus_and_config(multi, tmp_path, monkeypatch):
+    import datetime as dt
+    import threading
+    from collections import OrderedDict
+    from decimal import Decimal
+
+    import rag_core
+    from hybrid_qa import HybridAnswer, HybridQAPipeline
+    from sql_results import SQLResult
+
+    monkeypatch.setattr(settings, "chroma_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "vector_mmap_dir", str(tmp_path / "mmap"))
+
+    def worker():
+        pipeline = HybridQAPipeline.__new__(HybridQAPipeline)
+        pipeline.sql_pipeline = _Tables()
+        pipeline._answer_cache = OrderedDict()
+        pipeline._answer_cache_lock = threading.Lock()
+        pipeline.answered = []
+
+        def answer(question):
+            pipeline.answered.append(question)
+            rows = SQLResult.from_rows(["day", "adr"], [(dt.date(2025, 1, 1), Decimal("1050.5"))]).records()
+            return HybridAnswer(route="sql", answer="1,050.5 AED", sql_rows=rows)
+
+        pipeline._answer = answer
+        return pipeline
+
+    first, second = worker(), worker()
+    fresh = first.ask("ADR at St Regis on 1 January 2025?")
+    cached = second.ask("ADR at St Regis on 1 January 2025?")
+    assert second.answered == [] and cached.fast_path == "answer_cache"
+    assert cached.sql_rows == fresh.sql_rows == [{"day": "2025-01-01", "adr": 1050.5}]
+
+    # A re-ingest, a joined-table change or a config change each invalidate the entry.
+    rag_core.touch_ingest_stamp()
+    second.ask("ADR at St Regis on 1 January 2025?")
+    monkeypatch.setattr(_Tables, "version", "1.3/12")
+    second.ask("ADR at St Regis on 1 January 2025?")
+    monkeypatch.setattr(settings, "rag_model", "another-model")
+    third = worker()
+    third.ask("ADR at St Regis on 1 January 2025?")
+    assert len(second.answered) == 2 and len(third.answered) == 1
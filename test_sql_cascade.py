@@ -0,0 +1,106 @@
+import pytest
+
+import sql_core
+from config import settings
+from sql_core import SQLPipeline
+
+
+CSV_PATH = "dubai_hotels_synthetic_daily_2y_enriched.csv"
+
+
+class _Reply:
+    def __init__(self, content):
+        self.content = content
+
+
+class _ScriptedLLM:
+    def __init__(self, sql):
+        self.sql = sql
+        self.calls = 0
+
+    def invoke(self, msg):
+        self.calls += 1
+        return _Reply(self.sql)
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "openai_api_key", "test-key")
+    monkeypatch.setattr(settings, "sql_backend", "sqlite")
+    monkeypatch.setattr(settings, "sqlite_path", str(tmp_path / "hotels.sqlite"))
+    monkeypatch.setattr(settings, "hotels_csv", CSV_PATH)
+    monkeypatch.setattr(settings, "sql_model", "fast-model")
+    monkeypatch.setattr(settings, "sql_strong_model", "strong-model")
+    monkeypatch.setattr(settings, "sql_cascade", True)
+    return SQLPipeline()
+
+
+def _use_models(monkeypatch, fast_sql, strong_sql):
+    llms = {"fast-model": _ScriptedLLM(fast_sql), "strong-model": _ScriptedLLM(strong_sql)}
+    monkeypatch.setattr(sql_core, "get_chat_model", lambda model: llms[model])
+    return llms
+
+
+GOOD_SQL = (
+    "SELECT `Occupancy_%` FROM dubai_hotels_daily "
+    "WHERE hotel_name = 'St Regis Dubai' AND parsed_date_temp = '2025-01-01'"
+)
+
+
+def test_fast_model_answers_when_its_sql_works(pipeline, monkeypatch):
+    llms = _use_models(monkeypatch, GOOD_SQL, "SELECT 1")
+
+    answer = pipeline.ask_sql("Occupancy for St Regis Dubai on 1 January 2025?")
+
+    assert (answer.model, answer.tier) == ("fast-model", "fast")
+    assert answer.rows == [{"Occupancy_%": 85.8}]
+    assert llms["strong-model"].calls == 0
+
+
+@pytest.mark.parametrize(
+    "bad_sql",
+    [
+        "SELECT occupancy_pct FROM dubai_hotels_daily",  # does not execute
+        "SELECT ADR FROM dubai_hotels_daily WHERE hotel_name = 'St Regis'",  # no rows
+        "DELETE FROM dubai_hotels_daily",  # rejected by the guard
+    ],
+)
+def test_escalates_to_strong_model(pipeline, monkeypatch, bad_sql):
+    llms = _use_models(monkeypatch, bad_sql, GOOD_SQL)
+
+    answer = pipeline.ask_sql("Occupancy for St Regis Dubai on 1 January 2025?")
+
+    assert (answer.model, answer.tier) == ("strong-model", "strong")
+    assert answer.rows == [{"Occupancy_%": 85.8}]
+    assert llms["fast-model"].calls == 1
+
+
+def test_empty_result_outside_the_data_is_not_escalated(pipeline, monkeypatch):
+    future = "SELECT ADR FROM dubai_hotels_daily WHERE parsed_date_temp = '2031-05-01'"
+    llms = _use_models(monkeypatch, future, GOOD_SQL)
+
+    answer = pipeline.ask_sql("ADR on 1 May 2031?")
+
+    assert (answer.tier, answer.rows) == ("fast", [])
+    assert llms["strong-model"].calls == 0
+
+
+def test_timeouts_are_not_escalated(pipeline, monkeypatch):
+    from sql_guard import SQLTimeoutError
+
+    llms = _use_models(monkeypatch, GOOD_SQL, GOOD_SQL)
+
+    def slow(*args, **kwargs):
+        raise SQLTimeoutError("Query timed out after 5 ms.")
+
+    monkeypatch.setattr(pipeline.guard, "execute", slow)
+    with pytest.raises(SQLTimeoutError):
+        pipeline.ask_sql("Occupancy for St Regis Dubai on 1 January 2025?")
+    assert llms["strong-model"].calls == 0
+
+
+def test_single_model_by_default(monkeypatch):
+    from llm_factory import sql_cascade
+
+    monkeypatch.setattr(settings, "sql_strong_model", "")
+    assert sql_cascade() == [("fast", settings.sql_model)]
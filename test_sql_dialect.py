@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from load_mysql import ensure_sqlite_database
+from sql_dialect import translate_mysql_to_sqlite
+
+
+CSV_PATH = "dubai_hotels_synthetic_daily_2y_enriched.csv"
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    path = tmp_path_factory.mktemp("sqlite") / "hotels.sqlite"
+    return create_engine(ensure_sqlite_database(str(path), CSV_PATH))
+
+
+def _run(engine, mysql_sql):
+    with engine.connect() as conn:
+        return conn.execute(text(translate_mysql_to_sqlite(mysql_sql))).all()
+
+
+def test_date_part_functions_are_translated():
+    sql = translate_mysql_to_sqlite(
+        "SELECT DAY(parsed_date_temp) FROM t WHERE YEAR(parsed_date_temp) = 2025 AND hotel_name = 'YEAR(x)'"
+    )
+    assert sql == (
+        "SELECT CAST(strftime('%d', parsed_date_temp) AS INTEGER) FROM t "
+        "WHERE CAST(strftime('%Y', parsed_date_temp) AS INTEGER) = 2025 AND hotel_name = 'YEAR(x)'"
+    )
+
+
+def test_nested_calls_and_intervals():
+    sql = translate_mysql_to_sqlite(
+        "SELECT CONCAT(hotel_name, '-', YEAR(DATE_SUB(parsed_date_temp, INTERVAL 1 YEAR))) FROM t"
+    )
+    assert sql == (
+        "SELECT (hotel_name || '-' || CAST(strftime('%Y', date(parsed_date_temp, '-1 years')) AS INTEGER)) FROM t"
+    )
+
+
+def test_date_format_month_names(engine):
+    rows = _run(
+        engine,
+        "SELECT DATE_FORMAT(parsed_date_temp, '%M %Y'), DATE_FORMAT(parsed_date_temp, '%d %b, %H:%i') "
+        "FROM dubai_hotels_daily WHERE parsed_date_temp = '2025-01-01' LIMIT 1",
+    )
+    assert rows == [("January 2025", "01 Jan, 00:00")]
+
+
+def test_untranslatable_date_format_fails_loudly(engine):
+    from sqlalchemy.exc import OperationalError
+
+    # %W (weekday name) has no strftime equivalent: no silently wrong output.
+    assert "DATE_FORMAT(" in translate_mysql_to_sqlite("SELECT DATE_FORMAT(parsed_date_temp, '%W') FROM t")
+    with pytest.raises(OperationalError):
+        _run(engine, "SELECT DATE_FORMAT(parsed_date_temp, '%W') FROM dubai_hotels_daily")
+
+
+def test_point_lookup_matches_csv(engine):
+    rows = _run(
+        engine,
+        "SELECT ADR, `Occupancy_%` FROM dubai_hotels_daily "
+        "WHERE hotel_name = 'St Regis Dubai' AND YEAR(parsed_date_temp) = 2025 "
+        "AND MONTH(parsed_date_temp) = 1 AND DAY(parsed_date_temp) = 1",
+    )
+    assert rows == [(1160.33, 85.8)]
+
+
+def test_same_day_last_year_self_join(engine):
+    rows = _run(
+        engine,
+        """
+        SELECT t1.parsed_date_temp, t1.`Occupancy_%`, AVG(t2.`Occupancy_%`) AS occupancy_last_year
+        FROM dubai_hotels_daily t1
+        JOIN dubai_hotels_daily t2
+          ON t1.hotel_name = t2.hotel_name
+         AND DAY(t1.parsed_date_temp) = DAY(t2.parsed_date_temp)
+         AND MONTH(t1.parsed_date_temp) = MONTH(t2.parsed_date_temp)
+         AND YEAR(t1.parsed_date_temp) = 2025
+         AND YEAR(t2.parsed_date_temp) = 2024
+        WHERE t1.hotel_name = 'St Regis Dubai'
+          AND t1.`Occupancy_%` = (
+              SELECT MAX(`Occupancy_%`) FROM dubai_hotels_daily
+              WHERE hotel_name = 'St Regis Dubai' AND YEAR(parsed_date_temp) = 2025)
+        GROUP BY t1.parsed_date_temp, t1.`Occupancy_%`
+        """,
+    )
+    assert len(rows) == 1
+    assert rows[0][:2] == ("2025-03-07", 95.4)
@@ -0,0 +1,143 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from load_mysql import load_csv
+from sql_dialect import translate_mysql_to_sqlite
+from sql_guard import SQLGuard, SQLGuardError, check_read_only, rewrite_sargable
+from sql_rollups import results_match
+
+
+TABLE = "dubai_hotels_daily"
+CSV_PATH = "dubai_hotels_synthetic_daily_2y_enriched.csv"
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('guard') / 'hotels.db'}")
+    load_csv(engine, CSV_PATH, TABLE)
+    return engine
+
+
+def _rows(engine, sql):
+    with engine.connect() as conn:
+        return conn.execute(text(translate_mysql_to_sqlite(sql))).all()
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "DELETE FROM dubai_hotels_daily",
+        "SELECT 1; DROP TABLE dubai_hotels_daily",
+        "UPDATE dubai_hotels_daily SET ADR = 0",
+        "SELECT * FROM dubai_hotels_daily INTO OUTFILE '/tmp/x'",
+        "REPLACE INTO dubai_hotels_daily SELECT * FROM dubai_hotels_daily",
+        "WITH x AS (SELECT 1) REPLACE INTO t SELECT * FROM x",
+    ],
+)
+def test_rejects_non_select(sql):
+    with pytest.raises(SQLGuardError):
+        check_read_only(sql)
+
+
+def test_replace_function_is_read_only():
+    sql = "SELECT REPLACE(hotel_name, 'Dubai', '') AS short_name FROM t"
+    assert check_read_only(sql) == sql
+
+
+class _MySQLConn:
+    """Records statements; the session limit is read back as 0 (unlimited)."""
+
+    def __init__(self):
+        self.statements = []
+
+    def execution_options(self, **options):
+        return self
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+        return self
+
+    def scalar(self):
+        return 0
+
+    def keys(self):
+        return ["n"]
+
+    def fetchmany(self, size):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+def test_mysql_timeout_is_reset_on_the_pooled_connection():
+    from types import SimpleNamespace
+
+    guard = SQLGuard(SimpleNamespace(dialect=SimpleNamespace(name="mysql")), max_cost=0, timeout_ms=5, max_rows=10)
+    conn = _MySQLConn()
+
+    assert guard._run_with_timeout(conn, "SELECT 1 AS n", 5) == (["n"], [(1,)])
+    assert conn.statements[1:] == [
+        "SET SESSION MAX_EXECUTION_TIME = 5",
+        "SELECT 1 AS n",
+        "SET SESSION MAX_EXECUTION_TIME = 0",
+    ]
+
+
+def test_read_only_ignores_keywords_in_literals():
+    assert check_read_only("SELECT * FROM t WHERE hotel_name = 'Drop; Inn';") == (
+        "SELECT * FROM t WHERE hotel_name = 'Drop; Inn'"
+    )
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT AVG(ADR) FROM dubai_hotels_daily WHERE YEAR(parsed_date_temp) = 2025 AND MONTH(parsed_date_temp) = 12",
+        "SELECT hotel_name, MAX(ADR) FROM dubai_hotels_daily WHERE YEAR(parsed_date_temp) BETWEEN 2023 AND 2024 "
+        "GROUP BY hotel_name",
+        # 2024 is a leap year: 29 February must still have no match in 2023.
+        "SELECT t1.parsed_date_temp, t1.ADR, AVG(t2.ADR) FROM dubai_hotels_daily t1 JOIN dubai_hotels_daily t2 "
+        "ON t1.hotel_name = t2.hotel_name AND DAY(t1.parsed_date_temp) = DAY(t2.parsed_date_temp) "
+        "AND MONTH(t1.parsed_date_temp) = MONTH(t2.parsed_date_temp) "
+        "AND YEAR(t1.parsed_date_temp) = 2024 AND YEAR(t2.parsed_date_temp) = 2023 "
+        "GROUP BY t1.parsed_date_temp, t1.ADR",
+    ],
+)
+def test_sargable_rewrite_keeps_results(engine, sql):
+    rewritten, notes = rewrite_sargable(sql)
+
+    assert notes and "YEAR(parsed_date_temp)" not in rewritten
+    assert results_match(_rows(engine, sql), _rows(engine, rewritten), ordered=False)
+
+
+def test_same_day_join_gets_indexable_key():
+    rewritten, _ = rewrite_sargable(
+        "SELECT * FROM d t1 JOIN d t2 ON DAY(t1.parsed_date_temp) = DAY(t2.parsed_date_temp) "
+        "AND MONTH(t1.parsed_date_temp) = MONTH(t2.parsed_date_temp) "
+        "AND YEAR(t2.parsed_date_temp) = YEAR(t1.parsed_date_temp) - 1"
+    )
+
+    assert "t2.parsed_date_temp = DATE_SUB(t1.parsed_date_temp, INTERVAL 1 YEAR)" in rewritten
+    assert "DAY(t1.parsed_date_temp) = DAY(t2.parsed_date_temp)" in rewritten
+
+
+def test_row_cap_flags_truncation(engine):
+    result = SQLGuard(engine, max_cost=0, timeout_ms=0, max_rows=10).execute(f"SELECT * FROM {TABLE}")
+
+    assert len(result.rows) == 10 and result.truncated
+    assert "hotel_name" in result.columns
+
+
+def test_expensive_plan_is_rejected(engine):
+    guard = SQLGuard(engine, max_cost=1e6, timeout_ms=0, max_rows=10)
+
+    with pytest.raises(SQLGuardError, match="estimated cost"):
+        guard.execute(f"SELECT COUNT(*) FROM {TABLE} a, {TABLE} b, {TABLE} c")
+
+
+def test_timeout_interrupts_query(engine):
+    guard = SQLGuard(engine, max_cost=0, timeout_ms=20, max_rows=10)
+
+    with pytest.raises(SQLGuardError, match="timed out"):
+        guard.execute(f"SELECT COUNT(*) FROM {TABLE} a, {TABLE} b, {TABLE} c")
@@ -0,0 +1,74 @@
+import datetime as dt
+from decimal import Decimal
+
+from sql_results import SQLResult, extreme_rows, render_table
+
+
+def _daily_result(n=400, ties=20):
+    rows = []
+    start = dt.date(2024, 1, 1)
+    for i in range(n):
+        # The tied highest values sit at the end, past any row cap.
+        occupancy = 97.0 if i >= n - ties else 60.0 + (i % 30)
+        rows.append(("Premier Inn Al Furjan", start + dt.timedelta(days=i), Decimal(str(occupancy)), 250))
+    return SQLResult.from_rows(["hotel_name", "parsed_date_temp", "occupancy", "Rooms_Available"], rows)
+
+
+def test_columns_are_typed():
+    result = _daily_result(n=3, ties=0)
+
+    assert result.types == ["text", "date", "number", "number"]
+    assert isinstance(result.data["occupancy"][0], float)
+    assert result.records()[0]["parsed_date_temp"] == "2024-01-01"
+
+
+def test_render_keeps_every_tied_extreme_row():
+    result = _daily_result()
+    text = render_table(result, max_rows=40, max_tokens=1500)
+
+    assert text.count("| 97.0 |") == 20
+    assert "more rows not shown" in text
+    assert "occupancy: min 60.0, max 97.0" in text
+    # Constant columns do not mark every row as an extreme.
+    assert len(extreme_rows(result)) < result.row_count
+
+
+def test_ties_beyond_the_caps_are_summarized():
+    result = _daily_result()
+    text = render_table(result, max_rows=10, max_tokens=400)
+
+    assert len(text.splitlines()) <= 1 + 10 + 3
+    assert "| 97.0 |" not in text
+    assert "occupancy: 20 rows tied at max 97.0" in text
+
+
+def test_caps_hold_on_the_daily_table():
+    import pandas as pd
+
+    from load_mysql import prepare_frame
+    from token_utils import count_tokens
+
+    df = prepare_frame(pd.read_csv("dubai_hotels_synthetic_daily_2y_enriched.csv"))
+    result = SQLResult.from_rows(list(df.columns), list(df.itertuples(index=False)))
+    text = render_table(result, max_rows=50, max_tokens=1500)
+
+    lines = text.splitlines()
+    table = lines[: next(i for i, line in enumerate(lines) if line.startswith("... "))]
+    assert len(table) <= 1 + 50
+    assert count_tokens("\n".join(table)) <= 1500
+    assert "Occupancy_%: 56 rows tied at max 97.0" in text
+
+
+def test_render_respects_row_and_token_caps():
+    result = SQLResult.from_rows(["d", "adr"], [(f"2025-01-{i:02d}", 100.0) for i in range(1, 31)])
+
+    assert len(render_table(result, max_rows=5, max_tokens=10_000).splitlines()) == 1 + 5 + 1
+    assert len(render_table(result, max_rows=100, max_tokens=30).splitlines()) < 1 + 30
+
+
+def test_render_small_result_in_full():
+    result = SQLResult.from_rows(["hotel_name", "avg_adr"], [("St Regis Dubai", Decimal("1160.330000"))], truncated=True)
+    text = render_table(result, max_rows=50, max_tokens=1500)
+
+    assert text.splitlines()[:2] == ["hotel_name | avg_adr", "St Regis Dubai | 1160.33"]
+    assert "truncated" in text
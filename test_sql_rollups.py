@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from load_mysql import load_csv
+from sql_dialect import translate_mysql_to_sqlite
+from sql_rollups import RollupRewriter, results_match
+
+
+TABLE = "dubai_hotels_daily"
+CSV_PATH = "dubai_hotels_synthetic_daily_2y_enriched.csv"
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('rollups') / 'hotels.db'}")
+    load_csv(engine, CSV_PATH, TABLE)
+    return engine
+
+
+def _rows(engine, sql):
+    with engine.connect() as conn:
+        return conn.execute(text(translate_mysql_to_sqlite(sql))).all()
+
+
+@pytest.mark.parametrize(
+    "sql, rollup",
+    [
+        (
+            "SELECT hotel_name, AVG(ADR) AS avg_adr FROM dubai_hotels_daily "
+            "WHERE YEAR(parsed_date_temp) = 2025 GROUP BY hotel_name;",
+            "dubai_hotels_daily_yearly",
+        ),
+        (
+            "SELECT AVG(`Occupancy_%`), MAX(`Occupancy_%`) FROM dubai_hotels_daily "
+            "WHERE hotel_name = 'St Regis Dubai' AND YEAR(parsed_date_temp) = 2025 AND MONTH(parsed_date_temp) = 1",
+            "dubai_hotels_daily_monthly",
+        ),
+        (
+            "SELECT MONTH(t.parsed_date_temp) AS m, SUM(t.ADR * t.Rooms_Sold) AS revenue, COUNT(*) "
+            "FROM dubai_hotels_daily AS t WHERE t.hotel_name = 'St Regis Dubai' "
+            "AND YEAR(t.parsed_date_temp) = 2024 GROUP BY m ORDER BY revenue DESC",
+            "dubai_hotels_daily_monthly",
+        ),
+        (
+            # All-time average re-aggregated from yearly rows.
+            "SELECT hotel_name, AVG(ADR), MIN(ADR), SUM(Rooms_Sold) FROM dubai_hotels_daily GROUP BY hotel_name",
+            "dubai_hotels_daily_yearly",
+        ),
+    ],
+)
+def test_rewrite_matches_original(engine, sql, rollup):
+    rewrite = RollupRewriter(TABLE).rewrite(sql)
+
+    assert rewrite is not None and rewrite.table == rollup
+    assert results_match(
+        _rows(engine, sql.rstrip(";")),
+        _rows(engine, rewrite.sql),
+        ordered="ORDER BY" in sql,
+    )
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        # Day-level rows / extreme-with-date lookups need the daily table.
+        "SELECT parsed_date_temp, `Occupancy_%` FROM dubai_hotels_daily WHERE `Occupancy_%` = "
+        "(SELECT MAX(`Occupancy_%`) FROM dubai_hotels_daily)",
+        "SELECT hotel_name FROM dubai_hotels_daily WHERE ADR > 1000",
+        "SELECT AVG(ADR) FROM dubai_hotels_daily WHERE parsed_date_temp >= '2025-01-01'",
+        "SELECT AVG(ADR) FROM dubai_hotels_daily WHERE YEAR(parsed_date_temp) = 2025 OR hotel_name = 'x'",
+        "SELECT t1.hotel_name, AVG(t1.ADR) FROM dubai_hotels_daily t1 JOIN dubai_hotels_daily t2 "
+        "ON t1.hotel_name = t2.hotel_name GROUP BY t1.hotel_name",
+        "SELECT AVG(Rooms_Available) FROM dubai_hotels_daily",
+    ],
+)
+def test_non_rollup_queries_are_left_alone(sql):
+    assert RollupRewriter(TABLE).rewrite(sql) is None
+
+
+def test_mismatch_pins_shape_to_original_query():
+    rewriter = RollupRewriter(TABLE, verify_runs=2)
+    rewrite = rewriter.rewrite("SELECT AVG(ADR) FROM dubai_hotels_daily WHERE YEAR(parsed_date_temp) = 2025")
+
+    assert rewriter.needs_verification(rewrite, version=1)
+    rewriter.record_verification(rewrite, version=1, matched=True)
+    rewriter.record_verification(rewrite, version=1, matched=True)
+    assert not rewriter.needs_verification(rewrite, version=1)
+    # A new data version is verified again.
+    assert rewriter.needs_verification(rewrite, version=2)
+
+    rewriter.record_verification(rewrite, version=2, matched=False)
+    assert rewriter.is_rejected(rewrite, version=2)
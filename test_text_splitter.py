@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+from text_splitter import split_documents, split_sections, split_text
+from token_utils import count_tokens
+
+PAGE = """Hotel Profile - Example Hotel
+1. OVERVIEW
+Example Hotel is a four star hotel on the canal.
+It has modern rooms.
+2. LOCATION AND ACCESS
+The hotel is ten minutes from Dubai Mall.
+"""
+
+
+def _doc(text, **metadata):
+    return SimpleNamespace(page_content=text, metadata=metadata)
+
+
+def test_sections_follow_headings_and_join_wrapped_lines():
+    assert split_sections(PAGE) == [
+        ("", "Hotel Profile - Example Hotel"),
+        ("1. OVERVIEW", "Example Hotel is a four star hotel on the canal. It has modern rooms."),
+        ("2. LOCATION AND ACCESS", "The hotel is ten minutes from Dubai Mall."),
+    ]
+
+
+def test_small_sections_are_packed_without_overlap():
+    chunks = split_text(PAGE, chunk_tokens=300, overlap_tokens=40)
+    assert len(chunks) == 1
+    heading, text = chunks[0]
+    assert heading == "1. OVERVIEW"
+    assert text.count("Dubai Mall") == 1
+
+
+def test_long_section_is_cut_at_sentences_with_heading_and_overlap():
+    sentences = [f"Sentence number {i} describes one more amenity of the hotel." for i in range(40)]
+    text = "3. ROOMS AND FACILITIES\n" + "\n".join(sentences)
+    chunks = split_text(text, chunk_tokens=80, overlap_tokens=20)
+
+    assert len(chunks) > 3
+    for heading, chunk in chunks:
+        assert heading == "3. ROOMS AND FACILITIES"
+        assert chunk.startswith("3. ROOMS AND FACILITIES\n")
+        assert count_tokens(chunk) <= 80
+    # The last sentence of each piece opens the next one; no sentence is lost.
+    first, second = chunks[0][1], chunks[1][1]
+    assert first.rsplit(". ", 1)[-1].rstrip(".") in second
+    assert all(any(s in c for _, c in chunks) for s in sentences)
+
+
+def test_documents_keep_metadata_and_order_across_workers():
+    docs = [_doc(PAGE.replace("Example", f"Hotel{i}"), source=f"{i}.pdf", page=0) for i in range(8)]
+    serial = split_documents(docs, 300, 40, workers=1)
+    parallel = split_documents(docs, 300, 40, workers=2)
+
+    assert [c.page_content for c in serial] == [c.page_content for c in parallel]
+    assert [c.metadata["source"] for c in parallel] == [f"{i}.pdf" for i in range(8)]
+    assert parallel[0].metadata["section"] == "1. OVERVIEW" and parallel[0].metadata["tokens"] > 0
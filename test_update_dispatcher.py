@@ -0,0 +1,87 @@
+import asyncio
+from types import SimpleNamespace
+
+from update_dispatcher import UpdateDispatcher
+
+
+def _update(update_id, chat_id):
+    return SimpleNamespace(update_id=update_id, effective_chat=SimpleNamespace(id=chat_id))
+
+
+def test_per_chat_order_dedup_and_global_limit():
+    async def scenario():
+        handled, running, peak = [], 0, 0
+
+        async def handler(update):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            handled.append((update.effective_chat.id, update.update_id))
+            running -= 1
+
+        dispatcher = UpdateDispatcher(handler, max_concurrency=2, chat_queue_size=10)
+        statuses = [dispatcher.submit(_update(i, chat)) for i, chat in enumerate([1, 2, 3, 1, 2, 3, 1])]
+        statuses.append(dispatcher.submit(_update(0, 1)))
+        await dispatcher.join()
+        return statuses, handled, peak, dispatcher
+
+    statuses, handled, peak, dispatcher = asyncio.run(scenario())
+
+    assert statuses[-1] == "duplicate"
+    assert [u for chat, u in handled if chat == 1] == [0, 3, 6]
+    assert peak == 2
+    assert dispatcher.pending == 0 and not dispatcher._queues and not dispatcher._workers
+
+
+def test_full_chat_queue_gets_busy_reply_without_blocking_others():
+    async def scenario():
+        busy, handled = [], []
+        release = asyncio.Event()
+
+        async def handler(update):
+            if update.effective_chat.id == "heavy":
+                await release.wait()
+            handled.append(update.update_id)
+
+        async def on_busy(update):
+            busy.append(update.update_id)
+
+        dispatcher = UpdateDispatcher(handler, on_busy=on_busy, max_concurrency=2, chat_queue_size=2)
+        for i in range(5):
+            dispatcher.submit(_update(i, "heavy"))
+        await asyncio.sleep(0)
+        dispatcher.submit(_update(100, "light"))
+        await asyncio.sleep(0.05)
+        light_done = 100 in handled
+        release.set()
+        await dispatcher.join()
+        return busy, handled, light_done
+
+    busy, handled, light_done = asyncio.run(scenario())
+
+    assert light_done
+    assert busy == [2, 3, 4]
+    assert sorted(handled) == [0, 1, 100]
+
+
+def test_busy_replies_are_kept_until_sent():
+    import gc
+
+    async def scenario():
+        busy = []
+
+        async def on_busy(update):
+            await asyncio.sleep(0.02)
+            busy.append(update.update_id)
+
+        dispatcher = UpdateDispatcher(lambda update: asyncio.sleep(0.05), on_busy=on_busy, chat_queue_size=1)
+        for i in range(3):
+            dispatcher.submit(_update(i, "chat"))
+        gc.collect()
+        assert len(dispatcher._busy_replies) == 2
+        await dispatcher.join()
+        return busy, dispatcher._busy_replies
+
+    busy, pending = asyncio.run(scenario())
+    assert busy == [1, 2] and not pending
@@ -0,0 +1,176 @@
+"""
+Token-aware, structure-aware document splitter.
+
+Chunks are measured in tiktoken tokens (``token_utils.count_tokens``) rather than
+characters, so every chunk costs roughly the same to embed and to put in a
+prompt. Splitting follows the document's structure:
+
+- a chunk never crosses a document (i.e. PDF page) boundary;
+- section headings ("1. OVERVIEW", "## Amenities", all-caps lines) start a new
+  section; small neighbouring sections are packed into one chunk, and a section is
+  only cut when it does not fit on its own;
+- a cut section is split at sentence boundaries, every piece repeats the section
+  heading, and only those cuts get an overlap (the previous piece's last
+  sentences, up to ``overlap_tokens``). Whole sections never overlap.
+
+``split_documents`` processes documents in parallel worker processes.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional, Sequence, Tuple
+
+from token_utils import count_tokens
+
+_HEADING = re.compile(
+    r"^(?:#{1,6}\s+\S.*"  # markdown heading
+    r"|\d+(?:\.\d+)*\.?\s+[A-Z][^.!?]{0,78}"  # numbered heading: "1. OVERVIEW", "2.1 Rooms"
+    r"|[A-Z][A-Z0-9 &/,'()\-]{2,79})$"  # ALL CAPS line
+)
+_BULLET = re.compile(r"^(?:[-•*]|\d+\))\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+
+def is_heading(line: str) -> bool:
+    line = line.strip()
+    return bool(line) and bool(_HEADING.match(line))
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """
+    (heading, body) pairs in document order. Text before the first heading gets an
+    empty heading. Wrapped lines inside a paragraph are joined with spaces.
+    """
+    sections: List[Tuple[str, List[str]]] = [("", [])]
+    for raw in text.splitlines():
+        line = raw.strip()
+        if is_heading(line):
+            sections.append((line.lstrip("#").strip(), []))
+        elif _BULLET.match(line):
+            # List items stay separate units instead of being joined into one sentence.
+            sections[-1][1].extend(["", line])
+        else:
+            sections[-1][1].append(line)
+
+    out = []
+    for heading, lines in sections:
+        # Blank lines separate paragraphs; other line breaks are PDF wrapping.
+        paragraphs = " ".join(line if line else "\n\n" for line in lines)
+        body = "\n\n".join(" ".join(p.split()) for p in paragraphs.split("\n\n") if p.strip())
+        if heading or body:
+            out.append((heading, body))
+    return out
+
+
+def _sentences(body: str) -> List[str]:
+    return [s for paragraph in body.split("\n\n") for s in _SENTENCE_END.split(paragraph) if s.strip()]
+
+
+def _fit_words(sentence: str, max_tokens: int) -> List[str]:
+    """Cut a sentence longer than ``max_tokens`` at word boundaries."""
+    pieces, current = [], []
+    for word in sentence.split():
+        if current and count_tokens(" ".join(current + [word])) > max_tokens:
+            pieces.append(" ".join(current))
+            current = []
+        current.append(word)
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _split_section(heading: str, body: str, chunk_tokens: int, overlap_tokens: int) -> List[str]:
+    prefix = f"{heading}\n" if heading else ""
+    budget = max(chunk_tokens - count_tokens(prefix), 1)
+    units: List[Tuple[str, int]] = []
+    for sentence in _sentences(body):
+        tokens = count_tokens(sentence)
+        if tokens > budget:
+            units.extend((piece, count_tokens(piece)) for piece in _fit_words(sentence, budget))
+        else:
+            units.append((sentence, tokens))
+
+    chunks: List[str] = []
+    current: List[Tuple[str, int]] = []
+    used = 0
+    for unit in units:
+        if current and used + unit[1] > budget:
+            chunks.append(prefix + " ".join(u[0] for u in current))
+            # Overlap at the cut: carry the last sentences that fit in overlap_tokens.
+            carried: List[Tuple[str, int]] = []
+            for previous in reversed(current):
+                if sum(u[1] for u in carried) + previous[1] > overlap_tokens:
+                    break
+                carried.insert(0, previous)
+            current, used = carried, sum(u[1] for u in carried)
+            if used + unit[1] > budget:
+                current, used = [], 0
+        current.append(unit)
+        used += unit[1]
+    if current:
+        chunks.append(prefix + " ".join(u[0] for u in current))
+    return chunks
+
+
+def split_text(text: str, chunk_tokens: int, overlap_tokens: int) -> List[Tuple[str, str]]:
+    """(section heading, chunk text) pairs for one document."""
+    chunks: List[Tuple[str, str]] = []
+    packed: List[str] = []
+    packed_heading = ""
+    used = 0
+
+    def flush() -> None:
+        nonlocal packed, used, packed_heading
+        if packed:
+            chunks.append((packed_heading, "\n\n".join(packed)))
+        packed, used, packed_heading = [], 0, ""
+
+    for heading, body in split_sections(text):
+        section = f"{heading}\n{body}".strip() if heading else body
+        tokens = count_tokens(section)
+        if used + tokens <= chunk_tokens:
+            if not packed_heading:
+                packed_heading = heading
+            packed.append(section)
+            used += tokens
+            continue
+        flush()
+        if tokens <= chunk_tokens:
+            packed, used, packed_heading = [section], tokens, heading
+        else:
+            chunks.extend((heading, c) for c in _split_section(heading, body, chunk_tokens, overlap_tokens))
+    flush()
+    return chunks
+
+
+def _split_one(args: Tuple[Any, int, int]) -> List[Any]:
+    doc, chunk_tokens, overlap_tokens = args
+    out = []
+    for heading, text in split_text(doc.page_content, chunk_tokens, overlap_tokens):
+        metadata = dict(doc.metadata)
+        if heading:
+            metadata["section"] = heading
+        metadata["tokens"] = count_tokens(text)
+        out.append(type(doc)(page_content=text, metadata=metadata))
+    return out
+
+
+def split_documents(
+    docs: Sequence[Any], chunk_tokens: int, overlap_tokens: int, workers: Optional[int] = None
+) -> List[Any]:
+    """
+    Split ``docs`` (``page_content`` + ``metadata`` objects, e.g. LangChain Documents)
+    into token-bounded chunks, keeping document order. ``workers`` > 1 splits in that
+    many processes (default: one per CPU); small batches are split in-process.
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = [(doc, chunk_tokens, overlap_tokens) for doc in docs]
+    if workers <= 1 or len(jobs) < 2 * workers:
+        results = [_split_one(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_split_one, jobs, chunksize=max(len(jobs) // (workers * 4), 1)))
+    return [chunk for chunks in results for chunk in chunks]
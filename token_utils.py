@@ -0,0 +1,34 @@
+"""
+Token counting for prompt budgets.
+
+Uses tiktoken's encoding for the configured OpenAI model. If tiktoken (or its
+encoding files) is not available, a ~4 characters/token estimate is used.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Optional
+
+from config import settings
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str) -> Optional[Any]:
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Number of tokens ``text`` uses for ``model`` (defaults to OPENAI_MODEL)."""
+    encoding = _encoding(model or settings.openai_model)
+    if encoding is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
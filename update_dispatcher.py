@@ -0,0 +1,124 @@
+"""
+Asynchronous dispatcher for Telegram webhook updates.
+
+The webhook acknowledges each update immediately and hands it to ``UpdateDispatcher.submit``:
+
+- every chat gets its own bounded FIFO queue, so a chat's messages are answered in order;
+- a worker task per chat exists only while that chat has pending updates;
+- a global semaphore caps how many updates are processed at once, and because a
+  chat handles one update at a time, a busy chat cannot take more than one slot;
+- redelivered updates (same ``update_id``) are dropped;
+- when a chat's queue (or the global backlog) is full, ``on_busy`` is called instead.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+Handler = Callable[[Any], Awaitable[None]]
+
+
+def _chat_key(update: Any) -> Any:
+    chat = getattr(update, "effective_chat", None)
+    return chat.id if chat is not None else None
+
+
+class UpdateDispatcher:
+    def __init__(
+        self,
+        handler: Handler,
+        on_busy: Optional[Handler] = None,
+        max_concurrency: int = 4,
+        chat_queue_size: int = 5,
+        max_pending: int = 1000,
+        dedup_size: int = 10_000,
+    ) -> None:
+        self.handler = handler
+        self.on_busy = on_busy
+        self.chat_queue_size = chat_queue_size
+        self.max_pending = max_pending
+        self.dedup_size = dedup_size
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queues: Dict[Any, asyncio.Queue] = {}
+        self._workers: Dict[Any, asyncio.Task] = {}
+        # The event loop only keeps weak references to tasks: hold busy replies until done.
+        self._busy_replies: Set[asyncio.Task] = set()
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, update: Any) -> str:
+        """
+        Queue ``update`` without waiting for it to be processed.
+        Returns "queued", "duplicate" or "busy".
+        """
+        update_id = getattr(update, "update_id", None)
+        if update_id is not None:
+            if update_id in self._seen:
+                return "duplicate"
+            self._seen[update_id] = None
+            if len(self._seen) > self.dedup_size:
+                self._seen.popitem(last=False)
+
+        key = _chat_key(update)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.Queue(maxsize=self.chat_queue_size)
+
+        if self._pending >= self.max_pending or queue.full():
+            if not self._workers.get(key) and queue.empty():
+                self._queues.pop(key, None)
+            if self.on_busy is not None:
+                task = asyncio.create_task(self._safe(self.on_busy, update))
+                self._busy_replies.add(task)
+                task.add_done_callback(self._busy_replies.discard)
+            return "busy"
+
+        queue.put_nowait(update)
+        self._pending += 1
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._drain(key, queue))
+        return "queued"
+
+    async def _drain(self, key: Any, queue: asyncio.Queue) -> None:
+        try:
+            while not queue.empty():
+                update = queue.get_nowait()
+                try:
+                    async with self._semaphore:
+                        await self._safe(self.handler, update)
+                finally:
+                    self._pending -= 1
+        finally:
+            # Idle chats keep no queue or task around.
+            self._workers.pop(key, None)
+            if queue.empty():
+                self._queues.pop(key, None)
+
+    async def _safe(self, handler: Handler, update: Any) -> None:
+        try:
+            await handler(update)
+        except Exception:
+            logger.exception("Error while handling update %s", getattr(update, "update_id", None))
+
+    async def join(self) -> None:
+        """Wait until every queued update has been processed and every busy reply sent."""
+        while self._workers or self._busy_replies:
+            await asyncio.gather(*self._workers.values(), *self._busy_replies, return_exceptions=True)
+
+    async def close(self) -> None:
+        tasks = [*self._workers.values(), *self._busy_replies]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
@@ -0,0 +1,164 @@
+"""
+Read-only, memory-mapped copy of the Chroma collection for multi-worker serving.
+
+Each worker process that opens Chroma loads its own copy of the index into memory.
+``export_vectors`` writes the collection's embeddings to ``vectors.npy`` and its
+chunks to ``docs.jsonl`` under VECTOR_MMAP_DIR. ``MmapVectorIndex`` opens the
+vectors with ``numpy.load(mmap_mode="r")``, so every worker maps the same file and
+the OS page cache holds a single copy. Search is exact (one matrix-vector product),
+and scores use the same distance and relevance functions as the Chroma store. That
+is fast enough for collections of up to about a hundred thousand chunks.
+
+``ingest.py`` exports after every ingest. Re-exporting replaces the files
+atomically, and running workers pick up the new files on their next search. To
+export an existing CHROMA_DIR without re-ingesting:
+    uv run vector_index.py
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+
+VECTORS_FILE = "vectors.npy"
+DOCS_FILE = "docs.jsonl"
+META_FILE = "meta.json"
+
+
+def _replace(path: str, write: Any) -> None:
+    tmp = f"{path}.tmp{os.getpid()}"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def export_vectors(collection: Any, directory: str = "") -> int:
+    """Write a Chroma collection's embeddings, chunks and distance space to ``directory``."""
+    directory = directory or settings.vector_mmap_dir
+    os.makedirs(directory, exist_ok=True)
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    if vectors.ndim != 2:
+        vectors = vectors.reshape(0, 0)
+    metadata = collection.metadata or {}
+    configuration = (getattr(collection, "configuration", None) or {}).get("hnsw") or {}
+    space = metadata.get("hnsw:space") or configuration.get("space") or "l2"
+
+    def write_docs(tmp: str) -> None:
+        with open(tmp, "w", encoding="utf-8") as f:
+            for text, meta in zip(data["documents"], data["metadatas"]):
+                f.write(json.dumps({"text": text, "metadata": meta or {}}, ensure_ascii=False) + "\n")
+
+    def write_vectors(tmp: str) -> None:
+        with open(tmp, "wb") as f:
+            np.save(f, vectors)
+
+    def write_meta(tmp: str) -> None:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"count": len(vectors), "space": space}, f)
+
+    # Docs first and meta last: a reader that sees the new meta also sees the new data.
+    _replace(os.path.join(directory, DOCS_FILE), write_docs)
+    _replace(os.path.join(directory, VECTORS_FILE), write_vectors)
+    _replace(os.path.join(directory, META_FILE), write_meta)
+    return len(vectors)
+
+
+class MmapVectorIndex:
+    """
+    The subset of the LangChain vector store API that RAGPipeline uses, over an
+    exported, memory-mapped collection.
+    """
+
+    def __init__(self, directory: str, embedding_function: Any) -> None:
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self._lock = threading.Lock()
+        self._loaded_mtime: Optional[float] = None
+        self._load()
+
+    def _load(self) -> None:
+        meta_path = os.path.join(self.directory, META_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(
+                f"No exported vectors in '{self.directory}'. Run ingest.py or `uv run vector_index.py` first."
+            )
+        mtime = os.stat(meta_path).st_mtime
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        vectors = np.load(os.path.join(self.directory, VECTORS_FILE), mmap_mode="r")
+        with open(os.path.join(self.directory, DOCS_FILE), encoding="utf-8") as f:
+            docs = [json.loads(line) for line in f]
+        self.space = meta.get("space", "l2")
+        self.vectors = vectors
+        self.norms = np.einsum("ij,ij->i", vectors, vectors) if len(vectors) else np.zeros(0, dtype=np.float32)
+        self.docs = docs
+        self._loaded_mtime = mtime
+
+    def _refresh(self) -> None:
+        """Reopen the files when they were re-exported since the last search."""
+        try:
+            mtime = os.stat(os.path.join(self.directory, META_FILE)).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime != self._loaded_mtime:
+            with self._lock:
+                if mtime != self._loaded_mtime:
+                    self._load()
+
+    def _distances(self, query: np.ndarray) -> np.ndarray:
+        dots = self.vectors @ query
+        if self.space == "l2":
+            # Squared L2, as Chroma reports it.
+            return self.norms - 2 * dots + float(query @ query)
+        if self.space == "cosine":
+            return 1 - dots / np.maximum(np.sqrt(self.norms) * float(np.linalg.norm(query)), 1e-12)
+        return 1 - dots  # inner product
+
+    def _relevance(self, distance: float) -> float:
+        # Same score functions LangChain applies to Chroma distances.
+        if self.space == "l2":
+            return 1.0 - distance / math.sqrt(2)
+        return 1.0 - distance
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Any, float]]:
+        from langchain_core.documents import Document
+
+        self._refresh()
+        if not len(self.vectors) or k <= 0:
+            return []
+        distances = self._distances(np.asarray(embedding, dtype=np.float32))
+        k = min(k, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind="stable")]
+        return [
+            (Document(page_content=self.docs[i]["text"], metadata=self.docs[i]["metadata"]), float(distances[i]))
+            for i in top
+        ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Any, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k)
+
+    def similarity_search_with_relevance_scores(self, query: str, k: int = 4) -> List[Tuple[Any, float]]:
+        return [(doc, self._relevance(d)) for doc, d in self.similarity_search_with_score(query, k)]
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Any]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+
+def main() -> None:
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=settings.chroma_dir).get_collection("langchain")
+    count = export_vectors(collection, settings.vector_mmap_dir)
+    print(f"Exported {count} vectors from '{settings.chroma_dir}' to '{settings.vector_mmap_dir}'.")
+
+
+if __name__ == "__main__":
+    main()